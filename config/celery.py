@@ -1,5 +1,6 @@
 import os
 from celery import Celery
+from django.conf import settings
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
@@ -7,6 +8,44 @@ app = Celery('config')
 app.config_from_object('django.conf:settings', namespace='CELERY')
 app.autodiscover_tasks()
 
+app.conf.beat_schedule = {
+    # Отправка накопленных писем пачками через постоянное соединение
+    'send-queued-mail': {
+        'task': 'crowdfunding.mail.send_queued_mail',
+        'schedule': float(getattr(settings, 'EMAIL_FLUSH_INTERVAL', 5)),
+    },
+    # Свертка шардов счетчиков сумм сборов
+    'rollup-collect-counters': {
+        'task': 'crowdfunding.tasks.rollup_collect_counters',
+        'schedule': 10.0,
+    },
+    # Перенос изменений статистики сборов (донаторы, количество платежей)
+    'fold-collect-stats': {
+        'task': 'crowdfunding.tasks.fold_collect_stats',
+        'schedule': 5.0,
+    },
+    # Страховка для очереди асинхронного приема платежей, если задача разбора потерялась
+    'drain-payment-intake': {
+        'task': 'crowdfunding.tasks.drain_payment_intake',
+        'schedule': 5.0,
+    },
+    # Уплотнение аналитики пожертвований: минуты → часы → дни
+    'compact-donation-rollups': {
+        'task': 'crowdfunding.tasks.compact_donation_rollups',
+        'schedule': 60.0,
+    },
+    # Обход истекших сборов: хранимый статус «Завершен»
+    'sweep-expired-collects': {
+        'task': 'crowdfunding.tasks.sweep_expired_collects',
+        'schedule': 60.0,
+    },
+    # Отложенные уведомления и страховка реле outbox, если публикация после коммита не удалась
+    'relay-outbox': {
+        'task': 'crowdfunding.tasks.relay_outbox',
+        'schedule': 10.0,
+    },
+}
+
 @app.task(bind=True, ignore_result=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -0,0 +1,312 @@
+import logging
+import math
+import threading
+import time
+import uuid
+from collections import Counter
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+from rest_framework import permissions
+from rest_framework.exceptions import Throttled
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+# Области ограничения: пользователь, сбор, вся платформа
+USER = 'user'
+COLLECT = 'collect'
+GLOBAL = 'global'
+SCOPES = [USER, COLLECT, GLOBAL]
+
+KEY_PREFIX = 'admission:'
+STATS_KEY = 'admission:stats:{outcome}'
+ADMITTED = 'admitted'
+# rate — токенов в секунду, burst — емкость корзины, concurrency — платежей в обработке одновременно
+DEFAULT_LIMITS = {
+    USER: {'rate': 1, 'burst': 5, 'concurrency': 2},
+    COLLECT: {'rate': 50, 'burst': 100, 'concurrency': 10},
+    GLOBAL: {'rate': 500, 'burst': 1000, 'concurrency': 100},
+}
+
+# Проверка всех областей и, если все пропускают, списание токенов и занятие слотов — атомарно.
+# KEYS: пары (корзина, слоты) по областям; ARGV: слот, аренда слота (сек.), ожидание при
+# занятых слотах (сек.), затем четверки (rate, burst, concurrency, цена в токенах) по областям.
+# Возвращает {0, ''} или {номер отказавшей области, ожидание в секундах строкой}
+ACQUIRE_SCRIPT = '''
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local lease = tonumber(ARGV[2])
+local levels = {}
+local rejected, wait = 0, 0
+for i = 1, #KEYS / 2 do
+    local rate = tonumber(ARGV[i * 4])
+    local burst = tonumber(ARGV[1 + i * 4])
+    local concurrency = tonumber(ARGV[2 + i * 4])
+    local cost = tonumber(ARGV[3 + i * 4])
+    if rate > 0 then
+        local state = redis.call('HMGET', KEYS[i * 2 - 1], 'tokens', 'updated')
+        local level = tonumber(state[1]) or burst
+        local updated = tonumber(state[2]) or now
+        level = math.min(burst, level + math.max(0, now - updated) * rate)
+        levels[i] = level
+        if level < cost and (cost - level) / rate > wait then
+            rejected, wait = i, (cost - level) / rate
+        end
+    end
+    if concurrency > 0 then
+        redis.call('ZREMRANGEBYSCORE', KEYS[i * 2], '-inf', now)
+        if redis.call('ZCARD', KEYS[i * 2]) >= concurrency and tonumber(ARGV[3]) > wait then
+            rejected, wait = i, tonumber(ARGV[3])
+        end
+    end
+end
+if rejected > 0 then
+    return {rejected, tostring(wait)}
+end
+for i = 1, #KEYS / 2 do
+    local rate = tonumber(ARGV[i * 4])
+    if rate > 0 then
+        redis.call('HSET', KEYS[i * 2 - 1], 'tokens', tostring(levels[i] - tonumber(ARGV[3 + i * 4])), 'updated', tostring(now))
+        redis.call('EXPIRE', KEYS[i * 2 - 1], math.ceil(tonumber(ARGV[1 + i * 4]) / rate) + 1)
+    end
+    if tonumber(ARGV[2 + i * 4]) > 0 then
+        redis.call('ZADD', KEYS[i * 2], now + lease, ARGV[1])
+        redis.call('EXPIRE', KEYS[i * 2], math.ceil(lease) + 1)
+    end
+end
+return {0, ''}
+'''
+
+RELEASE_SCRIPT = '''
+for i = 1, #KEYS do
+    redis.call('ZREM', KEYS[i], ARGV[1])
+end
+return 1
+'''
+
+
+def is_enabled():
+    """Ограничение создания платежей: лишние запросы получают 429, не доходя до БД"""
+    return getattr(settings, 'PAYMENT_ADMISSION', False)
+
+
+def get_limits():
+    """Лимиты по областям; область без лимита (или с нулем) не ограничивается"""
+    limits = getattr(settings, 'PAYMENT_ADMISSION_LIMITS', DEFAULT_LIMITS)
+    return {scope: limits.get(scope) or {} for scope in SCOPES}
+
+
+def get_lease_seconds():
+    """Через сколько слот освобождается сам, если процесс упал, не вернув его"""
+    return getattr(settings, 'PAYMENT_ADMISSION_LEASE', 30)
+
+
+def get_busy_retry_seconds():
+    """Retry-After, когда заняты все слоты одновременной обработки"""
+    return getattr(settings, 'PAYMENT_ADMISSION_BUSY_RETRY', 1)
+
+
+class MemoryBackend:
+    """Корзины и слоты в памяти процесса (для тестов и разработки без Redis)"""
+
+    def __init__(self):
+        self.buckets = {}
+        self.slots = {}
+        self.lock = threading.Lock()
+
+    def acquire(self, keys, token, limits):
+        now = time.monotonic()
+        lease = get_lease_seconds()
+        with self.lock:
+            levels = {}
+            rejected, wait = None, 0
+            for index, ((bucket_key, slots_key), limit) in enumerate(zip(keys, limits)):
+                rate, burst, concurrency, cost = limit
+                if rate > 0:
+                    level, updated = self.buckets.get(bucket_key, (burst, now))
+                    level = min(burst, level + max(0, now - updated) * rate)
+                    levels[bucket_key] = level
+                    if level < cost and (cost - level) / rate > wait:
+                        rejected, wait = index, (cost - level) / rate
+                if concurrency > 0:
+                    slots = self.slots.setdefault(slots_key, {})
+                    for expired in [slot for slot, expires in slots.items() if expires <= now]:
+                        del slots[expired]
+                    if len(slots) >= concurrency and get_busy_retry_seconds() > wait:
+                        rejected, wait = index, get_busy_retry_seconds()
+            if rejected is not None:
+                return rejected, wait
+            for (bucket_key, slots_key), (rate, burst, concurrency, cost) in zip(keys, limits):
+                if rate > 0:
+                    self.buckets[bucket_key] = (levels[bucket_key] - cost, now)
+                if concurrency > 0:
+                    self.slots[slots_key][token] = now + lease
+            return None, 0
+
+    def release(self, keys, token):
+        with self.lock:
+            for _, slots_key in keys:
+                self.slots.get(slots_key, {}).pop(token, None)
+
+    def clear(self):
+        with self.lock:
+            self.buckets.clear()
+            self.slots.clear()
+
+
+class RedisBackend:
+    """Корзины (хэши) и слоты (сортированные множества по времени аренды) в Redis; проверка атомарна (Lua)"""
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+        self.acquire_script = self.client.register_script(ACQUIRE_SCRIPT)
+        self.release_script = self.client.register_script(RELEASE_SCRIPT)
+
+    def acquire(self, keys, token, limits):
+        args = [token, get_lease_seconds(), get_busy_retry_seconds()]
+        for limit in limits:
+            args.extend(limit)
+        rejected, wait = self.acquire_script(keys=[key for pair in keys for key in pair], args=args)
+        if not rejected:
+            return None, 0
+        return int(rejected) - 1, float(wait)
+
+    def release(self, keys, token):
+        self.release_script(keys=[slots_key for _, slots_key in keys], args=[token])
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=KEY_PREFIX + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'redis': RedisBackend,
+}
+_backends = {}
+
+
+def get_backend():
+    """Хранилище лимитов по настройке PAYMENT_ADMISSION_BACKEND ('redis' или 'memory')"""
+    name = getattr(settings, 'PAYMENT_ADMISSION_BACKEND', 'redis')
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def _scopes(user_id, collect_counts, count):
+    """Области запроса с лимитами: [(область, (ключ корзины, ключ слотов), (rate, burst, concurrency, цена))]
+
+    Цена — число платежей запроса в этой области, но не больше емкости корзины:
+    пачка крупнее корзины забирает ее целиком, а не отклоняется навсегда.
+    """
+    members = [(USER, user_id, count)]
+    members += [(COLLECT, collect_id, collect_count) for collect_id, collect_count in sorted(collect_counts.items())]
+    members.append((GLOBAL, 'all', count))
+    limits = get_limits()
+    scopes = []
+    for scope, member, cost in members:
+        if member is None:
+            continue
+        limit = limits[scope]
+        rate, burst, concurrency = limit.get('rate') or 0, limit.get('burst') or 1, limit.get('concurrency') or 0
+        if rate > 0 or concurrency > 0:
+            key = f'{KEY_PREFIX}{scope}:{member}'
+            scopes.append((scope, (f'{key}:tokens', f'{key}:slots'), (rate, burst, concurrency, min(cost, burst))))
+    return scopes
+
+
+def parse_collect_id(data):
+    """id сбора из тела запроса до валидации (некорректный — без лимита сбора, ответит валидация)"""
+    try:
+        return int(data.get('collect'))
+    except (AttributeError, TypeError, ValueError):
+        return None
+
+
+def parse_collect_counts(items):
+    """Число платежей пачки по сборам до валидации: {id сбора: число элементов}"""
+    ids = (parse_collect_id(item) for item in items)
+    return Counter(collect_id for collect_id in ids if collect_id is not None)
+
+
+def _record(outcome):
+    key = STATS_KEY.format(outcome=outcome)
+    if not cache.add(key, 1, timeout=None):
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, 1, timeout=None)
+
+
+def admit(user_id, collect_id):
+    """Пропускает создание платежа или отвечает 429 с Retry-After.
+
+    Токен списывается во всех областях сразу, слот одновременной обработки
+    держится до конца блока.
+    """
+    return admit_batch(user_id, {} if collect_id is None else {collect_id: 1}, 1)
+
+
+@contextmanager
+def admit_batch(user_id, collect_counts, count):
+    """Пропускает пачку из count платежей (collect_counts — по сборам) или отвечает 429.
+
+    Пачка проверяется целиком: токены списываются по числу платежей в каждой
+    области, слот одновременной обработки занимается один на запрос.
+    """
+    if not is_enabled():
+        yield
+        return
+
+    scopes = _scopes(user_id, collect_counts, count)
+    keys = [keys for _, keys, _ in scopes]
+    token = uuid.uuid4().hex
+    backend = get_backend()
+    rejected, wait = backend.acquire(keys, token, [limit for _, _, limit in scopes])
+    if rejected is not None:
+        scope = scopes[rejected][0]
+        _record(scope)
+        logger.info('Платеж отклонен ограничителем (%s), повтор через %.2f с', scope, wait)
+        raise Throttled(wait=math.ceil(wait), detail='Слишком много платежей, повторите позже')
+
+    _record(ADMITTED)
+    try:
+        yield
+    finally:
+        backend.release(keys, token)
+
+
+def get_stats():
+    """Сколько запросов пропущено и сколько отклонено каждой областью"""
+    outcomes = [ADMITTED, *SCOPES]
+    values = cache.get_many([STATS_KEY.format(outcome=outcome) for outcome in outcomes])
+    stats = {outcome: values.get(STATS_KEY.format(outcome=outcome), 0) for outcome in outcomes}
+    total = sum(stats.values())
+    throttled = total - stats[ADMITTED]
+    return {
+        'admitted': stats[ADMITTED],
+        'throttled': {scope: stats[scope] for scope in SCOPES},
+        'throttled_ratio': round(throttled / total, 4) if total else 0,
+    }
+
+
+def reset_stats():
+    cache.delete_many([STATS_KEY.format(outcome=outcome) for outcome in [ADMITTED, *SCOPES]])
+
+
+class AdmissionStatsView(APIView):
+    """Статистика ограничителя создания платежей"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+    def delete(self, request):
+        reset_stats()
+        return Response(status=204)
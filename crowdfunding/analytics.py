@@ -0,0 +1,363 @@
+from collections import defaultdict
+from datetime import timedelta, timezone as dt_timezone
+from itertools import islice
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Q, Sum
+from django.db.models.functions import TruncDay, TruncHour, TruncMinute
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Collect, Payment
+
+MINUTE = 'minute'
+HOUR = 'hour'
+DAY = 'day'
+GRANULARITIES = {
+    MINUTE: timedelta(minutes=1),
+    HOUR: timedelta(hours=1),
+    DAY: timedelta(days=1),
+}
+# Диапазон графика по умолчанию
+DEFAULT_RANGES = {
+    MINUTE: timedelta(hours=1),
+    HOUR: timedelta(days=1),
+    DAY: timedelta(days=30),
+}
+COMPACTED_AT_KEY = 'analytics:compacted_at'
+# Перекрытие уплотнений: изменения из транзакций, закоммиченных позже отметки, не теряются
+COMPACTION_OVERLAP = timedelta(minutes=1)
+
+
+class DonationRollup(models.Model):
+    """Сумма и количество пожертвований за интервал (минута, час или день, UTC)"""
+    GRANULARITY_CHOICES = [(MINUTE, 'Минута'), (HOUR, 'Час'), (DAY, 'День')]
+
+    granularity = models.CharField(max_length=10, choices=GRANULARITY_CHOICES)
+    bucket = models.DateTimeField()
+    payments_count = models.IntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2, default=0)
+    # Время последнего изменения — по нему уплотнение находит затронутые интервалы
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        abstract = True
+
+
+class CollectRollup(DonationRollup):
+    collect = models.ForeignKey(Collect, on_delete=models.CASCADE, related_name='rollups')
+
+    class Meta:
+        unique_together = ['collect', 'granularity', 'bucket']
+        indexes = [models.Index(fields=['granularity', 'updated_at'])]
+
+
+class OccasionRollup(DonationRollup):
+    occasion = models.CharField(max_length=20, choices=Collect.OCCASION_CHOICES)
+
+    class Meta:
+        unique_together = ['occasion', 'granularity', 'bucket']
+        indexes = [models.Index(fields=['granularity', 'updated_at'])]
+
+
+class RollupDelta(models.Model):
+    """Изменение минутного интервала от платежа, еще не перенесенное в интервалы.
+
+    Платеж только добавляет строку: обновление общей строки минуты повода (и
+    горячего сбора) в транзакции каждого платежа сериализовало бы платежи на ее
+    блокировке. Изменения переносит в интервалы fold() при уплотнении.
+    Сбор без внешнего ключа — строка может пережить удаленный сбор.
+    """
+    collect_id = models.IntegerField()
+    occasion = models.CharField(max_length=20, choices=Collect.OCCASION_CHOICES)
+    bucket = models.DateTimeField()
+    payments_count = models.IntegerField()
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2)
+
+    class Meta:
+        indexes = [models.Index(fields=['collect_id', 'bucket']), models.Index(fields=['bucket'])]
+
+
+# Модель и поле ключа для каждого разреза
+SCOPES = [(CollectRollup, 'collect_id'), (OccasionRollup, 'occasion')]
+
+
+def get_minute_retention():
+    """Сколько хранятся минутные интервалы (дальше — только часы и дни)"""
+    return getattr(settings, 'ANALYTICS_MINUTE_RETENTION', timedelta(days=2))
+
+
+def get_max_points():
+    """Максимальное число точек графика в одном ответе"""
+    return getattr(settings, 'ANALYTICS_MAX_POINTS', 1000)
+
+
+def truncate(value, granularity):
+    value = value.astimezone(dt_timezone.utc)
+    if granularity == MINUTE:
+        return value.replace(second=0, microsecond=0)
+    if granularity == HOUR:
+        return value.replace(minute=0, second=0, microsecond=0)
+    return value.replace(hour=0, minute=0, second=0, microsecond=0)
+
+
+def _add(model, lookup, granularity, bucket, count, amount, now, create=True):
+    """Прибавляет к интервалу; возвращает False, если строки нет и create=False"""
+    rows = model.objects.filter(granularity=granularity, bucket=bucket, **lookup)
+    changes = {
+        'payments_count': F('payments_count') + count,
+        'total_amount': F('total_amount') + amount,
+        'updated_at': now,
+    }
+    if rows.update(**changes):
+        return True
+    if not create:
+        return False
+    try:
+        with transaction.atomic():
+            model.objects.create(
+                granularity=granularity, bucket=bucket, payments_count=count,
+                total_amount=amount, updated_at=now, **lookup
+            )
+    except IntegrityError:
+        # Строку успел создать параллельный платеж
+        rows.update(**changes)
+    return True
+
+
+def _record(payments, occasions, sign):
+    """Записывает изменения минут сбора и повода — одну строку на сбор и минуту"""
+    groups = defaultdict(lambda: [0, Decimal('0')])
+    for payment in payments:
+        group = groups[payment.collect_id, occasions[payment.collect_id], truncate(payment.date_added, MINUTE)]
+        group[0] += sign
+        group[1] += payment.amount * sign
+    RollupDelta.objects.bulk_create([
+        RollupDelta(collect_id=collect_id, occasion=occasion, bucket=minute, payments_count=count, total_amount=amount)
+        for (collect_id, occasion, minute), (count, amount) in groups.items()
+    ])
+
+
+def on_payments_created(payments, occasions):
+    """Учитывает платежи в минутных интервалах сбора и повода.
+
+    occasions — {id сбора: повод}. В интервалы изменения переносит fold(),
+    часы и дни досчитывает compact().
+    """
+    _record(payments, occasions, 1)
+
+
+def on_payment_created(payment):
+    on_payments_created([payment], {payment.collect_id: payment.collect.occasion})
+
+
+def on_payment_deleted(payment, occasion):
+    """Вычитает платеж из интервалов (при переносе — из минуты или, если ее уже нет, из часа)"""
+    _record([payment], {payment.collect_id: occasion}, -1)
+
+
+def fold(now=None, batch_size=10000):
+    """Переносит накопленные изменения в минутные интервалы; возвращает число перенесенных строк.
+
+    Изменения минут, уже удаленных после уплотнения, идут в их час — изменение
+    часа пометит его день для пересчета.
+    """
+    now = now or timezone.now()
+    purged_before = truncate(now - get_minute_retention(), HOUR)
+    folded = 0
+    while True:
+        with transaction.atomic():
+            # Параллельное уплотнение ждет блокировки и не перенесет строки второй раз
+            deltas = list(
+                RollupDelta.objects.select_for_update().order_by('id')
+                .values_list('id', 'collect_id', 'occasion', 'bucket', 'payments_count', 'total_amount')[:batch_size]
+            )
+            if not deltas:
+                return folded
+
+            groups = defaultdict(lambda: [0, Decimal('0')])
+            for _, collect_id, occasion, minute, count, amount in deltas:
+                keys = {'collect_id': collect_id, 'occasion': occasion}
+                for model, field in SCOPES:
+                    group = groups[model, field, keys[field], minute]
+                    group[0] += count
+                    group[1] += amount
+            # Интервалы удаленных сборов удалены каскадно — в разрезе сборов их изменения не нужны
+            existing = set(Collect.objects.filter(
+                id__in={delta[1] for delta in deltas}
+            ).values_list('id', flat=True))
+
+            for (model, field, key, minute), (count, amount) in groups.items():
+                if (model is CollectRollup and key not in existing) or (not count and not amount):
+                    continue
+                if minute >= purged_before:
+                    _add(model, {field: key}, MINUTE, minute, count, amount, now)
+                else:
+                    _add(model, {field: key}, HOUR, truncate(minute, HOUR), count, amount, now, create=False)
+            RollupDelta.objects.filter(id__in=[delta[0] for delta in deltas]).delete()
+            folded += len(deltas)
+        if len(deltas) < batch_size:
+            return folded
+
+
+def _recompute(model, field, source, target, trunc, since, now):
+    """Пересчитывает интервалы target по измененным с since интервалам source"""
+    dirty = set(
+        model.objects.filter(granularity=source, updated_at__gte=since)
+        .annotate(target_bucket=trunc('bucket', tzinfo=dt_timezone.utc))
+        .values_list(field, 'target_bucket')
+    )
+    # Минуты удаляются целыми часами, поэтому у часа с измененной минутой есть все минуты
+    dirty = sorted(dirty, key=lambda item: (str(item[0]), item[1]))
+    step = GRANULARITIES[target]
+    for start in range(0, len(dirty), 200):
+        chunk = dirty[start:start + 200]
+        condition = Q()
+        for key, bucket in chunk:
+            condition |= Q(**{field: key}, bucket__gte=bucket, bucket__lt=bucket + step)
+        totals = {
+            (row[field], row['target_bucket']): row
+            for row in model.objects.filter(condition, granularity=source)
+            .annotate(target_bucket=trunc('bucket', tzinfo=dt_timezone.utc))
+            .values(field, 'target_bucket')
+            .annotate(count=Sum('payments_count'), amount=Sum('total_amount'))
+        }
+        for key, bucket in chunk:
+            row = totals.get((key, bucket), {'count': 0, 'amount': Decimal('0')})
+            model.objects.update_or_create(
+                granularity=target, bucket=bucket, **{field: key},
+                defaults={'payments_count': row['count'], 'total_amount': row['amount'], 'updated_at': now},
+            )
+    return len(dirty)
+
+
+def compact(now=None):
+    """Уплотнение: перенос изменений в минуты, минуты → часы → дни для измененных интервалов,
+    затем удаление старых минут.
+
+    Пересчет (а не прибавление) делает уплотнение идемпотентным и учитывает
+    опоздавшие и удаленные платежи. Возвращает число пересчитанных интервалов.
+    """
+    now = now or timezone.now()
+    fold(now)
+    # Без отметки (кэш сброшен) пересчитываем все, что могло измениться
+    since = cache.get(COMPACTED_AT_KEY) or now - get_minute_retention() - timedelta(hours=1)
+    recomputed = 0
+    for model, field in SCOPES:
+        recomputed += _recompute(model, field, MINUTE, HOUR, TruncHour, since, now)
+        recomputed += _recompute(model, field, HOUR, DAY, TruncDay, since, now)
+        # Удаляем минуты только целыми часами — их часы уже пересчитаны
+        model.objects.filter(
+            granularity=MINUTE, bucket__lt=truncate(now - get_minute_retention(), HOUR)
+        ).delete()
+    cache.set(COMPACTED_AT_KEY, now - COMPACTION_OVERLAP, timeout=None)
+    return recomputed
+
+
+def rebuild():
+    """Пересобирает все интервалы по таблице платежей"""
+    now = timezone.now()
+    payments = Payment.objects.order_by()
+    recent = payments.filter(date_added__gte=truncate(now - get_minute_retention(), HOUR))
+    levels = [(HOUR, TruncHour, payments), (DAY, TruncDay, payments), (MINUTE, TruncMinute, recent)]
+
+    with transaction.atomic():
+        # Платежи — источник истины: не перенесенные изменения в них уже учтены
+        RollupDelta.objects.all().delete()
+        for model, field in SCOPES:
+            model.objects.all().delete()
+            payment_field = 'collect_id' if field == 'collect_id' else 'collect__occasion'
+            for granularity, trunc, queryset in levels:
+                rows = (
+                    queryset.annotate(rollup_bucket=trunc('date_added', tzinfo=dt_timezone.utc))
+                    .values(payment_field, 'rollup_bucket')
+                    .annotate(count=Count('id'), amount=Sum('amount'))
+                    .iterator(chunk_size=2000)
+                )
+                while True:
+                    batch = [
+                        model(
+                            granularity=granularity, bucket=row['rollup_bucket'], payments_count=row['count'],
+                            total_amount=row['amount'], updated_at=now, **{field: row[payment_field]}
+                        )
+                        for row in islice(rows, 2000)
+                    ]
+                    if not batch:
+                        break
+                    model.objects.bulk_create(batch)
+    cache.set(COMPACTED_AT_KEY, now, timeout=None)
+
+
+def parse_range(params):
+    """Возвращает (интервал, начало, конец) из ?granularity=, ?start=, ?end= (ISO 8601)"""
+    granularity = params.get('granularity', HOUR)
+    if granularity not in GRANULARITIES:
+        raise serializers.ValidationError({'granularity': f'Допустимые значения: {", ".join(GRANULARITIES)}'})
+
+    bounds = {}
+    for name in ('start', 'end'):
+        value = params.get(name)
+        if value:
+            parsed = parse_datetime(value)
+            if parsed is None:
+                raise serializers.ValidationError({name: 'Ожидается дата и время в формате ISO 8601'})
+            if timezone.is_naive(parsed):
+                parsed = timezone.make_aware(parsed, dt_timezone.utc)
+            bounds[name] = parsed
+    end = bounds.get('end') or timezone.now()
+    start = bounds.get('start') or end - DEFAULT_RANGES[granularity]
+    if start >= end:
+        raise serializers.ValidationError({'start': 'Начало должно быть раньше конца'})
+    if (end - start) / GRANULARITIES[granularity] > get_max_points():
+        raise serializers.ValidationError({
+            'granularity': f'Больше {get_max_points()} точек — выберите более крупный интервал'
+        })
+    return granularity, truncate(start, granularity), end
+
+
+def series(model, lookup, params):
+    """Ряд точек графика из таблицы интервалов (одна строка на точку и разрез)"""
+    granularity, start, end = parse_range(params)
+    sources = [model.objects.filter(granularity=granularity, bucket__gte=start, bucket__lt=end, **lookup)]
+    if granularity == MINUTE:
+        # Изменения, еще не перенесенные fold(), — минутный график без задержки уплотнения
+        sources.append(RollupDelta.objects.filter(bucket__gte=start, bucket__lt=end, **lookup))
+
+    points = defaultdict(lambda: [0, Decimal('0')])
+    for queryset in sources:
+        rows = queryset.values('bucket').annotate(count=Sum('payments_count'), amount=Sum('total_amount')).order_by()
+        for row in rows:
+            points[row['bucket']][0] += row['count']
+            points[row['bucket']][1] += row['amount']
+    return {
+        'granularity': granularity,
+        'start': start,
+        'end': end,
+        'points': [
+            {'bucket': bucket, 'payments_count': count, 'amount': f'{amount:.2f}'}
+            for bucket, (count, amount) in sorted(points.items())
+        ],
+    }
+
+
+def collect_series(collect_id, params):
+    return series(CollectRollup, {'collect_id': collect_id}, params)
+
+
+class AnalyticsView(APIView):
+    """Пожертвования по всей платформе во времени; ?occasion= — по одному поводу"""
+
+    def get(self, request):
+        lookup = {}
+        occasion = request.query_params.get('occasion')
+        if occasion:
+            if occasion not in dict(Collect.OCCASION_CHOICES):
+                raise serializers.ValidationError({'occasion': 'Неизвестный повод'})
+            lookup['occasion'] = occasion
+        return Response(series(OccasionRollup, lookup, request.query_params))
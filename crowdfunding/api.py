@@ -0,0 +1,231 @@
+from django.conf import settings
+from django.db.models import F, Prefetch, Window
+from django.db.models.functions import RowNumber
+from rest_framework import generics, serializers, status
+from rest_framework.decorators import action
+from rest_framework.renderers import JSONRenderer
+from rest_framework.exceptions import NotFound, PermissionDenied
+from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.settings import api_settings
+
+from . import admission, analytics, bulk, intake, projection, search, views
+from .cache import CachedCollectViewMixin
+from .export import CSVRenderer, NDJSONRenderer, parse_period, stream_payments
+from .models import Payment
+from .pagination import CollectCursorPagination, PaymentCursorPagination
+from .renderers import FastJSONRenderer
+from .routing import ReplicaReadMixin
+from .serializers import CollectSerializer, PaymentBulkItemSerializer, parse_expand, parse_fields
+
+# Поля, требующие связанных таблиц в запросе
+RELATED_FIELDS = {
+    'author': 'author',
+    'donors_count': 'stats',
+    'stats': 'stats',
+    'status': 'lifecycle',
+}
+# JSON отдает FastJSONRenderer, остальные форматы — как настроено в DRF
+RENDERER_CLASSES = [FastJSONRenderer] + [
+    renderer for renderer in api_settings.DEFAULT_RENDERER_CLASSES if not issubclass(renderer, JSONRenderer)
+]
+
+
+def get_expand_max_limit():
+    """Максимальное число вложенных платежей на один сбор"""
+    return getattr(settings, 'COLLECT_EXPAND_MAX_LIMIT', 100)
+
+
+class CollectReadMixin:
+    """Чтение сборов: выбор полей (?fields=, ?expand=) и курсорная пагинация"""
+    pagination_class = CollectCursorPagination
+
+    def get_requested_shape(self):
+        """Возвращает (поля, лимит платежей) для текущего запроса"""
+        if hasattr(self, '_requested_shape'):
+            return self._requested_shape
+
+        all_fields = list(CollectSerializer.Meta.fields)
+        fields = parse_fields(self.request.query_params.get('fields'))
+        expand = parse_expand(self.request.query_params.get('expand'))
+
+        unknown = set(fields or []) - set(all_fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}'})
+        unknown = set(expand) - {'payments'}
+        if unknown:
+            raise serializers.ValidationError({'expand': f'Неизвестные вложения: {", ".join(sorted(unknown))}'})
+
+        if fields is None:
+            # Список по умолчанию — краткая сводка без платежей, детали — полностью
+            fields = [name for name in all_fields if name != 'payments' or self.action == 'retrieve']
+
+        limit = None
+        if 'payments' in expand:
+            fields = [name for name in fields if name != 'payments'] + ['payments']
+            limit = expand['payments'].get('limit')
+            try:
+                limit = int(limit) if limit is not None else get_expand_max_limit()
+            except ValueError:
+                limit = 0
+            if not 0 < limit <= get_expand_max_limit():
+                raise serializers.ValidationError({
+                    'expand': f'limit должен быть от 1 до {get_expand_max_limit()}'
+                })
+        elif 'payments' in fields and self.action != 'retrieve':
+            limit = get_expand_max_limit()
+
+        self._requested_shape = fields, limit
+        return self._requested_shape
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.action not in ('list', 'retrieve'):
+            return queryset.select_related('author', 'stats', 'lifecycle')
+        if self.action == 'list':
+            queryset = search.filter_collects(queryset, self.request.query_params)
+
+        # Подгружаем только то, что попадет в ответ
+        fields, limit = self.get_requested_shape()
+        queryset = queryset.select_related(None).prefetch_related(None)
+        related = {RELATED_FIELDS[name] for name in fields if name in RELATED_FIELDS}
+        if related:
+            queryset = queryset.select_related(*sorted(related))
+        if 'payments' in fields:
+            queryset = queryset.prefetch_related(Prefetch('payments', queryset=self.get_payments_queryset(limit)))
+        return queryset
+
+    def get_payments_queryset(self, limit):
+        """Платежи для поля payments: новые первыми, не больше limit на сбор"""
+        payments = Payment.objects.select_related('donator').order_by('-date_added', '-id')
+        if limit is not None:
+            # Последние N платежей каждого сбора одним запросом
+            payments = payments.annotate(row_number=Window(
+                RowNumber(),
+                partition_by=F('collect_id'),
+                order_by=[F('date_added').desc(), F('id').desc()],
+            )).filter(row_number__lte=limit)
+        return payments
+
+    # Быстрый путь чтения: values() вместо моделей и сериализаторов, тот же формат ответа
+
+    def list(self, request, *args, **kwargs):
+        fields, limit = self.get_requested_shape()
+        rows = projection.project_collects(self.filter_queryset(self.get_queryset()), fields)
+        page = self.paginate_queryset(rows)
+        items = projection.collect_items(page, fields, self.get_payments_queryset(limit))
+        return self.get_paginated_response(items)
+
+    def retrieve(self, request, *args, **kwargs):
+        fields, limit = self.get_requested_shape()
+        rows = projection.project_collects(self.filter_queryset(self.get_queryset()), fields)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        # Некорректный id (/collects/abc/) — тоже 404
+        row = generics.get_object_or_404(rows, **{self.lookup_field: self.kwargs[lookup_url_kwarg]})
+        # Строка values() — не модель: объектных прав у сборов нет (IsAuthenticatedOrReadOnly
+        # проверяется на уровне запроса), поэтому check_object_permissions здесь не вызывается
+        return Response(projection.collect_items([row], fields, self.get_payments_queryset(limit))[0])
+
+    @action(detail=True, methods=['get'])
+    def payments(self, request, pk=None):
+        collect = self.get_object()
+        paginator = PaymentCursorPagination()
+        page = paginator.paginate_queryset(projection.project_payments(collect.payments.all()), request, view=self)
+        return paginator.get_paginated_response(projection.payment_items(page))
+
+    @action(detail=True, methods=['get'], renderer_classes=[CSVRenderer, NDJSONRenderer])
+    def export(self, request, pk=None):
+        """Потоковая выгрузка платежей сбора для автора: ?format=csv|ndjson, ?since=, ?until="""
+        collect = self.get_object()
+        if collect.author_id != request.user.id and not request.user.is_staff:
+            raise PermissionDenied('Выгрузка платежей доступна только автору сбора')
+        since, until = parse_period(request.query_params)
+        return stream_payments(
+            collect.payments.all(), request.accepted_renderer.format, f'collect-{collect.id}-payments', since, until
+        )
+
+    @action(detail=True, methods=['get'])
+    def analytics(self, request, pk=None):
+        """Пожертвования сбора во времени: ?granularity=minute|hour|day, ?start=, ?end="""
+        collect = self.get_object()
+        return Response(analytics.collect_series(collect.id, request.query_params))
+
+
+class CollectViewSet(ReplicaReadMixin, CachedCollectViewMixin, CollectReadMixin, views.CollectViewSet):
+    """Сборы"""
+    renderer_classes = RENDERER_CLASSES
+
+    def is_list_cacheable(self, request):
+        # Сбор начинает подходить под фильтр после платежа, правки или смены статуса,
+        # а версии страницы, где его еще нет, этого не заметят
+        return not search.is_filtered(request.query_params)
+
+
+class PaymentViewSet(ReplicaReadMixin, views.PaymentViewSet):
+    """Платежи"""
+    renderer_classes = RENDERER_CLASSES
+
+    def create(self, request, *args, **kwargs):
+        """Создание платежа (при всплесках — 429 от ограничителя)"""
+        with admission.admit(request.user.id, admission.parse_collect_id(request.data)):
+            return self.create_payment(request, *args, **kwargs)
+
+    def create_payment(self, request, *args, **kwargs):
+        """Создание платежа; в режиме асинхронного приема — постановка в очередь (202)"""
+        if not intake.is_enabled():
+            return super().create(request, *args, **kwargs)
+
+        serializer = self.get_serializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        tracking_id = intake.submit(request.user, serializer.validated_data)
+        return Response({
+            'tracking_id': tracking_id,
+            'status': intake.QUEUED,
+            'status_url': reverse('payment-intake-status', args=[tracking_id], request=request),
+        }, status=status.HTTP_202_ACCEPTED)
+
+    @action(detail=False, methods=['get'], url_path=r'intake/(?P<tracking_id>[0-9a-f]{32})')
+    def intake_status(self, request, tracking_id=None):
+        """Статус платежа, принятого в очередь"""
+        entry = intake.get_status(tracking_id)
+        if entry is None or (entry['donator'] != request.user.id and not request.user.is_staff):
+            raise NotFound('Платеж в очереди не найден')
+        return Response(entry)
+
+    @action(detail=False, methods=['post'], url_path='bulk')
+    def bulk(self, request):
+        """Пакетное создание платежей с результатом по каждому элементу (ограничитель — по числу платежей)"""
+        if not isinstance(request.data, list) or not request.data:
+            raise serializers.ValidationError({'non_field_errors': 'Ожидается непустой список платежей'})
+        if len(request.data) > bulk.get_bulk_max_items():
+            raise serializers.ValidationError({
+                'non_field_errors': f'Не больше {bulk.get_bulk_max_items()} платежей за запрос'
+            })
+
+        collect_counts = admission.parse_collect_counts(request.data)
+        with admission.admit_batch(request.user.id, collect_counts, len(request.data)):
+            return self.create_bulk(request)
+
+    def create_bulk(self, request):
+        results = [None] * len(request.data)
+        valid = []
+        for index, item in enumerate(request.data):
+            serializer = PaymentBulkItemSerializer(data=item)
+            if serializer.is_valid():
+                valid.append((index, serializer.validated_data))
+            else:
+                results[index] = {'index': index, 'status': bulk.ERROR, 'errors': serializer.errors}
+
+        if valid:
+            ingested = bulk.ingest_payments(request.user, [data for _, data in valid])
+            for (index, _), result in zip(valid, ingested):
+                results[index] = dict(result, index=index)
+
+        created = sum(1 for result in results if result['status'] == bulk.CREATED)
+        if created == len(results):
+            response_status = status.HTTP_201_CREATED
+        elif created:
+            response_status = status.HTTP_207_MULTI_STATUS
+        else:
+            response_status = status.HTTP_400_BAD_REQUEST
+        return Response({'created': created, 'results': results}, status=response_status)
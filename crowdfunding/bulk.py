@@ -0,0 +1,119 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import analytics, digests, leaderboards, lifecycle, live, milestones, outbox, stats
+from .cache import invalidate_collect
+from .counters import add_amount, get_current_amount
+from .models import Collect, Payment
+from .tasks import send_payments_created_emails
+
+# Статусы элементов пачки в ответе
+CREATED = 'created'
+ERROR = 'error'
+
+
+def get_bulk_max_items():
+    """Максимальный размер пачки платежей"""
+    return getattr(settings, 'BULK_PAYMENTS_MAX_ITEMS', 500)
+
+
+def ingest_payments(donator, items):
+    """Проверяет и сохраняет пачку платежей.
+
+    items — список проверенных PaymentBulkItemSerializer словарей; элемент
+    может указать своего донатора в donator_id (платежи из очереди приема).
+    Сборы блокируются один раз, проверка целевой суммы учитывает уже принятые
+    платежи пачки, платежи пишутся одним bulk_create, а сумма каждого сбора
+    обновляется одним запросом. Возвращает результат по каждому элементу.
+    """
+    results = [None] * len(items)
+    with transaction.atomic():
+        collect_ids = {item['collect'] for item in items}
+        # Блокируем сборы по возрастанию id: пачки с общими сборами не взаимоблокируются
+        collects = {
+            collect.id: collect
+            for collect in Collect.objects.select_for_update(of=('self',)).select_related('author')
+            .filter(pk__in=collect_ids).order_by('pk')
+        }
+        remaining = {}
+        accepted = []
+
+        for index, item in enumerate(items):
+            collect = collects.get(item['collect'])
+            error = check_item(collect, item['amount'], remaining)
+            if error:
+                results[index] = {'index': index, 'status': ERROR, 'errors': error}
+                continue
+            if collect.target_amount:
+                remaining[collect.id] -= item['amount']
+            accepted.append((index, Payment(
+                donator_id=item.get('donator_id', donator and donator.id),
+                collect=collect,
+                amount=item['amount'],
+                comment=item.get('comment', ''),
+            )))
+
+        # bulk_create не вызывает сигналы — сумму, статистику и кэш обновляем сами
+        payments = Payment.objects.bulk_create([payment for _, payment in accepted])
+        by_collect = defaultdict(list)
+        for (index, _), payment in zip(accepted, payments):
+            results[index] = {'index': index, 'status': CREATED, 'id': payment.id}
+            by_collect[payment.collect_id].append(payment)
+
+        # Строки счетчиков и статистики — в том же порядке, что и сборы
+        for collect_id, collect_payments in sorted(by_collect.items()):
+            amount = sum(payment.amount for payment in collect_payments)
+            add_amount(collect_id, amount)
+            stats.on_payments_created(collect_id, collect_payments)
+            analytics.on_payments_created(collect_payments, {collect_id: collects[collect_id].occasion})
+            if collects[collect_id].target_amount:
+                collect = collects[collect_id]
+                # Остаток посчитан под блокировкой сбора, повторно читать сумму не нужно
+                current_amount = collect.target_amount - remaining[collect_id]
+                lifecycle.on_amount_changed(collect, current_amount)
+                # Пачка может пересечь несколько порогов сразу — уведомление на каждый
+                milestones.on_amount_changed(collect, current_amount - amount, current_amount)
+            if live.is_enabled():
+                collect = collects[collect_id]
+                collect.refresh_from_db(fields=['current_amount'])
+                live.on_payments_created(collect, collect_payments, get_current_amount(collect))
+            invalidate_collect(collect_id)
+
+        notify(collects, by_collect, remaining)
+
+    return results
+
+
+def check_item(collect, amount, remaining):
+    """Проверяет элемент пачки; возвращает ошибки или None"""
+    if collect is None:
+        return {'collect': 'Сбор не найден'}
+    if not collect.is_active:
+        return {'collect': 'Нельзя внести платеж в завершенный сбор'}
+    if collect.target_amount:
+        if collect.id not in remaining:
+            remaining[collect.id] = collect.target_amount - get_current_amount(collect)
+        if amount > remaining[collect.id]:
+            return {'amount': f'Платеж превышает целевую сумму. Осталось собрать: {remaining[collect.id]}'}
+    return None
+
+
+def notify(collects, by_collect, remaining):
+    """Записывает в outbox уведомления по всей пачке (несколько сообщений вместо сообщений на каждый платеж).
+
+    Вызывается в транзакции пачки; рейтинги обновляются после коммита.
+    """
+    payments = [payment for payment_list in by_collect.values() for payment in payment_list]
+    if not payments:
+        return
+    outbox.enqueue(send_payments_created_emails, [payment.id for payment in payments])
+    transaction.on_commit(lambda: leaderboards.on_payments_created(payments))
+
+    for collect_id, collect_payments in by_collect.items():
+        collect = collects[collect_id]
+        # Платежи автора в свой сбор в дайджест не попадают
+        from_donors = [payment for payment in collect_payments if payment.donator_id != collect.author_id]
+        if digests.is_enabled() and from_donors:
+            digests.register_payments(collect_id, from_donors)
@@ -0,0 +1,285 @@
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.decorators import action
+from rest_framework.response import Response
+
+from . import instrumentation, routing
+from .conditional import last_modified, make_etag, not_modified, set_validators
+
+LIST_GENERATION_KEY = 'collects:list:generation'
+COLLECT_VERSION_KEY = 'collects:{collect_id}:version'
+# Время последнего изменения (для Last-Modified)
+LIST_MODIFIED_KEY = 'collects:list:modified'
+COLLECT_MODIFIED_KEY = 'collects:{collect_id}:modified'
+HITS_KEY = 'collects:cache:hits'
+MISSES_KEY = 'collects:cache:misses'
+
+
+def get_cache_timeout():
+    """Время жизни закэшированных ответов по сборам"""
+    return getattr(settings, 'COLLECT_CACHE_TIMEOUT', 300)
+
+
+def get_version_timeout():
+    """Время жизни ключей версий (не меньше времени жизни ответов).
+
+    Ключ создается для любого id из URL, поэтому бессрочным быть не может;
+    после истечения версия заново инициализируется временем и не совпадет со старой.
+    """
+    return max(getattr(settings, 'COLLECT_VERSION_TIMEOUT', 60 * 60), get_cache_timeout())
+
+
+def _initial_version():
+    # Версия после вытеснения ключа не должна совпасть со старой
+    return int(time.time() * 1000)
+
+
+def _get_or_init(key):
+    value = cache.get(key)
+    if value is None:
+        cache.add(key, _initial_version(), timeout=get_version_timeout())
+        value = cache.get(key)
+    return value
+
+
+def _bump(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, _initial_version(), timeout=get_version_timeout())
+
+
+def _count_lookup(hit):
+    instrumentation.record('cache_gets')
+    instrumentation.record('cache_hits' if hit else 'cache_misses')
+    _incr_counter(HITS_KEY if hit else MISSES_KEY)
+
+
+def _incr_counter(key):
+    # Обычно ключ уже есть — один запрос к кэшу; add только для первого обращения
+    try:
+        cache.incr(key)
+    except ValueError:
+        if not cache.add(key, 1, timeout=None):
+            # Ключ успел создать параллельный запрос
+            cache.incr(key)
+
+
+def get_list_generation():
+    """Поколение списка сборов (меняется при создании и удалении сборов)"""
+    return _get_or_init(LIST_GENERATION_KEY)
+
+
+def get_collect_version(collect_id):
+    """Версия сбора (меняется при любом изменении сбора или его платежей)"""
+    return _get_or_init(COLLECT_VERSION_KEY.format(collect_id=collect_id))
+
+
+def get_collect_versions(collect_ids):
+    """Версии нескольких сборов одним запросом к кэшу"""
+    keys = {COLLECT_VERSION_KEY.format(collect_id=collect_id): collect_id for collect_id in collect_ids}
+    found = cache.get_many(list(keys))
+    versions = {keys[key]: value for key, value in found.items()}
+    for collect_id in collect_ids:
+        if collect_id not in versions:
+            versions[collect_id] = get_collect_version(collect_id)
+    return versions
+
+
+def invalidate_collect(collect_id, list_changed=False):
+    """Инвалидирует кэш одного сбора.
+
+    Версия меняется сразу и еще раз после коммита транзакции, чтобы ответ,
+    закэшированный читателем до коммита, не пережил изменение.
+    list_changed=True сбрасывает и страницы списка (состав списка изменился).
+    """
+    def bump():
+        # Время изменения пишется до версии: читатель, увидевший новую версию,
+        # увидит и время, по которому поймет, что его выборка могла устареть
+        modified = {COLLECT_MODIFIED_KEY.format(collect_id=collect_id): time.time()}
+        if list_changed:
+            modified[LIST_MODIFIED_KEY] = time.time()
+        cache.set_many(modified, timeout=None)
+        _bump(COLLECT_VERSION_KEY.format(collect_id=collect_id))
+        if list_changed:
+            _bump(LIST_GENERATION_KEY)
+
+    bump()
+    transaction.on_commit(bump)
+
+
+def invalidate_collects(collect_ids, list_changed=False):
+    """Инвалидирует кэш многих сборов пачкой запросов (массовая загрузка данных).
+
+    Ключи версий удаляются: заново инициализированная временем версия не совпадет со старой.
+    """
+    now = time.time()
+    modified = {COLLECT_MODIFIED_KEY.format(collect_id=collect_id): now for collect_id in collect_ids}
+    if list_changed:
+        modified[LIST_MODIFIED_KEY] = now
+    cache.set_many(modified, timeout=None)
+    cache.delete_many([COLLECT_VERSION_KEY.format(collect_id=collect_id) for collect_id in collect_ids])
+    if list_changed:
+        _bump(LIST_GENERATION_KEY)
+
+
+def get_modified_times(collect_ids, list_modified=False):
+    """Время последнего изменения сборов (None — неизвестно)"""
+    keys = [COLLECT_MODIFIED_KEY.format(collect_id=collect_id) for collect_id in collect_ids]
+    if list_modified:
+        keys.append(LIST_MODIFIED_KEY)
+    found = cache.get_many(keys)
+    return [found.get(key) for key in keys]
+
+
+def changed_since(timestamps, started):
+    """Менялись ли данные после момента started (None — давно)"""
+    return any(timestamp is not None and timestamp >= started for timestamp in timestamps)
+
+
+def cache_stats():
+    """Счетчики попаданий и промахов кэша сборов"""
+    hits = cache.get(HITS_KEY) or 0
+    misses = cache.get(MISSES_KEY) or 0
+    total = hits + misses
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_rate': round(hits / total, 4) if total else 0,
+    }
+
+
+def reset_cache_stats():
+    """Обнуляет счетчики попаданий и промахов"""
+    cache.delete_many([HITS_KEY, MISSES_KEY])
+
+
+def _request_signature(request):
+    return hashlib.md5(request.get_full_path().encode()).hexdigest()
+
+
+def get_cached_list(request):
+    """Возвращает закэшированную страницу списка и версии ее сборов, если они актуальны"""
+    key = f'collects:list:{get_list_generation()}:{_request_signature(request)}'
+    entry = cache.get(key)
+    if entry is not None and get_collect_versions(list(entry['versions'])) == entry['versions']:
+        _count_lookup(hit=True)
+        return key, entry['data'], entry['versions']
+    _count_lookup(hit=False)
+    return key, None, None
+
+
+def set_cached_list(key, data, versions):
+    instrumentation.record('cache_sets')
+    cache.set(key, {'versions': versions, 'data': data}, timeout=get_cache_timeout())
+
+
+def collect_cache_key(prefix, collect_id, request):
+    """Ключ ответа по одному сбору (детали, платежи) для его текущей версии"""
+    version = get_collect_version(collect_id)
+    return f'collects:{prefix}:{collect_id}:{version}:{_request_signature(request)}'
+
+
+def get_cached_collect(prefix, collect_id, request, key=None):
+    """Возвращает закэшированный ответ по одному сбору (детали, платежи)"""
+    key = key or collect_cache_key(prefix, collect_id, request)
+    data = cache.get(key)
+    _count_lookup(hit=data is not None)
+    return key, data
+
+
+def set_cached_collect(key, data):
+    instrumentation.record('cache_sets')
+    cache.set(key, data, timeout=get_cache_timeout())
+
+
+class CachedCollectViewMixin:
+    """Кэширование списка, деталей и платежей сбора с версионной инвалидацией.
+
+    Те же версии дают сильный ETag (и Last-Modified), поэтому повторный
+    запрос с If-None-Match получает 304 без чтения из БД и сериализации.
+    """
+
+    def get_etag(self, *parts):
+        # Представление зависит и от формата ответа (JSON, browsable API)
+        return make_etag(*parts, self.request.get_full_path(), self.request.accepted_media_type)
+
+    def is_list_cacheable(self, request):
+        """Можно ли кэшировать страницу списка по версиям попавших в нее сборов"""
+        return True
+
+    def list(self, request, *args, **kwargs):
+        cacheable = self.is_list_cacheable(request)
+        key, data, versions = get_cached_list(request) if cacheable else (None, None, None)
+        if data is not None:
+            response = Response(data)
+        else:
+            # Момент до выборки: изменение, закоммиченное после него, могло
+            # не попасть в страницу, хотя версии ниже прочитаются уже новые
+            started = time.time()
+            response = super().list(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            results = response.data.get('results', []) if isinstance(response.data, dict) else response.data
+            # Страница зависит только от версий попавших в нее сборов;
+            # без id в ответе (?fields= без id) версии не отследить — не кэшируем
+            if not all('id' in item for item in results):
+                return response
+            versions = get_collect_versions([item['id'] for item in results])
+            modified_times = get_modified_times(list(versions), list_modified=True)
+            if routing.reading_from_replica() and routing.changed_recently(modified_times):
+                # Реплика могла еще не получить изменение: под новой версией такую страницу не храним
+                return response
+            if changed_since(modified_times, started):
+                # Страница может быть старше версий — ни кэша, ни ETag, иначе клиент
+                # получал бы 304 на устаревшие данные до следующего изменения
+                return response
+            if cacheable:
+                set_cached_list(key, response.data, versions)
+
+        # Некэшируемая страница получает ETag по свежей выборке — 304 только если состав не изменился
+        etag = self.get_etag('list', key, sorted(versions.items()))
+        modified = last_modified(get_modified_times(list(versions), list_modified=True))
+        return not_modified(request, etag, modified) or set_validators(response, etag, modified)
+
+    def retrieve(self, request, *args, **kwargs):
+        collect_id = self.kwargs[self.lookup_url_kwarg or self.lookup_field]
+        return self.collect_response('detail', collect_id, super().retrieve, request, *args, **kwargs)
+
+    @action(detail=True, methods=['get'])
+    def payments(self, request, pk=None):
+        return self.collect_response('payments', pk, super().payments, request, pk=pk)
+
+    def collect_response(self, prefix, collect_id, get_response, request, *args, **kwargs):
+        """Ответ по одному сбору: 304 по версии, затем кэш, затем полный ответ"""
+        # Валидаторы берутся до данных: при изменении между ними клиент получит
+        # старый ETag с новыми данными и просто перезапросит их, но не наоборот
+        key = collect_cache_key(prefix, collect_id, request)
+        etag = self.get_etag(prefix, key)
+        modified_times = get_modified_times([collect_id])
+        modified = last_modified(modified_times)
+        response = not_modified(request, etag, modified)
+        if response is not None:
+            return response
+
+        key, data = get_cached_collect(prefix, collect_id, request, key=key)
+        if data is not None:
+            return set_validators(Response(data), etag, modified)
+        if routing.reading_from_replica() and routing.changed_recently(modified_times):
+            # Сбор только что изменился — реплика могла отстать, а ответ попадет в кэш под новой версией
+            with routing.use_primary():
+                response = get_response(request, *args, **kwargs)
+        else:
+            response = get_response(request, *args, **kwargs)
+        if response.status_code == 200:
+            set_cached_collect(key, response.data)
+            set_validators(response, etag, modified)
+        return response
+
+    @action(detail=False, methods=['get'], url_path='cache-stats')
+    def cache_stats(self, request):
+        return Response(cache_stats())
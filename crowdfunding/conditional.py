@@ -0,0 +1,44 @@
+import hashlib
+import math
+import time
+
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date, quote_etag
+
+
+def make_etag(*parts):
+    """Сильный ETag из версий и параметров представления (без сериализации ответа)"""
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def last_modified(timestamps):
+    """Last-Modified по времени изменений или None.
+
+    HTTP-даты секундные: если изменение было в текущей секунде, следующее
+    изменение в ту же секунду не сдвинет дату и If-Modified-Since вернет
+    ложный 304. Поэтому дата отдается только за завершившиеся секунды
+    (и если все времена известны — после вытеснения из кэша их нет).
+    """
+    if not timestamps or any(timestamp is None for timestamp in timestamps):
+        return None
+    latest = max(timestamps)
+    if math.floor(latest) >= math.floor(time.time()):
+        return None
+    return math.floor(latest)
+
+
+def not_modified(request, etag, modified=None):
+    """Ответ 304/412 по заголовкам If-*, если он нужен, иначе None"""
+    response = get_conditional_response(request, etag=etag, last_modified=modified)
+    if response is not None:
+        set_validators(response, etag, modified)
+    return response
+
+
+def set_validators(response, etag, modified=None):
+    # Клиент и прокси хранят ответ, но перед использованием перепроверяют его
+    patch_cache_control(response, no_cache=True)
+    response['ETag'] = etag
+    if modified is not None:
+        response['Last-Modified'] = http_date(modified)
+    return response
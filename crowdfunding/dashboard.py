@@ -0,0 +1,152 @@
+from django.conf import settings
+from django.db import connection
+from django.db.models import Count, Max, Q, Sum
+from django.utils import timezone
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from . import projection
+from .counters import CollectCounterShard, get_shards_count
+from .models import Collect, Payment
+from .routing import ReplicaReadMixin
+
+# Поля сборов в ответе (как в CollectSerializer)
+COLLECT_FIELDS = [
+    'id', 'name', 'occasion', 'target_amount', 'current_amount', 'end_datetime', 'is_active', 'status',
+    'donors_count',
+]
+# Составные индексы: имя, модель, колонки
+INDEXES = [
+    ('crowdfunding_collect_author_created_idx', Collect, ['author_id', 'created_at', 'id']),
+    ('crowdfunding_payment_donator_date_idx', Payment, ['donator_id', 'date_added', 'id']),
+]
+
+
+def get_collects_limit():
+    """Сколько последних собственных сборов показывает дашборд"""
+    return getattr(settings, 'DASHBOARD_COLLECTS_LIMIT', 50)
+
+
+def get_donations_limit():
+    """Сколько последних пожертвований показывает дашборд"""
+    return getattr(settings, 'DASHBOARD_DONATIONS_LIMIT', 20)
+
+
+def install(using=connection):
+    """Создает составные индексы автора и жертвователя (идемпотентно).
+
+    Выборки дашборда идут по индексу сразу в порядке даты, без сортировки всех строк пользователя.
+    """
+    if using.vendor not in ('postgresql', 'sqlite'):
+        return
+    with using.cursor() as cursor:
+        for name, model, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {model._meta.db_table} ({", ".join(columns)})')
+
+
+def total(value):
+    """Сумма по многим строкам: может не поместиться в 12 знаков поля суммы"""
+    return f'{value or 0:.2f}'
+
+
+def progress(row):
+    """Процент сбора от цели (None — цели нет)"""
+    if not row['target_amount']:
+        return None
+    return float(round(row['current_amount'] * 100 / row['target_amount'], 2))
+
+
+def collects_block(user, now):
+    """Собственные сборы: итоги одним агрегатом и последние сборы одной выборкой.
+
+    Суммы и число донаторов — с еще не свернутыми шардами счетчиков и не
+    перенесенными изменениями статистики: пользователь сразу видит свой платеж.
+    """
+    queryset = Collect.objects.filter(author=user)
+    summary = queryset.order_by().aggregate(
+        count=Count('id'),
+        active_count=Count('id', filter=Q(end_datetime__gt=now)),
+        raised=Sum('current_amount'),
+    )
+    rows = list(projection.project_collects(queryset.order_by('-created_at', '-id'), COLLECT_FIELDS)
+                [:get_collects_limit()])
+
+    if get_shards_count() > 1:
+        pending = dict(
+            CollectCounterShard.objects.filter(collect__author=user).exclude(amount=0)
+            .values('collect_id').annotate(total=Sum('amount')).values_list('collect_id', 'total').order_by()
+        )
+        summary['raised'] = (summary['raised'] or 0) + sum(pending.values())
+        for row in rows:
+            row['current_amount'] += pending.get(row['id'], 0)
+
+    items = projection.collect_items(rows, COLLECT_FIELDS)
+    for item, row in zip(items, rows):
+        item['progress'] = progress(row)
+    return {
+        'count': summary['count'],
+        'active_count': summary['active_count'],
+        'raised': total(summary['raised']),
+        'items': items,
+    }
+
+
+def donations_block(user, formats):
+    """Пожертвования пользователя: итоги, разбивка по поводам и последние платежи"""
+    queryset = Payment.objects.filter(donator=user).order_by()
+    summary = queryset.aggregate(
+        count=Count('id'),
+        total_amount=Sum('amount'),
+        collects_count=Count('collect_id', distinct=True),
+        last_payment_at=Max('date_added'),
+    )
+    by_occasion = (
+        queryset.values('collect__occasion')
+        .annotate(payments_count=Count('id'), total_amount=Sum('amount'))
+        .order_by('collect__occasion')
+    )
+    rows = (
+        queryset.order_by('-date_added', '-id')
+        .values('id', 'amount', 'comment', 'date_added', 'collect_id', 'collect__name', 'collect__occasion')
+        [:get_donations_limit()]
+    )
+    return {
+        'count': summary['count'],
+        'total_amount': total(summary['total_amount']),
+        'collects_count': summary['collects_count'],
+        'last_payment_at': formats.optional_datetime(summary['last_payment_at']),
+        'by_occasion': [
+            {
+                'occasion': row['collect__occasion'],
+                'payments_count': row['payments_count'],
+                'total_amount': total(row['total_amount']),
+            }
+            for row in by_occasion
+        ],
+        'items': [
+            {
+                'id': row['id'],
+                'collect': {'id': row['collect_id'], 'name': row['collect__name'], 'occasion': row['collect__occasion']},
+                'amount': formats.decimal(row['amount']),
+                'comment': row['comment'],
+                'date_added': formats.datetime(row['date_added']),
+            }
+            for row in rows
+        ],
+    }
+
+
+class DashboardView(ReplicaReadMixin, APIView):
+    """Дашборд пользователя: свои сборы с прогрессом и история пожертвований.
+
+    Число запросов к БД не зависит от количества сборов и платежей пользователя.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        formats = projection.Formats()
+        return Response({
+            'collects': collects_block(request.user, timezone.now()),
+            'donations': donations_block(request.user, formats),
+        })
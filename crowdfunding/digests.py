@@ -0,0 +1,129 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import models, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce
+
+from .models import Collect, Payment
+
+PENDING_KEY = 'digest:{collect_id}:pending'
+
+# Что сделать после учета платежа в дайджесте
+SCHEDULE = 'schedule'
+FLUSH = 'flush'
+
+
+class DigestPayment(models.Model):
+    """Платеж, еще не попавший в дайджест автора.
+
+    Строка пишется в транзакции платежа и становится видна вместе с ним:
+    id платежей выдаются не в порядке коммита, поэтому отметка «последний
+    отправленный id» теряла платеж с меньшим id, закоммиченный позже.
+    """
+    payment = models.OneToOneField(Payment, on_delete=models.CASCADE, primary_key=True, related_name='+')
+    collect = models.ForeignKey(Collect, on_delete=models.CASCADE, related_name='+')
+
+    def __str__(self):
+        return f'{self.collect_id}: {self.payment_id}'
+
+
+def get_digest_window():
+    """Окно (сек.) накопления уведомлений автору; 0 — дайджесты выключены"""
+    return getattr(settings, 'AUTHOR_DIGEST_WINDOW', 0)
+
+
+def get_digest_max_payments():
+    """После скольких платежей дайджест отправляется, не дожидаясь конца окна"""
+    return getattr(settings, 'AUTHOR_DIGEST_MAX_PAYMENTS', 100)
+
+
+def get_digest_top_donors():
+    return getattr(settings, 'AUTHOR_DIGEST_TOP_DONORS', 5)
+
+
+def is_enabled():
+    return get_digest_window() > 0
+
+
+def register_payment(payment):
+    """Учитывает платеж в дайджесте автора (см. register_payments)"""
+    register_payments(payment.collect_id, [payment])
+
+
+def register_payments(collect_id, payments):
+    """Учитывает платежи сбора в дайджесте автора (в транзакции платежей).
+
+    Платежи запоминаются в транзакции, а счетчик окна растет только после
+    коммита — откатившиеся платежи не приближают досрочную отправку.
+    """
+    DigestPayment.objects.bulk_create([DigestPayment(payment=payment, collect_id=collect_id) for payment in payments])
+    transaction.on_commit(lambda: schedule(collect_id, count_payments(collect_id, len(payments))))
+
+
+def count_payments(collect_id, count):
+    """Прибавляет платежи к окну сбора.
+
+    Возвращает SCHEDULE для первого платежа окна (нужна отложенная отправка),
+    FLUSH при достижении лимита платежей и None в остальных случаях —
+    то есть задача ставится раз в окно, а не на каждый платеж. Ключ окна
+    живет не дольше окна: если отложенная задача потерялась, следующий
+    платеж после окна откроет новое.
+    """
+    key = PENDING_KEY.format(collect_id=collect_id)
+    if cache.add(key, count, timeout=get_digest_window()):
+        return FLUSH if count >= get_digest_max_payments() else SCHEDULE
+    try:
+        pending = cache.incr(key, count)
+    except ValueError:
+        # Ключ сброшен отправкой дайджеста между add и incr — начинаем новое окно
+        return SCHEDULE if cache.add(key, count, timeout=get_digest_window()) else None
+
+    # Лимит срабатывает один раз — на платеже, который его пересек
+    return FLUSH if pending - count < get_digest_max_payments() <= pending else None
+
+
+def schedule(collect_id, action):
+    """Записывает в outbox отправку дайджеста: отложенную на окно или немедленную"""
+    from .outbox import enqueue
+    from .tasks import send_author_digest
+
+    if action == SCHEDULE:
+        enqueue(send_author_digest, collect_id, countdown=get_digest_window())
+    elif action == FLUSH:
+        enqueue(send_author_digest, collect_id)
+
+
+def take_digest(collect):
+    """Забирает накопленные для автора платежи сбора.
+
+    Возвращает None, если с прошлого дайджеста новых платежей нет.
+    """
+    cache.delete(PENDING_KEY.format(collect_id=collect.id))
+
+    with transaction.atomic():
+        # Параллельный дайджест того же сбора ждет блокировки и не посчитает платежи второй раз
+        payment_ids = list(
+            DigestPayment.objects.select_for_update().filter(collect_id=collect.id).values_list('payment_id', flat=True)
+        )
+        if not payment_ids:
+            return None
+
+        payments = Payment.objects.filter(id__in=payment_ids)
+        totals = payments.aggregate(
+            count=Count('id'),
+            total=Coalesce(Sum('amount'), Decimal('0')),
+        )
+        top_donors = list(
+            payments.values('donator__username')
+            .annotate(total=Sum('amount'), count=Count('id'))
+            .order_by('-total')[:get_digest_top_donors()]
+        )
+        DigestPayment.objects.filter(payment_id__in=payment_ids).delete()
+
+    return {
+        'count': totals['count'],
+        'total': totals['total'],
+        'top_donors': top_donors,
+    }
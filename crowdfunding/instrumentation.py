@@ -0,0 +1,237 @@
+import json
+import logging
+import time
+from contextlib import contextmanager, nullcontext
+from contextvars import ContextVar
+
+from celery.signals import before_task_publish, task_postrun, task_prerun
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from rest_framework import permissions
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger('crowdfunding.perf')
+
+STATS_KEY = 'perf:{name}:{metric}'
+STATS_NAMES_KEY = 'perf:names'
+COUNTERS = ['queries', 'cache_gets', 'cache_sets', 'cache_hits', 'cache_misses', 'tasks_enqueued']
+TIMERS = ['total', 'db', 'serializer']
+
+_current = ContextVar('perf_metrics', default=None)
+
+
+def is_enabled():
+    return getattr(settings, 'PERF_INSTRUMENTATION', False)
+
+
+class Metrics:
+    """Метрики одного запроса или задачи"""
+
+    def __init__(self, name):
+        self.name = name
+        self.counters = dict.fromkeys(COUNTERS, 0)
+        # Время в миллисекундах
+        self.timers = dict.fromkeys(TIMERS, 0.0)
+        self.depth = {}
+        self.started = time.perf_counter()
+
+    def finish(self):
+        self.timers['total'] = (time.perf_counter() - self.started) * 1000
+
+    def as_dict(self):
+        return {
+            'name': self.name,
+            **self.counters,
+            **{f'{timer}_ms': round(value, 3) for timer, value in self.timers.items()},
+        }
+
+    def server_timing(self):
+        return ', '.join([
+            f'db;dur={self.timers["db"]:.2f};desc="{self.counters["queries"]} queries"',
+            f'serializer;dur={self.timers["serializer"]:.2f}',
+            f'cache;desc="hits={self.counters["cache_hits"]} misses={self.counters["cache_misses"]} '
+            f'gets={self.counters["cache_gets"]} sets={self.counters["cache_sets"]}"',
+            f'tasks;desc="{self.counters["tasks_enqueued"]} enqueued"',
+            f'total;dur={self.timers["total"]:.2f}',
+        ])
+
+
+def record(counter, value=1):
+    """Увеличивает счетчик текущего запроса/задачи (без замера — ничего не делает)"""
+    metrics = _current.get()
+    if metrics is not None:
+        metrics.counters[counter] += value
+
+
+def span(timer):
+    """Контекст замера времени; вложенные замеры одного таймера не суммируются"""
+    metrics = _current.get()
+    if metrics is None:
+        return nullcontext()
+    return _span(metrics, timer)
+
+
+@contextmanager
+def _span(metrics, timer):
+    depth = metrics.depth.get(timer, 0)
+    metrics.depth[timer] = depth + 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        metrics.depth[timer] = depth
+        if depth == 0:
+            metrics.timers[timer] += (time.perf_counter() - started) * 1000
+
+
+def _query_wrapper(execute, sql, params, many, context):
+    metrics = _current.get()
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        if metrics is not None:
+            metrics.counters['queries'] += 1
+            metrics.timers['db'] += (time.perf_counter() - started) * 1000
+
+
+@contextmanager
+def measure(name):
+    """Собирает метрики блока кода: SQL, кэш, задачи, сериализация"""
+    metrics = Metrics(name)
+    token = _current.set(metrics)
+    try:
+        with _wrap_connections():
+            yield metrics
+    finally:
+        metrics.finish()
+        _current.reset(token)
+
+
+@contextmanager
+def _wrap_connections():
+    wrappers = [conn.execute_wrapper(_query_wrapper) for conn in connections.all()]
+    for wrapper in wrappers:
+        wrapper.__enter__()
+    try:
+        yield
+    finally:
+        for wrapper in reversed(wrappers):
+            wrapper.__exit__(None, None, None)
+
+
+def _stats_key(name, metric):
+    # Пробелы в ключах недопустимы для memcached
+    return STATS_KEY.format(name=name.replace(' ', '.'), metric=metric)
+
+
+def publish(metrics):
+    """Пишет строку лога и добавляет метрики в агрегированную статистику"""
+    logger.info(json.dumps(metrics.as_dict(), ensure_ascii=False))
+
+    names = cache.get(STATS_NAMES_KEY) or set()
+    if metrics.name not in names:
+        cache.set(STATS_NAMES_KEY, names | {metrics.name}, timeout=None)
+
+    values = {'count': 1, **metrics.counters}
+    values.update({f'{timer}_us': int(value * 1000) for timer, value in metrics.timers.items()})
+    for metric, value in values.items():
+        key = _stats_key(metrics.name, metric)
+        if not cache.add(key, value, timeout=None):
+            try:
+                cache.incr(key, value)
+            except ValueError:
+                cache.add(key, value, timeout=None)
+
+
+def get_stats():
+    """Средние значения метрик по каждому эндпоинту и задаче"""
+    stats = {}
+    for name in sorted(cache.get(STATS_NAMES_KEY) or ()):
+        metrics = ['count', *COUNTERS, *(f'{timer}_us' for timer in TIMERS)]
+        keys = {_stats_key(name, metric): metric for metric in metrics}
+        values = {keys[key]: value for key, value in cache.get_many(list(keys)).items()}
+        count = values.get('count') or 0
+        if not count:
+            continue
+        entry = {'count': count}
+        for counter in COUNTERS:
+            entry[f'avg_{counter}'] = round(values.get(counter, 0) / count, 2)
+        for timer in TIMERS:
+            entry[f'avg_{timer}_ms'] = round(values.get(f'{timer}_us', 0) / count / 1000, 3)
+        stats[name] = entry
+    return stats
+
+
+def reset_stats():
+    names = cache.get(STATS_NAMES_KEY) or ()
+    metrics = ['count', *COUNTERS, *(f'{timer}_us' for timer in TIMERS)]
+    cache.delete_many([_stats_key(name, metric) for name in names for metric in metrics])
+    cache.delete(STATS_NAMES_KEY)
+
+
+class PerformanceMiddleware:
+    """Замер каждого запроса: заголовок Server-Timing, лог и агрегированная статистика.
+
+    Подключается в MIDDLEWARE и работает только при PERF_INSTRUMENTATION = True;
+    в выключенном состоянии — одна проверка настройки на запрос.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_enabled():
+            return self.get_response(request)
+
+        with measure('other') as metrics:
+            response = self.get_response(request)
+        # Группируем по имени маршрута, а не по пути — иначе каждый id станет отдельной записью
+        match = getattr(request, 'resolver_match', None)
+        if match is not None and match.url_name:
+            metrics.name = f'{request.method} {match.url_name}'
+        response['Server-Timing'] = metrics.server_timing()
+        publish(metrics)
+        return response
+
+
+class PerfStatsView(APIView):
+    """Агрегированная статистика производительности по эндпоинтам и задачам"""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        return Response(get_stats())
+
+    def delete(self, request):
+        reset_stats()
+        return Response(status=204)
+
+
+@before_task_publish.connect
+def on_task_publish(sender=None, **kwargs):
+    from .tasks import dispatch_outbox_message
+    # Публикации реле outbox уже учтены при записи сообщения (outbox.enqueue)
+    if sender != dispatch_outbox_message.name:
+        record('tasks_enqueued')
+
+
+_task_contexts = {}
+
+
+@task_prerun.connect
+def on_task_prerun(task_id=None, task=None, **kwargs):
+    if is_enabled():
+        context = measure(f'task {task.name}')
+        context.__enter__()
+        _task_contexts[task_id] = context
+
+
+@task_postrun.connect
+def on_task_postrun(task_id=None, **kwargs):
+    context = _task_contexts.pop(task_id, None)
+    if context is not None:
+        metrics = _current.get()
+        context.__exit__(None, None, None)
+        publish(metrics)
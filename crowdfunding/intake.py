@@ -0,0 +1,299 @@
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import timedelta
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, models, transaction
+from django.utils import timezone
+
+from . import bulk
+from .tasks import drain_payment_intake
+
+logger = logging.getLogger(__name__)
+
+QUEUE_KEY = 'payments:intake'
+PROCESSING_KEY = 'payments:intake:processing:{worker_id}'
+WORKERS_KEY = 'payments:intake:workers'
+STATUS_KEY = 'payments:intake:{tracking_id}'
+DRAIN_SCHEDULED_KEY = 'payments:intake:drain-scheduled'
+
+# Статусы платежа в очереди приема
+QUEUED = 'queued'
+CREATED = bulk.CREATED
+ERROR = bulk.ERROR
+
+
+def is_enabled():
+    """Асинхронный прием платежей: POST отвечает 202, запись делают воркеры"""
+    return getattr(settings, 'PAYMENT_INTAKE_ASYNC', False)
+
+
+def get_batch_size():
+    """Сколько платежей воркер записывает одной транзакцией"""
+    return getattr(settings, 'PAYMENT_INTAKE_BATCH_SIZE', 200)
+
+
+def get_status_timeout():
+    """Сколько хранится статус платежа из очереди"""
+    return getattr(settings, 'PAYMENT_INTAKE_STATUS_TIMEOUT', 60 * 60 * 24)
+
+
+def get_lease():
+    """За сколько секунд воркер должен записать и подтвердить пачку, иначе она вернется в очередь"""
+    return getattr(settings, 'PAYMENT_INTAKE_LEASE', 300)
+
+
+class IntakeReceipt(models.Model):
+    """Отметка о записанном платеже из очереди.
+
+    Пишется той же транзакцией, что и платеж: пачка, вернувшаяся в очередь после
+    падения воркера между коммитом и подтверждением, не создаст платеж дважды.
+    """
+    tracking_id = models.CharField(max_length=32, primary_key=True)
+    created_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return self.tracking_id
+
+
+class MemoryIntakeQueue:
+    """Очередь в памяти процесса (для тестов и разработки с Celery в режиме eager)"""
+
+    def __init__(self):
+        self.items = deque()
+        # {id воркера: (срок аренды, пачка)}
+        self.processing = {}
+        self.lock = threading.Lock()
+
+    def push(self, item):
+        with self.lock:
+            self.items.append(item)
+
+    def claim(self, worker_id, size):
+        with self.lock:
+            batch = [self.items.popleft() for _ in range(min(size, len(self.items)))]
+            if batch:
+                self.processing[worker_id] = (time.monotonic() + get_lease(), batch)
+            return batch
+
+    def ack(self, worker_id):
+        with self.lock:
+            self.processing.pop(worker_id, None)
+
+    def reap(self):
+        now = time.monotonic()
+        with self.lock:
+            expired = [worker_id for worker_id, (deadline, _) in self.processing.items() if deadline <= now]
+            requeued = 0
+            for worker_id in expired:
+                _, batch = self.processing.pop(worker_id)
+                self.items.extendleft(reversed(batch))
+                requeued += len(batch)
+            return requeued
+
+    def __len__(self):
+        return len(self.items)
+
+
+# Пачка переносится в список обработки воркера атомарно, аренда воркера — в ZSET
+CLAIM_SCRIPT = """
+local items = redis.call('LRANGE', KEYS[1], 0, tonumber(ARGV[1]) - 1)
+if #items == 0 then
+    return items
+end
+redis.call('LTRIM', KEYS[1], #items, -1)
+redis.call('RPUSH', KEYS[2], unpack(items))
+local now = redis.call('TIME')
+redis.call('ZADD', KEYS[3], tonumber(now[1]) + tonumber(ARGV[3]), ARGV[2])
+return items
+"""
+
+# Возврат пачки воркера с истекшей арендой в начало очереди (в исходном порядке)
+REQUEUE_SCRIPT = """
+local deadline = redis.call('ZSCORE', KEYS[3], ARGV[1])
+local now = redis.call('TIME')
+if deadline and tonumber(deadline) > tonumber(now[1]) then
+    return 0
+end
+local requeued = 0
+while redis.call('RPOPLPUSH', KEYS[2], KEYS[1]) do
+    requeued = requeued + 1
+end
+redis.call('ZREM', KEYS[3], ARGV[1])
+return requeued
+"""
+
+
+class RedisIntakeQueue:
+    """Надежная очередь в списке Redis.
+
+    Пачка не удаляется при выдаче, а переносится в список обработки воркера и
+    удаляется только после записи (ack). Пачки воркеров, не подтвердивших их
+    за время аренды, reap возвращает в очередь.
+    """
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+        self.claim_script = self.client.register_script(CLAIM_SCRIPT)
+        self.requeue_script = self.client.register_script(REQUEUE_SCRIPT)
+
+    def push(self, item):
+        self.client.rpush(QUEUE_KEY, json.dumps(item))
+
+    def claim(self, worker_id, size):
+        raw_items = self.claim_script(
+            keys=[QUEUE_KEY, PROCESSING_KEY.format(worker_id=worker_id), WORKERS_KEY],
+            args=[size, worker_id, get_lease()],
+        )
+        return [json.loads(raw) for raw in raw_items]
+
+    def ack(self, worker_id):
+        pipe = self.client.pipeline(transaction=True)
+        pipe.delete(PROCESSING_KEY.format(worker_id=worker_id))
+        pipe.zrem(WORKERS_KEY, worker_id)
+        pipe.execute()
+
+    def reap(self):
+        now = self.client.time()[0]
+        requeued = 0
+        for worker_id in self.client.zrangebyscore(WORKERS_KEY, '-inf', now):
+            worker_id = worker_id.decode()
+            requeued += self.requeue_script(
+                keys=[QUEUE_KEY, PROCESSING_KEY.format(worker_id=worker_id), WORKERS_KEY],
+                args=[worker_id],
+            )
+        return requeued
+
+    def __len__(self):
+        return self.client.llen(QUEUE_KEY)
+
+
+BACKENDS = {
+    'memory': MemoryIntakeQueue,
+    'redis': RedisIntakeQueue,
+}
+_queues = {}
+
+
+def get_queue():
+    """Очередь приема по настройке PAYMENT_INTAKE_BACKEND ('redis' или 'memory')"""
+    backend = getattr(settings, 'PAYMENT_INTAKE_BACKEND', 'redis')
+    if backend not in _queues:
+        _queues[backend] = BACKENDS[backend]()
+    return _queues[backend]
+
+
+def _status_entry(tracking_id, donator_id, status, **extra):
+    return {'tracking_id': tracking_id, 'donator': donator_id, 'status': status, **extra}
+
+
+def set_status(tracking_id, donator_id, status, **extra):
+    cache.set(
+        STATUS_KEY.format(tracking_id=tracking_id),
+        _status_entry(tracking_id, donator_id, status, **extra),
+        timeout=get_status_timeout(),
+    )
+
+
+def get_status(tracking_id):
+    return cache.get(STATUS_KEY.format(tracking_id=tracking_id))
+
+
+def submit(donator, data):
+    """Ставит проверенный платеж в очередь и возвращает идентификатор для отслеживания"""
+    tracking_id = uuid.uuid4().hex
+    set_status(tracking_id, donator.id, QUEUED)
+    get_queue().push({
+        'tracking_id': tracking_id,
+        'donator_id': donator.id,
+        'collect': data['collect'].id,
+        'amount': str(data['amount']),
+        'comment': data.get('comment', ''),
+    })
+    # Одна задача на всплеск: флаг снимается в начале разбора очереди,
+    # поэтому платеж, добавленный после снятия, запустит новую задачу
+    if cache.add(DRAIN_SCHEDULED_KEY, 1, timeout=60):
+        drain_payment_intake.delay()
+    return tracking_id
+
+
+def drain():
+    """Разбирает очередь пачками; возвращает количество обработанных платежей.
+
+    Пачка подтверждается только после записи: если воркер упал или запись
+    бросила исключение, пачка вернется в очередь по истечении аренды.
+    """
+    cache.delete(DRAIN_SCHEDULED_KEY)
+    queue = get_queue()
+    requeued = queue.reap()
+    if requeued:
+        logger.warning('Возвращено в очередь приема неподтвержденных платежей: %s', requeued)
+    purge_receipts()
+
+    worker_id = uuid.uuid4().hex
+    processed = 0
+    while True:
+        items = queue.claim(worker_id, get_batch_size())
+        if not items:
+            return processed
+        process_batch(items)
+        queue.ack(worker_id)
+        processed += len(items)
+
+
+def purge_receipts():
+    """Удаляет отметки старше срока хранения статусов — к этому времени пачки давно подтверждены"""
+    IntakeReceipt.objects.filter(created_at__lt=timezone.now() - timedelta(seconds=get_status_timeout())).delete()
+
+
+def process_batch(items):
+    """Записывает пачку платежей одной транзакцией с теми же проверками, что и POST"""
+    with transaction.atomic():
+        # Платежи, уже записанные до падения воркера, повторно не пишем
+        written = set(IntakeReceipt.objects.filter(
+            tracking_id__in=[item['tracking_id'] for item in items]
+        ).values_list('tracking_id', flat=True))
+        items = [item for item in items if item['tracking_id'] not in written]
+        if not items:
+            return
+        results = _ingest(items)
+        now = timezone.now()
+        IntakeReceipt.objects.bulk_create([IntakeReceipt(tracking_id=item['tracking_id'], created_at=now) for item in items])
+
+    statuses = {}
+    for item, result in zip(items, results):
+        extra = {'payment_id': result['id']} if result['status'] == CREATED else {'errors': result['errors']}
+        statuses[STATUS_KEY.format(tracking_id=item['tracking_id'])] = _status_entry(
+            item['tracking_id'], item['donator_id'], result['status'], **extra
+        )
+    cache.set_many(statuses, timeout=get_status_timeout())
+
+
+def _ingest(items):
+    payments = [{
+        'donator_id': item['donator_id'],
+        'collect': item['collect'],
+        'amount': Decimal(item['amount']),
+        'comment': item['comment'],
+    } for item in items]
+
+    try:
+        return bulk.ingest_payments(None, payments)
+    except DatabaseError:
+        # Не теряем всю пачку из-за одного платежа — пишем по одному
+        logger.exception('Не удалось записать пачку из %s платежей, записываем по одному', len(items))
+        results = []
+        for payment in payments:
+            try:
+                results.extend(bulk.ingest_payments(None, [payment]))
+            except DatabaseError:
+                logger.exception('Не удалось записать платеж %s', payment)
+                results.append({'status': ERROR, 'errors': {'non_field_errors': 'Не удалось сохранить платеж'}})
+        return results
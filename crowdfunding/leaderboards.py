@@ -0,0 +1,323 @@
+import heapq
+import logging
+import threading
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db.models import Sum
+from rest_framework import serializers
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+from .models import Collect, Payment
+from .serializers import CollectSerializer
+
+logger = logging.getLogger(__name__)
+
+# Рейтинги (ключи сортированных множеств)
+TOP_COLLECTS = 'collects:amount'
+TOP_DONORS = 'donors:amount'
+TRENDING_COLLECTS = 'collects:trending'
+
+KEY_PREFIX = 'leaderboard:'
+# Поля сбора в ответе рейтинга
+COLLECT_FIELDS = ['id', 'name', 'occasion', 'target_amount', 'end_datetime']
+# Корзины окна трендов и отметка последнего пересчета окна
+BUCKET_SUFFIX = ':bucket:'
+ROTATED_SUFFIX = ':rotated'
+
+# Пересчет окна из корзин, если началась новая корзина; затем изменение счета.
+# KEYS: окно, отметка пересчета, корзина изменения, корзины окна с первой по текущую;
+# ARGV: текущая корзина, член, приращение, время жизни корзины
+WINDOW_INCR_SCRIPT = '''
+if redis.call('GET', KEYS[2]) ~= ARGV[1] then
+    redis.call('ZUNIONSTORE', KEYS[1], #KEYS - 3, unpack(KEYS, 4))
+    redis.call('SET', KEYS[2], ARGV[1])
+end
+local amount = tonumber(ARGV[3])
+-- Списание — только если платеж еще лежит в своей корзине
+if amount > 0 or (amount < 0 and redis.call('ZSCORE', KEYS[3], ARGV[2])) then
+    redis.call('ZINCRBY', KEYS[3], amount, ARGV[2])
+    redis.call('EXPIRE', KEYS[3], ARGV[4])
+    redis.call('ZINCRBY', KEYS[1], amount, ARGV[2])
+    redis.call('ZREMRANGEBYSCORE', KEYS[3], '-inf', 0)
+    redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', 0)
+end
+return 1
+'''
+
+# Изменение счета с удалением членов без суммы
+INCR_SCRIPT = '''
+redis.call('ZINCRBY', KEYS[1], ARGV[2], ARGV[1])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', 0)
+return 1
+'''
+
+
+def get_bucket_seconds():
+    """Размер корзины окна трендов (сек.)"""
+    return getattr(settings, 'LEADERBOARD_BUCKET_SECONDS', 300)
+
+
+def get_window_seconds():
+    """Окно «быстрорастущих» сборов (сек.)"""
+    return getattr(settings, 'LEADERBOARD_WINDOW_SECONDS', 60 * 60)
+
+
+def get_max_limit():
+    return getattr(settings, 'LEADERBOARD_MAX_LIMIT', 100)
+
+
+def _cents(amount):
+    # Счет хранится в копейках — целые числа в double точны, в отличие от рублей с дробью
+    return int(amount * 100)
+
+
+def _rubles(score):
+    return f'{Decimal(int(score)) / 100:.2f}'
+
+
+def _window_buckets(now=None):
+    """Первая и текущая корзины окна"""
+    size = get_bucket_seconds()
+    current = int((now if now is not None else time.time()) // size)
+    count = max(1, -(-get_window_seconds() // size))
+    return current - count + 1, current
+
+
+class MemoryBackend:
+    """Рейтинги в памяти процесса (для тестов и разработки без Redis)"""
+    # Ошибки хранилища, которые не должны доходить до записавшего платеж запроса
+    errors = ()
+
+    def __init__(self):
+        self.boards = defaultdict(dict)
+        self.rotated = {}
+        self.lock = threading.Lock()
+
+    def _incr(self, key, member, amount):
+        scores = self.boards[key]
+        scores[member] = scores.get(member, 0) + amount
+        if scores[member] <= 0:
+            del scores[member]
+
+    def incr(self, board, member, amount):
+        with self.lock:
+            self._incr(board, member, amount)
+
+    def _rotate(self, board, first, current):
+        if self.rotated.get(board) == current:
+            return
+        window = {}
+        for bucket in list(self.boards):
+            if bucket.startswith(board + BUCKET_SUFFIX):
+                index = int(bucket[len(board + BUCKET_SUFFIX):])
+                if index < first:
+                    del self.boards[bucket]
+                elif index <= current:
+                    for member, score in self.boards[bucket].items():
+                        window[member] = window.get(member, 0) + score
+        self.boards[board] = window
+        self.rotated[board] = current
+
+    def window_incr(self, board, member, amount, bucket, first, current):
+        with self.lock:
+            self._rotate(board, first, current)
+            if amount and first <= bucket <= current:
+                if amount > 0 or member in self.boards[f'{board}{BUCKET_SUFFIX}{bucket}']:
+                    self._incr(f'{board}{BUCKET_SUFFIX}{bucket}', member, amount)
+                    self._incr(board, member, amount)
+
+    def top(self, board, limit, window=None):
+        with self.lock:
+            if window is not None:
+                self._rotate(board, *window)
+            return heapq.nlargest(limit, self.boards[board].items(), key=lambda item: (item[1], item[0]))
+
+    def clear(self):
+        with self.lock:
+            self.boards.clear()
+            self.rotated.clear()
+
+
+class RedisBackend:
+    """Рейтинги в сортированных множествах Redis; изменения атомарны (Lua)"""
+
+    def __init__(self):
+        from django_redis import get_redis_connection
+        from redis.exceptions import RedisError
+        self.errors = (RedisError,)
+        self.client = get_redis_connection('default')
+        self.incr_script = self.client.register_script(INCR_SCRIPT)
+        self.window_incr_script = self.client.register_script(WINDOW_INCR_SCRIPT)
+
+    @staticmethod
+    def key(board):
+        # Хэш-тег: окно, отметка и корзины рейтинга лежат в одном слоте Redis Cluster
+        return f'{KEY_PREFIX}{{{board}}}'
+
+    def incr(self, board, member, amount):
+        self.incr_script(keys=[self.key(board)], args=[member, amount])
+
+    def window_incr(self, board, member, amount, bucket, first, current):
+        key = self.key(board)
+        if not first <= bucket <= current:
+            amount = 0
+        # Все ключи, которых касается скрипт, — в KEYS, а не собираются внутри из префикса
+        buckets = [f'{key}{BUCKET_SUFFIX}{index}' for index in range(first, current + 1)]
+        self.window_incr_script(
+            keys=[key, key + ROTATED_SUFFIX, f'{key}{BUCKET_SUFFIX}{bucket}', *buckets],
+            args=[current, member, amount, get_window_seconds() + get_bucket_seconds()],
+        )
+
+    def top(self, board, limit, window=None):
+        if window is not None:
+            # Пустое изменение только пересчитает окно при смене корзины
+            self.window_incr(board, '', 0, window[1], *window)
+        items = self.client.zrevrange(self.key(board), 0, limit - 1, withscores=True)
+        return [(int(member), score) for member, score in items]
+
+    def clear(self):
+        keys = list(self.client.scan_iter(match=KEY_PREFIX + '*'))
+        if keys:
+            self.client.delete(*keys)
+
+
+BACKENDS = {
+    'memory': MemoryBackend,
+    'redis': RedisBackend,
+}
+_backends = {}
+
+
+def get_backend():
+    """Хранилище рейтингов по настройке LEADERBOARD_BACKEND ('redis' или 'memory')"""
+    name = getattr(settings, 'LEADERBOARD_BACKEND', 'redis')
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def _apply(payments, sign, now=None):
+    # Пачку платежей сворачиваем до одного изменения на сбор, донатора и корзину
+    collects = defaultdict(int)
+    donors = defaultdict(int)
+    trending = defaultdict(int)
+    size = get_bucket_seconds()
+    for payment in payments:
+        amount = _cents(payment.amount) * sign
+        collects[payment.collect_id] += amount
+        donors[payment.donator_id] += amount
+        trending[payment.collect_id, int(payment.date_added.timestamp() // size)] += amount
+
+    backend = get_backend()
+    first, current = _window_buckets(now)
+    try:
+        for collect_id, amount in collects.items():
+            backend.incr(TOP_COLLECTS, collect_id, amount)
+        for donator_id, amount in donors.items():
+            backend.incr(TOP_DONORS, donator_id, amount)
+        for (collect_id, bucket), amount in trending.items():
+            backend.window_incr(TRENDING_COLLECTS, collect_id, amount, bucket, first, current)
+    except backend.errors as exc:
+        # Платеж уже зафиксирован — ответ не должен стать ошибкой; рейтинги поправит rebuild_leaderboards
+        logger.warning('Рейтинги не обновлены для %s платежей: %s', len(payments), exc)
+
+
+def on_payment_created(payment):
+    on_payments_created([payment])
+
+
+def on_payments_created(payments):
+    """Учитывает новые платежи во всех рейтингах"""
+    _apply(payments, 1)
+
+
+def on_payment_deleted(payment):
+    """Убирает удаленный платеж из рейтингов (из окна — если его корзина еще в окне)"""
+    _apply([payment], -1)
+
+
+def top_collects(limit):
+    """Сборы с наибольшей собранной суммой: [(id сбора, сумма)]"""
+    return get_backend().top(TOP_COLLECTS, limit)
+
+
+def trending_collects(limit):
+    """Сборы, собравшие больше всего за окно трендов"""
+    return get_backend().top(TRENDING_COLLECTS, limit, window=_window_buckets())
+
+
+def top_donors(limit):
+    """Донаторы с наибольшей суммой пожертвований"""
+    return get_backend().top(TOP_DONORS, limit)
+
+
+def rebuild(now=None):
+    """Пересобирает все рейтинги по таблице платежей.
+
+    На время пересборки рейтинги пустеют, а параллельные платежи могут
+    учесться дважды — запускать в спокойное время.
+    """
+    backend = get_backend()
+    backend.clear()
+    for collect_id, total in Payment.objects.values_list('collect_id').annotate(total=Sum('amount')).order_by():
+        backend.incr(TOP_COLLECTS, collect_id, _cents(total))
+    for donator_id, total in Payment.objects.values_list('donator_id').annotate(total=Sum('amount')).order_by():
+        backend.incr(TOP_DONORS, donator_id, _cents(total))
+
+    # Окно короткое — платежи за него можно разложить по корзинам в Python
+    now = now if now is not None else time.time()
+    first, current = _window_buckets(now)
+    size = get_bucket_seconds()
+    window_start = datetime.fromtimestamp(first * size, tz=timezone.utc)
+    recent = Payment.objects.filter(date_added__gte=window_start).values_list(
+        'collect_id', 'amount', 'date_added'
+    )
+    trending = defaultdict(int)
+    for collect_id, amount, date_added in recent.iterator(chunk_size=2000):
+        trending[collect_id, int(date_added.timestamp() // size)] += _cents(amount)
+    for (collect_id, bucket), amount in trending.items():
+        backend.window_incr(TRENDING_COLLECTS, collect_id, amount, bucket, first, current)
+
+
+BOARDS = {
+    'top-collects': top_collects,
+    'trending-collects': trending_collects,
+    'top-donors': top_donors,
+}
+
+
+class LeaderboardView(APIView):
+    """Рейтинг сборов или донаторов; ?limit= — размер (по умолчанию 10)"""
+    board = None
+
+    def get(self, request):
+        try:
+            limit = int(request.query_params.get('limit', 10))
+        except ValueError:
+            limit = 0
+        if not 0 < limit <= get_max_limit():
+            raise serializers.ValidationError({'limit': f'limit должен быть от 1 до {get_max_limit()}'})
+
+        ranking = BOARDS[self.board](limit)
+        ids = [member for member, _ in ranking]
+        # Рейтинг хранит только id — данные для ответа одним запросом
+        if self.board == 'top-donors':
+            # Публичный рейтинг: только id и имя, без email
+            users = User.objects.only('id', 'username').in_bulk(ids)
+            results = [
+                {'donator': {'id': member, 'username': users[member].username}, 'amount': _rubles(score)}
+                for member, score in ranking if member in users
+            ]
+        else:
+            collects = Collect.objects.only(*COLLECT_FIELDS).in_bulk(ids)
+            results = [
+                {'collect': CollectSerializer(collects[member], fields=COLLECT_FIELDS).data, 'amount': _rubles(score)}
+                for member, score in ranking if member in collects
+            ]
+        return Response(results)
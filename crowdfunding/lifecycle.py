@@ -0,0 +1,130 @@
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .cache import invalidate_collect
+from .counters import get_current_amount
+from .models import Collect
+
+ACTIVE = 'active'
+GOAL_REACHED = 'goal_reached'
+ENDED = 'ended'
+
+
+class CollectLifecycle(models.Model):
+    """Хранимый статус сбора.
+
+    «Цель достигнута» проставляется при платежах, «Завершен» — периодическим
+    обходом истекших сборов, поэтому фильтр по статусу идет по индексу,
+    а не сравнением end_datetime по всей таблице.
+    """
+    STATUS_CHOICES = [(ACTIVE, 'Активен'), (GOAL_REACHED, 'Цель достигнута'), (ENDED, 'Завершен')]
+
+    collect = models.OneToOneField(Collect, on_delete=models.CASCADE, primary_key=True, related_name='lifecycle')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default=ACTIVE)
+    # Копия Collect.end_datetime: обходу и фильтрам не нужна таблица сборов
+    end_datetime = models.DateTimeField()
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        # Частичные индексы: незавершенных сборов мало по сравнению с архивом завершенных.
+        # Условия записаны так же, как в запросах, — иначе SQLite не возьмет индекс
+        indexes = [
+            models.Index(fields=['end_datetime'], condition=Q(status=ACTIVE), name='collect_lifecycle_active_idx'),
+            models.Index(
+                fields=['end_datetime'], condition=~Q(status=ENDED), name='collect_lifecycle_open_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.collect_id}: {self.status}'
+
+
+def get_sweep_batch_size():
+    """Сколько истекших сборов обход завершает за одну транзакцию"""
+    return getattr(settings, 'COLLECT_SWEEP_BATCH_SIZE', 1000)
+
+
+def compute_status(end_datetime, current_amount, target_amount, now=None):
+    if end_datetime <= (now or timezone.now()):
+        return ENDED
+    if target_amount and current_amount >= target_amount:
+        return GOAL_REACHED
+    return ACTIVE
+
+
+def sync(collect, current_amount=None):
+    """Создает или пересчитывает статус сбора по его данным"""
+    now = timezone.now()
+    if current_amount is None:
+        current_amount = get_current_amount(collect)
+    status = compute_status(collect.end_datetime, current_amount, collect.target_amount, now)
+    CollectLifecycle.objects.update_or_create(
+        collect_id=collect.id,
+        defaults={'status': status, 'end_datetime': collect.end_datetime, 'updated_at': now},
+    )
+    return status
+
+
+def on_amount_changed(collect, current_amount):
+    """Переводит сбор между «Активен» и «Цель достигнута» после изменения суммы"""
+    if not collect.target_amount:
+        return
+    if current_amount >= collect.target_amount:
+        source, target = ACTIVE, GOAL_REACHED
+    else:
+        source, target = GOAL_REACHED, ACTIVE
+    # Завершенный сбор не трогаем; одно обновление без чтения строки
+    CollectLifecycle.objects.filter(collect_id=collect.id, status=source).update(
+        status=target, updated_at=timezone.now()
+    )
+
+
+def sweep(now=None):
+    """Завершает истекшие сборы пачками; возвращает их число"""
+    now = now or timezone.now()
+    swept = 0
+    while True:
+        with transaction.atomic():
+            ids = list(
+                CollectLifecycle.objects.exclude(status=ENDED).filter(end_datetime__lte=now)
+                .order_by('end_datetime')
+                .values_list('collect_id', flat=True)[:get_sweep_batch_size()]
+            )
+            if not ids:
+                return swept
+            CollectLifecycle.objects.filter(collect_id__in=ids).exclude(status=ENDED).update(
+                status=ENDED, updated_at=now
+            )
+            for collect_id in ids:
+                invalidate_collect(collect_id)
+            # Статус в списке поменялся — страницы списка тоже устарели
+            invalidate_collect(ids[-1], list_changed=True)
+        swept += len(ids)
+
+
+def effective_status(status, end_datetime, now=None):
+    """Статус для ответа: истекший до обхода сбор уже завершен (так же, как в filter_status)"""
+    if status is not None and end_datetime <= (now or timezone.now()):
+        return ENDED
+    return status
+
+
+def filter_status(queryset, status, now=None):
+    """Сборы с заданным статусом; истекшие до обхода сборы уже считаются завершенными"""
+    now = now or timezone.now()
+    if status == ENDED:
+        return queryset.filter(Q(lifecycle__status=ENDED) | Q(lifecycle__end_datetime__lte=now))
+    return queryset.filter(lifecycle__status=status, lifecycle__end_datetime__gt=now)
+
+
+def rebuild():
+    """Пересчитывает статусы всех сборов; возвращает их число"""
+    count = 0
+    for collect in Collect.objects.only('id', 'end_datetime', 'target_amount', 'current_amount').iterator(
+        chunk_size=2000
+    ):
+        sync(collect)
+        count += 1
+    return count
@@ -0,0 +1,388 @@
+import asyncio
+import json
+import logging
+import threading
+from collections import defaultdict, deque, namedtuple
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.handlers.asgi import ASGIRequest
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseNotAllowed, StreamingHttpResponse
+
+from .counters import get_current_amount
+from .models import Collect
+from .stats import get_stats
+
+logger = logging.getLogger(__name__)
+
+# События потока: снимок прогресса и новые платежи (с прогрессом после них)
+PROGRESS = 'progress'
+PAYMENTS = 'payments'
+PROGRESS_FIELDS = ['current_amount', 'target_amount', 'donors_count', 'payments_count']
+
+CHANNEL = 'live:collect:{collect_id}'
+SEQUENCE_KEY = 'live:collect:{collect_id}:seq'
+HISTORY_KEY = 'live:collect:{collect_id}:history'
+
+Event = namedtuple('Event', ['id', 'type', 'data'])
+
+# Номер события, запись в историю для переподключений и рассылка — атомарно.
+# KEYS: счетчик, история; ARGV: канал, «тип|данные», размер истории, время жизни (сек.)
+PUBLISH_SCRIPT = '''
+local id = redis.call('INCR', KEYS[1])
+local message = id .. '|' .. ARGV[2]
+redis.call('RPUSH', KEYS[2], message)
+redis.call('LTRIM', KEYS[2], -tonumber(ARGV[3]), -1)
+redis.call('EXPIRE', KEYS[1], ARGV[4])
+redis.call('EXPIRE', KEYS[2], ARGV[4])
+redis.call('PUBLISH', ARGV[1], message)
+return id
+'''
+
+
+def is_enabled():
+    """Публикация событий прогресса сборов для потоков SSE"""
+    return getattr(settings, 'LIVE_STREAMS', False)
+
+
+def get_heartbeat_seconds():
+    """Как часто в тихий поток уходит комментарий-пульс (держит соединение через прокси)"""
+    return getattr(settings, 'LIVE_HEARTBEAT_SECONDS', 15)
+
+
+def get_stream_seconds():
+    """Сколько живет один поток; затем клиент переподключается с Last-Event-ID"""
+    return getattr(settings, 'LIVE_STREAM_SECONDS', 300)
+
+
+def get_history_size():
+    """Сколько последних событий сбора хранится для переподключений"""
+    return getattr(settings, 'LIVE_HISTORY_SIZE', 100)
+
+
+def get_history_ttl():
+    return getattr(settings, 'LIVE_HISTORY_TTL', 60 * 60)
+
+
+def get_max_streams():
+    """Сколько потоков держит один процесс; сверх — 503"""
+    return getattr(settings, 'LIVE_MAX_STREAMS', 10000)
+
+
+def get_queue_size():
+    """Сколько событий ждет медленного клиента; старые вытесняются"""
+    return getattr(settings, 'LIVE_QUEUE_SIZE', 100)
+
+
+def get_retry_ms():
+    """Пауза перед переподключением EventSource (поле retry)"""
+    return getattr(settings, 'LIVE_RETRY_MS', 3000)
+
+
+def encode(event_type, data):
+    return f'{event_type}|{json.dumps(data, ensure_ascii=False, separators=(",", ":"))}'
+
+
+def decode(message):
+    if isinstance(message, bytes):
+        message = message.decode()
+    event_id, event_type, data = message.split('|', 2)
+    return Event(int(event_id), event_type, data)
+
+
+class LocalBroker:
+    """Подписчики этого процесса: одно событие из канала раздается всем их очередям"""
+
+    def __init__(self):
+        # {id сбора: {очередь: цикл событий очереди}}
+        self.subscribers = defaultdict(dict)
+        self.lock = threading.Lock()
+
+    @property
+    def streams(self):
+        return sum(len(queues) for queues in self.subscribers.values())
+
+    async def subscribe(self, collect_id):
+        queue = asyncio.Queue(maxsize=get_queue_size())
+        with self.lock:
+            first = not self.subscribers[collect_id]
+            self.subscribers[collect_id][queue] = asyncio.get_running_loop()
+        return queue, first
+
+    async def unsubscribe(self, collect_id, queue):
+        with self.lock:
+            self.subscribers[collect_id].pop(queue, None)
+            last = not self.subscribers[collect_id]
+            if last:
+                del self.subscribers[collect_id]
+        return last
+
+    @staticmethod
+    def _put(queues, message):
+        for queue in queues:
+            if queue.full():
+                # Медленный клиент: теряет старые события, но прогресс в новых — абсолютный
+                queue.get_nowait()
+            queue.put_nowait(message)
+
+    def _send(self, targets, message):
+        # Один вызов на цикл событий, а не на очередь: пробуждение цикла — системный вызов
+        by_loop = defaultdict(list)
+        for queue, loop in targets:
+            by_loop[loop].append(queue)
+        for loop, queues in by_loop.items():
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(self._put, queues, message)
+
+    def dispatch(self, collect_id, message):
+        """Раздает событие очередям сбора (можно вызывать из любого потока)"""
+        with self.lock:
+            targets = list(self.subscribers.get(collect_id, {}).items())
+        if targets:
+            # Разбираем один раз на процесс, а не в каждом потоке
+            self._send(targets, decode(message))
+
+    def close_all(self):
+        """Завершает все потоки процесса: клиенты переподключатся и дочитают историю"""
+        with self.lock:
+            targets = [(queue, loop) for queues in self.subscribers.values() for queue, loop in queues.items()]
+        self._send(targets, None)
+
+
+class MemoryBroker(LocalBroker):
+    """Брокер внутри процесса (для тестов и разработки без Redis)"""
+
+    def __init__(self):
+        super().__init__()
+        self.sequences = defaultdict(int)
+        self.histories = defaultdict(lambda: deque(maxlen=get_history_size()))
+
+    def publish(self, collect_id, event_type, data):
+        with self.lock:
+            self.sequences[collect_id] += 1
+            message = f'{self.sequences[collect_id]}|{encode(event_type, data)}'
+            self.histories[collect_id].append(message)
+        self.dispatch(collect_id, message)
+
+    def history(self, collect_id):
+        with self.lock:
+            return [decode(message) for message in self.histories.get(collect_id, ())]
+
+    def clear(self):
+        with self.lock:
+            self.sequences.clear()
+            self.histories.clear()
+
+
+class RedisBroker(LocalBroker):
+    """Рассылка через pub/sub Redis: процесс подписан на канал сбора, пока у сбора есть зрители.
+
+    Одна запись платежа — одна публикация, сколько бы потоков ни было открыто.
+    """
+
+    def __init__(self):
+        super().__init__()
+        from django_redis import get_redis_connection
+        self.client = get_redis_connection('default')
+        self.publish_script = self.client.register_script(PUBLISH_SCRIPT)
+        self.pubsub = None
+        self.listener = None
+
+    def publish(self, collect_id, event_type, data):
+        from redis.exceptions import RedisError
+        try:
+            self.publish_script(
+                keys=[SEQUENCE_KEY.format(collect_id=collect_id), HISTORY_KEY.format(collect_id=collect_id)],
+                args=[CHANNEL.format(collect_id=collect_id), encode(event_type, data), get_history_size(),
+                      get_history_ttl()],
+            )
+        except RedisError as exc:
+            # Платеж уже записан; зрители получат прогресс со следующим событием
+            logger.warning('Событие сбора %s не опубликовано: %s', collect_id, exc)
+
+    def history(self, collect_id):
+        return [decode(message) for message in self.client.lrange(HISTORY_KEY.format(collect_id=collect_id), 0, -1)]
+
+    async def subscribe(self, collect_id):
+        queue, first = await super().subscribe(collect_id)
+        if first:
+            if self.pubsub is None:
+                import redis.asyncio
+                url = getattr(settings, 'LIVE_REDIS_URL', None) or settings.CACHES['default']['LOCATION']
+                self.pubsub = redis.asyncio.from_url(url).pubsub(ignore_subscribe_messages=True)
+            await self.pubsub.subscribe(CHANNEL.format(collect_id=collect_id))
+            if self.listener is None:
+                self.listener = asyncio.create_task(self.listen(self.pubsub))
+        return queue, first
+
+    async def unsubscribe(self, collect_id, queue):
+        last = await super().unsubscribe(collect_id, queue)
+        if last and self.pubsub is not None:
+            await self.pubsub.unsubscribe(CHANNEL.format(collect_id=collect_id))
+        return last
+
+    async def listen(self, pubsub):
+        try:
+            while True:
+                message = await pubsub.get_message(ignore_subscribe_messages=True, timeout=1.0)
+                if message is not None and message['type'] == 'message':
+                    channel = message['channel'].decode()
+                    self.dispatch(int(channel.rsplit(':', 1)[1]), message['data'].decode())
+        except Exception as exc:
+            logger.warning('Подписка на события сборов прервана: %s', exc)
+            self.pubsub = self.listener = None
+            self.close_all()
+            await pubsub.close()
+
+
+BACKENDS = {
+    'memory': MemoryBroker,
+    'redis': RedisBroker,
+}
+_backends = {}
+
+
+def get_broker():
+    """Брокер событий по настройке LIVE_BACKEND ('redis' или 'memory')"""
+    name = getattr(settings, 'LIVE_BACKEND', 'redis')
+    if name not in _backends:
+        _backends[name] = BACKENDS[name]()
+    return _backends[name]
+
+
+def _progress(collect, current_amount):
+    # С изменениями, еще не перенесенными в строку статистики (и изменениями этой транзакции)
+    stats = get_stats(collect.id)
+    return {
+        'current_amount': f'{current_amount:.2f}',
+        'target_amount': None if collect.target_amount is None else f'{collect.target_amount:.2f}',
+        'donors_count': stats.donors_count,
+        'payments_count': stats.payments_count,
+    }
+
+
+def _publish_on_commit(collect_id, event_type, data):
+    # Зрители не должны увидеть сумму из откатившейся транзакции
+    transaction.on_commit(lambda: get_broker().publish(collect_id, event_type, data))
+
+
+def on_payments_created(collect, payments, current_amount):
+    """Публикует новые платежи сбора с прогрессом после них (в транзакции записи)"""
+    if not is_enabled():
+        return
+    from .projection import Formats
+    formats = Formats()
+    data = _progress(collect, current_amount)
+    data['payments'] = [
+        {
+            'id': payment.id,
+            'amount': formats.decimal(payment.amount),
+            'date_added': formats.datetime(payment.date_added),
+        }
+        for payment in payments
+    ]
+    _publish_on_commit(collect.id, PAYMENTS, data)
+
+
+def on_payment_deleted(collect):
+    """Публикует прогресс после удаления платежа"""
+    if not is_enabled():
+        return
+    collect.refresh_from_db(fields=['current_amount'])
+    _publish_on_commit(collect.id, PROGRESS, _progress(collect, get_current_amount(collect)))
+
+
+def snapshot(collect_id):
+    """Текущий прогресс сбора из БД; Collect.DoesNotExist, если сбора нет"""
+    collect = Collect.objects.only('id', 'current_amount', 'target_amount').get(pk=collect_id)
+    return json.dumps(_progress(collect, get_current_amount(collect)), ensure_ascii=False, separators=(',', ':'))
+
+
+def backlog(collect_id, last_event_id):
+    """События для начала потока.
+
+    Если история содержит все события после Last-Event-ID — дочитываем их;
+    иначе (первое подключение, история устарела) — снимок прогресса.
+    """
+    history = get_broker().history(collect_id)
+    if last_event_id is not None and history and history[0].id <= last_event_id + 1 \
+            and last_event_id <= history[-1].id:
+        return [event for event in history if event.id > last_event_id]
+    if history:
+        # Прогресс после последнего события — без запроса к БД
+        latest = json.loads(history[-1].data)
+        data = json.dumps({field: latest[field] for field in PROGRESS_FIELDS}, ensure_ascii=False,
+                          separators=(',', ':'))
+        return [Event(history[-1].id, PROGRESS, data)]
+    return [Event(0, PROGRESS, snapshot(collect_id))]
+
+
+def format_event(event):
+    return f'id: {event.id}\nevent: {event.type}\ndata: {event.data}\n\n'
+
+
+async def stream(collect_id, last_event_id):
+    broker = get_broker()
+    queue, _ = await broker.subscribe(collect_id)
+    try:
+        yield f'retry: {get_retry_ms()}\n\n'
+        # Подписка раньше истории: событие между ними придет из очереди, а не потеряется
+        sent = 0
+        for event in await sync_to_async(backlog)(collect_id, last_event_id):
+            yield format_event(event)
+            sent = event.id
+
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + get_stream_seconds()
+        heartbeat = get_heartbeat_seconds()
+        while True:
+            timeout = min(heartbeat, deadline - loop.time())
+            if timeout <= 0:
+                return
+            try:
+                event = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                yield ': heartbeat\n\n'
+                continue
+            if event is None:
+                return
+            if event.id > sent:
+                yield format_event(event)
+                sent = event.id
+    finally:
+        await broker.unsubscribe(collect_id, queue)
+
+
+def parse_last_event_id(request):
+    # EventSource шлет заголовок сам; параметр — для клиентов, которые не умеют заголовки
+    value = request.headers.get('Last-Event-ID') or request.GET.get('last_event_id')
+    try:
+        return int(value) if value else None
+    except ValueError:
+        return None
+
+
+async def collect_stream(request, pk):
+    """Поток SSE прогресса сбора: снимок, затем новые платежи и пульс.
+
+    Асинхронное представление: тысячи ожидающих соединений не занимают потоков (нужен ASGI-сервер).
+    Под WSGI Django дочитывает асинхронный поток целиком в рабочем потоке — такой запрос получает 503.
+    """
+    if not is_enabled():
+        raise Http404('Потоки прогресса выключены')
+    if not isinstance(request, ASGIRequest):
+        return HttpResponse('Поток доступен только под ASGI-сервером', status=503)
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    if get_broker().streams >= get_max_streams():
+        return HttpResponse('Слишком много подключений, повторите позже', status=503,
+                            headers={'Retry-After': str(get_retry_ms() // 1000 or 1)})
+    if not await Collect.objects.filter(pk=pk).aexists():
+        raise Http404('Сбор не найден')
+
+    response = StreamingHttpResponse(stream(pk, parse_last_event_id(request)), content_type='text/event-stream')
+    response['Cache-Control'] = 'no-cache'
+    # Без буферизации в nginx — иначе события копятся в прокси
+    response['X-Accel-Buffering'] = 'no'
+    return response
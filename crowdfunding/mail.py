@@ -0,0 +1,177 @@
+import logging
+import smtplib
+import threading
+from datetime import timedelta
+
+from celery import shared_task
+from celery.signals import worker_process_shutdown
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedMail(models.Model):
+    """Письмо, ожидающее отправки.
+
+    Задачи уведомлений только записывают строку; периодический отправитель
+    забирает письма всех задач пачками и шлет через одно постоянное
+    соединение. Письмо в БД переживает перезапуск воркера.
+    """
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=254)
+    to = models.CharField(max_length=254)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Не раньше этого времени письмо отправляется (повторы с нарастающей паузой)
+    available_at = models.DateTimeField(db_index=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.to}: {self.subject}'
+
+    def to_message(self):
+        return EmailMessage(subject=self.subject, body=self.body, from_email=self.from_email, to=[self.to])
+
+
+def get_batch_size():
+    """Сколько писем отправитель забирает и шлет за одну пачку"""
+    return getattr(settings, 'EMAIL_BATCH_SIZE', 50)
+
+
+def get_flush_interval():
+    """Как часто (сек.) отправитель забирает накопленные письма; он же — базовая пауза повтора"""
+    return getattr(settings, 'EMAIL_FLUSH_INTERVAL', 5)
+
+
+def get_max_retries():
+    return getattr(settings, 'EMAIL_MAX_RETRIES', 3)
+
+
+def get_lease():
+    """На сколько (сек.) отправитель забирает пачку: не отправленное за это время заберет другой"""
+    return getattr(settings, 'EMAIL_LEASE', 300)
+
+
+class MailSender:
+    """Постоянное SMTP-соединение процесса отправителя (переоткрывается при разрыве)"""
+
+    def __init__(self):
+        self.lock = threading.RLock()
+        self.connection = None
+
+    def _get_connection(self):
+        if self.connection is None:
+            self.connection = get_connection(fail_silently=False)
+            self.connection.open()
+        return self.connection
+
+    def close(self):
+        with self.lock:
+            if self.connection is not None:
+                try:
+                    self.connection.close()
+                except Exception:  # noqa: BLE001 — соединение уже могло быть разорвано
+                    pass
+                self.connection = None
+
+    def send(self, message):
+        """Отправляет письмо через общее соединение; при ошибке — исключение"""
+        with self.lock:
+            try:
+                self._get_connection().send_messages([message])
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Постоянное соединение закрыто сервером — переоткрываем один раз
+                self.close()
+                self._get_connection().send_messages([message])
+
+
+sender = MailSender()
+
+
+def queue_mail(subject, message, recipient_list, from_email=None):
+    """Ставит письмо в очередь отправки (по письму на каждого получателя)"""
+    now = timezone.now()
+    QueuedMail.objects.bulk_create([
+        QueuedMail(
+            subject=subject,
+            body=message,
+            from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+            to=recipient,
+            available_at=now,
+        )
+        for recipient in filter(None, recipient_list)
+    ])
+
+
+def flush_mail():
+    """Отправляет созревшие письма пачками по EMAIL_BATCH_SIZE; возвращает число отправленных.
+
+    Пачка забирается короткой транзакцией (аренда на EMAIL_LEASE), а письма
+    шлются уже вне транзакции — SMTP не держит блокировки строк. Письма по
+    одному, чтобы знать, каким получателям не удалось доставить: повторяются
+    только они.
+    """
+    sent_total = 0
+    while True:
+        now = timezone.now()
+        batch = _claim(now)
+        if not batch:
+            return sent_total
+
+        sent = []
+        for queued in batch:
+            try:
+                sender.send(queued.to_message())
+            except (smtplib.SMTPException, OSError) as exc:
+                logger.warning('Не удалось отправить письмо %s: %s', queued.to, exc)
+                _fail(queued, exc, timezone.now())
+            else:
+                sent.append(queued.id)
+        QueuedMail.objects.filter(id__in=sent).delete()
+        sent_total += len(sent)
+        if len(batch) < get_batch_size():
+            return sent_total
+
+
+def _claim(now):
+    """Забирает пачку созревших писем, откладывая их на время аренды"""
+    with transaction.atomic():
+        # SKIP LOCKED — параллельный отправитель не ждет и не берет ту же пачку
+        batch = list(
+            QueuedMail.objects.select_for_update(skip_locked=True)
+            .filter(available_at__lte=now)
+            .order_by('available_at', 'id')[:get_batch_size()]
+        )
+        QueuedMail.objects.filter(id__in=[queued.id for queued in batch]).update(
+            available_at=now + timedelta(seconds=get_lease())
+        )
+    return batch
+
+
+def _fail(queued, exc, now):
+    if queued.attempts >= get_max_retries():
+        logger.error('Письмо %s не доставлено после %s попыток', queued.to, queued.attempts + 1)
+        queued.delete()
+        return
+    QueuedMail.objects.filter(id=queued.id).update(
+        attempts=F('attempts') + 1,
+        available_at=now + timedelta(seconds=get_flush_interval() * 2 ** queued.attempts),
+        last_error=str(exc),
+    )
+
+
+@shared_task
+def send_queued_mail():
+    """Отправляет накопленные письма всех задач (периодическая задача)"""
+    return f'Отправлено писем: {flush_mail()}'
+
+
+@worker_process_shutdown.connect
+def close_mail_connection(**kwargs):
+    """Закрывает соединение при остановке процесса воркера"""
+    sender.close()
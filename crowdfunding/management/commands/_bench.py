@@ -0,0 +1,35 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.db import connection
+
+
+def add_allow_writes_argument(parser, writes):
+    parser.add_argument(
+        '--allow-writes',
+        action='store_true',
+        help=f'Разрешить запись ({writes}) в настроенную БД, если она не тестовая'
+    )
+
+
+def is_test_database():
+    """Тестовая ли настроенная БД: BENCH_ALLOW_WRITES, имя с префиксом test_ или SQLite в памяти.
+
+    Для SQLite NAME — путь к файлу, поэтому префикс проверяется у имени файла.
+    """
+    if getattr(settings, 'BENCH_ALLOW_WRITES', False):
+        return True
+    name = str(connection.settings_dict['NAME'])
+    if connection.vendor == 'sqlite' and connection.creation.is_in_memory_db(name):
+        return True
+    return os.path.basename(name).startswith('test_')
+
+
+def check_writes_allowed(options, writes):
+    """Прерывает бенчмарк, пишущий в нетестовую БД без --allow-writes"""
+    if not options['allow_writes'] and not is_test_database():
+        raise CommandError(
+            f'Бенчмарк пишет в БД {connection.settings_dict["NAME"]} ({writes}). '
+            f'Запустите на тестовой БД или с --allow-writes'
+        )
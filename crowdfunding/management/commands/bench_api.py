@@ -0,0 +1,317 @@
+import base64
+import json
+import math
+import platform
+import threading
+import time
+from datetime import timedelta
+from urllib import request as urllib_request
+from urllib.error import HTTPError
+
+from celery import current_app
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from crowdfunding.management.commands._bench import add_allow_writes_argument, check_writes_allowed
+from crowdfunding.models import Collect
+from crowdfunding.stats import CollectStats
+
+SCENARIOS = ['payment_create', 'collect_list', 'collect_detail', 'collect_payments']
+
+
+def percentile(values, percent):
+    """Перцентиль по методу ближайшего ранга"""
+    if not values:
+        return 0
+    ordered = sorted(values)
+    rank = max(1, math.ceil(percent / 100 * len(ordered)))
+    return ordered[rank - 1]
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест основных эндпоинтов API (в процессе или против локального сервера)'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--requests',
+            type=int,
+            default=200,
+            help='Количество запросов на сценарий'
+        )
+        parser.add_argument(
+            '--warmup',
+            type=int,
+            default=10,
+            help='Количество прогревочных запросов (не учитываются)'
+        )
+        parser.add_argument(
+            '--scenarios',
+            type=str,
+            default=','.join(SCENARIOS),
+            help='Сценарии через запятую'
+        )
+        parser.add_argument(
+            '--url',
+            type=str,
+            default=None,
+            help='Базовый URL API запущенного сервера (например http://127.0.0.1:8000/api); '
+                 'без него запросы выполняются в процессе'
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            default=1,
+            help='Количество параллельных клиентов (только вместе с --url)'
+        )
+        parser.add_argument(
+            '--username',
+            type=str,
+            default='bench_api',
+            help='Пользователь, от имени которого создаются платежи'
+        )
+        parser.add_argument(
+            '--password',
+            type=str,
+            default='bench_api',
+            help='Пароль пользователя (Basic-аутентификация для --url)'
+        )
+        parser.add_argument(
+            '--no-cache',
+            action='store_true',
+            help='Отключить кэш (DummyCache) для замера чтения из БД (в процессе)'
+        )
+        add_allow_writes_argument(parser, 'пользователь, сбор, платежи')
+        parser.add_argument(
+            '--output',
+            type=str,
+            default=None,
+            help='Файл для сохранения результатов в JSON'
+        )
+        parser.add_argument(
+            '--baseline',
+            type=str,
+            default=None,
+            help='JSON с результатами предыдущего запуска для сравнения'
+        )
+
+    def handle(self, *args, **options):
+        scenarios = [name for name in options['scenarios'].split(',') if name]
+        unknown = set(scenarios) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'Неизвестные сценарии: {", ".join(sorted(unknown))}')
+
+        # Бенчмарк создает пользователя, сбор и настоящие платежи (с --url — в БД сервера)
+        check_writes_allowed(options, 'пользователь, сбор, платежи')
+
+        user, hot_collect, read_collect = self.prepare(options['username'], options['password'])
+
+        if options['url']:
+            runner = LiveRunner(options['url'], options['username'], options['password'], options['concurrency'])
+        else:
+            runner = InProcessRunner(user, use_cache=not options['no_cache'])
+
+        results = {}
+        with runner:
+            for name in scenarios:
+                method, path, payload = self.build_request(name, hot_collect, read_collect, options['url'])
+                runner.run(method, path, payload, options['warmup'])
+                results[name] = runner.run(method, path, payload, options['requests'])
+                self.print_result(name, results[name])
+
+        report = {
+            'meta': {
+                'started_at': timezone.now().isoformat(),
+                'mode': 'live' if options['url'] else 'in-process',
+                'database': connection.vendor,
+                'python': platform.python_version(),
+                'requests': options['requests'],
+                'concurrency': options['concurrency'] if options['url'] else 1,
+                'cache': not options['no_cache'],
+            },
+            'scenarios': results,
+        }
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f'💾 Результаты сохранены в {options["output"]}'))
+
+        if options['baseline']:
+            with open(options['baseline'], encoding='utf-8') as file:
+                self.compare(json.load(file), report)
+
+    def prepare(self, username, password):
+        """Готовит пользователя и сборы для сценариев"""
+        user, created = User.objects.get_or_create(username=username, defaults={'email': f'{username}@example.com'})
+        if created:
+            user.set_password(password)
+            user.save()
+
+        # Сбор без целевой суммы, чтобы платежи не упирались в лимит
+        hot_collect = Collect.objects.filter(author=user, name='Нагрузочный сбор', target_amount__isnull=True).first()
+        if hot_collect is None:
+            hot_collect = Collect.objects.create(
+                author=user,
+                name='Нагрузочный сбор',
+                occasion='other',
+                description='Сбор для нагрузочного теста API',
+                end_datetime=timezone.now() + timedelta(days=365)
+            )
+
+        # Для чтения берем самый "тяжелый" сбор из имеющихся данных — по таблице статистики,
+        # а не подсчетом по всем платежам
+        heaviest = (
+            CollectStats.objects.exclude(collect=hot_collect).filter(payments_count__gt=0)
+            .order_by('-payments_count').select_related('collect').first()
+        )
+        read_collect = heaviest.collect if heaviest else hot_collect
+        return user, hot_collect, read_collect
+
+    def build_request(self, name, hot_collect, read_collect, base_url):
+        if name == 'payment_create':
+            path = reverse('payment-list')
+            payload = {'collect': hot_collect.id, 'amount': '1.00', 'comment': 'bench'}
+            method = 'POST'
+        else:
+            payload = None
+            method = 'GET'
+            if name == 'collect_list':
+                path = reverse('collect-list')
+            elif name == 'collect_detail':
+                path = reverse('collect-detail', args=[read_collect.id])
+            else:
+                path = reverse('collect-payments', args=[read_collect.id])
+
+        if base_url:
+            # reverse() дает путь с префиксом проекта, а --url уже указывает на корень API
+            api_root = reverse('api-root')
+            path = base_url.rstrip('/') + '/' + path[len(api_root):]
+        return method, path, payload
+
+    def print_result(self, name, result):
+        self.stdout.write(
+            f'{name:<18} p50 {result["p50_ms"]:>8.2f} мс  p95 {result["p95_ms"]:>8.2f} мс  '
+            f'p99 {result["p99_ms"]:>8.2f} мс  {result["rps"]:>8.1f} rps  '
+            f'запросов к БД {result["queries_per_request"] if result["queries_per_request"] is not None else "-"}  '
+            f'ошибок {result["errors"]}'
+        )
+
+    def compare(self, baseline, report):
+        self.stdout.write('\n📈 Сравнение с базовым запуском:')
+        for name, result in report['scenarios'].items():
+            base = baseline.get('scenarios', {}).get(name)
+            if not base:
+                self.stdout.write(f'   {name}: нет в базовом запуске')
+                continue
+            p95_delta = (result['p95_ms'] - base['p95_ms']) / base['p95_ms'] * 100 if base['p95_ms'] else 0
+            rps_delta = (result['rps'] - base['rps']) / base['rps'] * 100 if base['rps'] else 0
+            line = f'   {name:<18} p95 {p95_delta:+.1f}%  rps {rps_delta:+.1f}%'
+            self.stdout.write(self.style.ERROR(line) if p95_delta > 10 else line)
+
+
+def summarize(timings, errors, elapsed, queries=None):
+    return {
+        'requests': len(timings),
+        'errors': errors,
+        'p50_ms': round(percentile(timings, 50), 3),
+        'p95_ms': round(percentile(timings, 95), 3),
+        'p99_ms': round(percentile(timings, 99), 3),
+        'rps': round(len(timings) / elapsed, 2) if elapsed else 0,
+        'queries_per_request': round(queries / len(timings), 2) if queries is not None and timings else None,
+    }
+
+
+class InProcessRunner:
+    """Запросы через тестовый клиент DRF: locmem-кэш, Celery в режиме eager, письма в память"""
+
+    def __init__(self, user, use_cache=True):
+        self.client = APIClient()
+        self.client.force_authenticate(user=user)
+        cache_backend = 'locmem.LocMemCache' if use_cache else 'dummy.DummyCache'
+        self.settings = override_settings(
+            ALLOWED_HOSTS=['*'],
+            CACHES={'default': {'BACKEND': f'django.core.cache.backends.{cache_backend}'}},
+            EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend',
+        )
+
+    def __enter__(self):
+        self.settings.enable()
+        self.always_eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        return self
+
+    def __exit__(self, *exc_info):
+        current_app.conf.task_always_eager = self.always_eager
+        self.settings.disable()
+
+    def run(self, method, path, payload, count):
+        timings = []
+        errors = 0
+        queries = 0
+        started = time.perf_counter()
+        for _ in range(count):
+            with CaptureQueriesContext(connection) as captured:
+                request_started = time.perf_counter()
+                if method == 'POST':
+                    response = self.client.post(path, payload, format='json')
+                else:
+                    response = self.client.get(path)
+                timings.append((time.perf_counter() - request_started) * 1000)
+            queries += len(captured)
+            errors += response.status_code >= 400
+        return summarize(timings, errors, time.perf_counter() - started, queries)
+
+
+class LiveRunner:
+    """Запросы к запущенному серверу из нескольких потоков"""
+
+    def __init__(self, base_url, username, password, concurrency):
+        self.base_url = base_url
+        self.concurrency = max(1, concurrency)
+        credentials = base64.b64encode(f'{username}:{password}'.encode()).decode()
+        self.headers = {'Authorization': f'Basic {credentials}', 'Content-Type': 'application/json'}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return None
+
+    def request(self, method, url, payload):
+        data = json.dumps(payload).encode() if payload is not None else None
+        req = urllib_request.Request(url, data=data, method=method, headers=self.headers)
+        try:
+            with urllib_request.urlopen(req) as response:
+                response.read()
+                return response.status
+        except HTTPError as exc:
+            return exc.code
+
+    def run(self, method, url, payload, count):
+        timings = []
+        errors = []
+        lock = threading.Lock()
+
+        def worker(requests_count):
+            for _ in range(requests_count):
+                request_started = time.perf_counter()
+                status_code = self.request(method, url, payload)
+                elapsed_ms = (time.perf_counter() - request_started) * 1000
+                with lock:
+                    timings.append(elapsed_ms)
+                    if status_code >= 400:
+                        errors.append(status_code)
+
+        shares = [count // self.concurrency + (i < count % self.concurrency) for i in range(self.concurrency)]
+        threads = [threading.Thread(target=worker, args=(share,)) for share in shares]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return summarize(timings, len(errors), time.perf_counter() - started)
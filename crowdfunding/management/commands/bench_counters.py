@@ -0,0 +1,103 @@
+import threading
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import signals
+from django.utils import timezone
+
+from crowdfunding import signals as crowdfunding_signals
+from crowdfunding.counters import add_amount, rollup_collect
+from crowdfunding.management.commands._bench import add_allow_writes_argument, check_writes_allowed
+from crowdfunding.models import Collect, Payment
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест записи платежей в один "горячий" сбор'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers',
+            type=str,
+            default='1,2,4,8',
+            help='Список количеств параллельных писателей через запятую'
+        )
+        parser.add_argument(
+            '--payments',
+            type=int,
+            default=200,
+            help='Количество платежей на одного писателя'
+        )
+        parser.add_argument(
+            '--shards',
+            type=int,
+            default=16,
+            help='Количество шардов счетчика для шардированного режима'
+        )
+        add_allow_writes_argument(parser, 'пользователь, сборы, платежи')
+
+    def handle(self, *args, **options):
+        check_writes_allowed(options, 'пользователь, сборы, платежи')
+        writers_list = [int(value) for value in options['writers'].split(',')]
+        payments_count = options['payments']
+        shards = options['shards']
+
+        # Письма и очистка кэша не относятся к измеряемому пути
+        signals.post_save.disconnect(crowdfunding_signals.on_payment_save, sender=Payment)
+        signals.post_save.disconnect(crowdfunding_signals.on_collect_save, sender=Collect)
+
+        try:
+            user, _ = User.objects.get_or_create(username='bench_counters', defaults={'email': 'bench@example.com'})
+
+            self.stdout.write(f'{"режим":<12}{"писатели":>10}{"платежей/с":>14}{"потеряно":>12}')
+            for mode, mode_shards in (('строка', 0), (f'шарды x{shards}', shards)):
+                for writers in writers_list:
+                    rate, lost = self.run_case(user, writers, payments_count, mode_shards)
+                    self.stdout.write(f'{mode:<12}{writers:>10}{rate:>14.1f}{lost:>12}')
+        finally:
+            signals.post_save.connect(crowdfunding_signals.on_payment_save, sender=Payment)
+            signals.post_save.connect(crowdfunding_signals.on_collect_save, sender=Collect)
+
+    def run_case(self, user, writers, payments_count, shards):
+        """Прогоняет одного и того же писателя в нескольких потоках"""
+        collect = Collect.objects.create(
+            author=user,
+            name='Горячий сбор',
+            occasion='charity',
+            description='Нагрузочный тест счетчиков',
+            end_datetime=timezone.now() + timedelta(days=1)
+        )
+        amount = Decimal('10.00')
+        errors = []
+
+        def writer():
+            try:
+                for _ in range(payments_count):
+                    with transaction.atomic():
+                        Payment.objects.create(donator=user, collect=collect, amount=amount)
+                        add_amount(collect.id, amount, shards=shards)
+            except Exception as exc:  # noqa: BLE001 — выводим в отчет
+                errors.append(exc)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(writers)]
+        started = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+
+        for exc in errors:
+            self.stderr.write(f'   Ошибка писателя: {exc}')
+
+        rollup_collect(collect.id)
+        collect.refresh_from_db()
+        written = Payment.objects.filter(collect=collect).count()
+        lost = int((written * amount - collect.current_amount) / amount)
+
+        return written / elapsed if elapsed else 0, lost
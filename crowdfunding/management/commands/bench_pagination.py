@@ -0,0 +1,117 @@
+import statistics
+import time
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from rest_framework.pagination import PageNumberPagination
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from crowdfunding.management.commands._bench import add_allow_writes_argument, check_writes_allowed
+from crowdfunding.models import Collect
+from crowdfunding.pagination import CollectCursorPagination
+
+
+class Command(BaseCommand):
+    help = 'Сравнивает время глубоких страниц списка сборов: offset против курсора'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collects',
+            type=int,
+            default=200000,
+            help='Минимальное количество сборов в базе (недостающие будут созданы)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Размер страницы'
+        )
+        parser.add_argument(
+            '--pages',
+            type=str,
+            default='1,100,1000,10000',
+            help='Номера страниц через запятую'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество замеров на страницу'
+        )
+        add_allow_writes_argument(parser, 'недостающие сборы')
+
+    def handle(self, *args, **options):
+        check_writes_allowed(options, 'недостающие сборы')
+        page_size = options['page_size']
+        pages = [int(value) for value in options['pages'].split(',')]
+        self.ensure_collects(options['collects'])
+
+        factory = APIRequestFactory()
+        queryset = Collect.objects.order_by('-created_at', '-id')
+
+        self.stdout.write(f'{"страница":>10}{"offset, мс":>14}{"курсор, мс":>14}')
+        for page in pages:
+            offset_request = Request(factory.get('/api/collects/', {'page': page, 'page_size': page_size}))
+            offset_ms = self.measure(options['repeat'], lambda: self.offset_page(queryset, offset_request, page_size))
+
+            cursor_request = self.cursor_request(factory, queryset, page, page_size)
+            if cursor_request is None:
+                self.stdout.write(f'{page:>10}   страница за пределами данных')
+                continue
+            cursor_ms = self.measure(options['repeat'], lambda: CollectCursorPagination().paginate_queryset(
+                Collect.objects.all(), cursor_request
+            ))
+            self.stdout.write(f'{page:>10}{offset_ms:>14.2f}{cursor_ms:>14.2f}')
+
+    def ensure_collects(self, count):
+        """Досоздает сборы через bulk_create (без сигналов и писем)"""
+        missing = count - Collect.objects.count()
+        if missing <= 0:
+            return
+
+        self.stdout.write(f'💰 Создаем сборы: {missing}')
+        author, _ = User.objects.get_or_create(username='bench_pagination', defaults={'email': 'bench@example.com'})
+        end_datetime = timezone.now() + timedelta(days=30)
+        batch = []
+        for i in range(missing):
+            batch.append(Collect(
+                author=author,
+                name=f'Сбор #{i + 1}',
+                occasion='other',
+                description='Нагрузочный тест пагинации',
+                end_datetime=end_datetime
+            ))
+            if len(batch) == 5000:
+                Collect.objects.bulk_create(batch)
+                batch = []
+        Collect.objects.bulk_create(batch)
+
+    def offset_page(self, queryset, request, page_size):
+        paginator = PageNumberPagination()
+        paginator.page_size = page_size
+        return list(paginator.paginate_queryset(queryset, request))
+
+    def cursor_request(self, factory, queryset, page, page_size):
+        """Строит запрос с курсором, указывающим на начало нужной страницы (вне замера)"""
+        if page == 1:
+            return Request(factory.get('/api/collects/', {'page_size': page_size}))
+
+        boundary = queryset[(page - 1) * page_size - 1:(page - 1) * page_size].first()
+        if boundary is None:
+            return None
+        paginator = CollectCursorPagination()
+        paginator.base_url = 'http://testserver/api/collects/'
+        url = paginator.encode_cursor(boundary, reverse=False)
+        return Request(factory.get(url, {'page_size': page_size}))
+
+    def measure(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
@@ -0,0 +1,155 @@
+import random
+import statistics
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.utils import timezone
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from crowdfunding import search
+from crowdfunding.management.commands._bench import add_allow_writes_argument, check_writes_allowed
+from crowdfunding.management.commands.fill_db import COLLECT_NAMES, OCCASIONS
+from crowdfunding.models import Collect
+from crowdfunding.pagination import CollectCursorPagination
+
+# Слова описаний: частые, средние и редкое (примерно 1 сбор на 1000)
+COMMON_WORDS = ['помощь', 'средства', 'важное', 'дело', 'благодарны', 'поддержка']
+MEDIUM_WORDS = ['лечение', 'операция', 'путешествие', 'приют', 'школа', 'спорт', 'музыка', 'книги', 'экология', 'семья']
+RARE_WORD = 'реабилитация'
+
+SCENARIOS = [
+    ('частое слово', {'q': 'помощь'}),
+    ('среднее слово', {'q': 'приют'}),
+    ('редкое слово', {'q': RARE_WORD}),
+    ('два слова', {'q': 'лечение операция'}),
+    ('префикс', {'q': 'экол'}),
+    ('слово + повод + активные', {'q': 'школа', 'occasion': 'charity', 'status': 'active'}),
+    ('слово + цель + прогресс', {'q': 'музыка', 'target_min': '100000', 'progress_min': '50'}),
+    ('только фильтры', {'occasion': 'medical', 'status': 'active', 'target_max': '100000'}),
+]
+
+
+class Command(BaseCommand):
+    help = 'Замеряет поиск и фильтрацию сборов на большом наборе данных'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--collects',
+            type=int,
+            default=1000000,
+            help='Минимальное количество сборов в базе (недостающие будут созданы)'
+        )
+        parser.add_argument(
+            '--page-size',
+            type=int,
+            default=20,
+            help='Размер страницы'
+        )
+        parser.add_argument(
+            '--repeat',
+            type=int,
+            default=5,
+            help='Количество замеров на сценарий'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=42,
+            help='Зерно генератора данных'
+        )
+        parser.add_argument(
+            '--compare',
+            action='store_true',
+            help='Сравнить с поиском через icontains (полный просмотр таблицы)'
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Показать план запроса для каждого сценария'
+        )
+        add_allow_writes_argument(parser, 'поисковый индекс, недостающие сборы')
+
+    def handle(self, *args, **options):
+        check_writes_allowed(options, 'поисковый индекс, недостающие сборы')
+        # Индекс до вставки — новые сборы попадут в FTS5 через триггеры
+        search.install(connection)
+        self.ensure_collects(options['collects'], random.Random(options['seed']))
+
+        factory = APIRequestFactory()
+        request = Request(factory.get('/api/collects/', {'page_size': options['page_size']}))
+        self.stdout.write(f'🔎 Сборов в базе: {Collect.objects.count()}, БД: {connection.vendor}')
+
+        header = f'{"сценарий":<28}{"индекс, мс":>12}{"найдено":>10}'
+        if options['compare']:
+            header += f'{"icontains, мс":>16}'
+        self.stdout.write(header)
+
+        for name, params in SCENARIOS:
+            queryset = search.filter_collects(Collect.objects.all(), params)
+            indexed_ms = self.measure(options['repeat'], lambda: self.first_page(queryset, request))
+            line = f'{name:<28}{indexed_ms:>12.2f}{len(self.first_page(queryset, request)):>10}'
+
+            if options['compare'] and params.get('q'):
+                naive = self.naive_search(params)
+                naive_ms = self.measure(options['repeat'], lambda: self.first_page(naive, request))
+                line += f'{naive_ms:>16.2f}'
+            self.stdout.write(line)
+
+            if options['explain']:
+                paginated = queryset.order_by('-created_at', '-id')[:options['page_size']]
+                for plan_line in paginated.explain().splitlines():
+                    self.stdout.write(f'      {plan_line}')
+
+    def first_page(self, queryset, request):
+        return list(CollectCursorPagination().paginate_queryset(queryset, request))
+
+    def naive_search(self, params):
+        queryset = search.filter_collects(Collect.objects.all(), dict(params, q=''))
+        for term in search.parse_terms(params['q']):
+            queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+        return queryset
+
+    def ensure_collects(self, count, rng):
+        """Досоздает сборы через bulk_create (без сигналов и писем)"""
+        missing = count - Collect.objects.count()
+        if missing <= 0:
+            return
+
+        self.stdout.write(f'💰 Создаем сборы: {missing}')
+        author, _ = User.objects.get_or_create(username='bench_search', defaults={'email': 'bench@example.com'})
+        now = timezone.now()
+        batch = []
+        for i in range(missing):
+            words = rng.sample(COMMON_WORDS, 2) + rng.sample(MEDIUM_WORDS, 2)
+            if rng.random() < 0.001:
+                words.append(RARE_WORD)
+            target_amount = rng.choice([None, 50000, 100000, 200000, 500000])
+            batch.append(Collect(
+                author=author,
+                name=f'{rng.choice(COLLECT_NAMES)} #{i + 1}',
+                occasion=rng.choice(OCCASIONS)[0],
+                description=' '.join(words),
+                target_amount=target_amount,
+                current_amount=Decimal(rng.randint(0, target_amount or 100000)),
+                end_datetime=now + timedelta(days=rng.randint(-180, 365))
+            ))
+            if len(batch) == 5000:
+                Collect.objects.bulk_create(batch)
+                batch = []
+                if (i + 1) % 100000 == 0:
+                    self.stdout.write(f'   Создано сборов: {i + 1}')
+        Collect.objects.bulk_create(batch)
+
+    def measure(self, repeat, func):
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings)
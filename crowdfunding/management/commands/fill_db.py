@@ -1,9 +1,69 @@
+from contextlib import contextmanager
 from django.core.management.base import BaseCommand
 from django.contrib.auth.models import User
+from django.contrib.auth.hashers import make_password
+from django.db.models import Count, Max, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 from datetime import timedelta
+from decimal import Decimal
+from itertools import accumulate
 import random
+import time
+from crowdfunding import analytics, leaderboards, signals as crowdfunding_signals
+from crowdfunding.cache import invalidate_collects
+from crowdfunding.lifecycle import ENDED, CollectLifecycle, compute_status
+from crowdfunding.milestones import CollectMilestone, reached
 from crowdfunding.models import Collect, Payment
+from crowdfunding.stats import CollectDonor, CollectStats
+
+OCCASIONS = [
+    ('birthday', 'День рождения'),
+    ('wedding', 'Свадьба'),
+    ('medical', 'Медицинское лечение'),
+    ('charity', 'Благотворительность'),
+    ('other', 'Другое')
+]
+
+COLLECT_NAMES = [
+    "Помощь в лечении",
+    "Сбор на операцию",
+    "На день рождения",
+    "На свадебное путешествие",
+    "Благотворительный сбор",
+    "Помощь семье",
+    "Образовательный проект",
+    "Творческий проект",
+    "Спортивный сбор",
+    "Экологический проект"
+]
+
+PAYMENT_COMMENTS = [
+    "Желаю успехов в сборе!",
+    "Надеюсь, это поможет",
+    "От всей души",
+    "Пусть все получится",
+    "Будьте здоровы",
+    "Удачи в вашем деле",
+    "Спасибо за вашу работу",
+    "Надеюсь на лучшее",
+    "Верю в ваш успех",
+    "От чистого сердца"
+]
+
+
+@contextmanager
+def explicit_dates(field):
+    """Временно отключает auto_now_add поля даты — генератор задает дату сам.
+
+    Поле модели общее для процесса, поэтому отключается только на время bulk_create.
+    """
+    auto_now_add = field.auto_now_add
+    field.auto_now_add = False
+    try:
+        yield
+    finally:
+        field.auto_now_add = auto_now_add
 
 
 class Command(BaseCommand):
@@ -28,12 +88,49 @@ class Command(BaseCommand):
             default=50,
             help='Количество тестовых платежей'
         )
+        parser.add_argument(
+            '--fast',
+            action='store_true',
+            help='Режим генератора: bulk_create пачками, без сигналов и писем'
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=None,
+            help='Зерно генератора случайных чисел для воспроизводимых данных'
+        )
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=10000,
+            help='Размер пачки bulk_create в режиме генератора'
+        )
+        parser.add_argument(
+            '--days',
+            type=int,
+            default=30,
+            help='За сколько последних дней распределены даты сборов и платежей в режиме генератора'
+        )
+        parser.add_argument(
+            '--skew',
+            type=float,
+            default=1.1,
+            help='Перекос платежей в "горячие" сборы (показатель Ципфа, 0 — равномерно)'
+        )
 
     def handle(self, *args, **options):
         users_count = options['users']
         collects_count = options['collects']
         payments_count = options['payments']
 
+        if options['seed'] is not None:
+            random.seed(options['seed'])
+
+        if options['fast']:
+            self.generate(users_count, collects_count, payments_count, options)
+            self.print_statistics()
+            return
+
         self.stdout.write('🎯 Начинаем наполнение базы тестовыми данными...')
 
         # 1. Создаем пользователей
@@ -55,35 +152,14 @@ class Command(BaseCommand):
 
         # 2. Создаем сборы
         self.stdout.write('💰 Создаем сборы...')
-        occasions = [
-            ('birthday', 'День рождения'),
-            ('wedding', 'Свадьба'),
-            ('medical', 'Медицинское лечение'),
-            ('charity', 'Благотворительность'),
-            ('other', 'Другое')
-        ]
-
-        collect_names = [
-            "Помощь в лечении",
-            "Сбор на операцию",
-            "На день рождения",
-            "На свадебное путешествие",
-            "Благотворительный сбор",
-            "Помощь семье",
-            "Образовательный проект",
-            "Творческий проект",
-            "Спортивный сбор",
-            "Экологический проект"
-        ]
-
         collects = []
         for i in range(collects_count):
-            occasion = random.choice(occasions)
+            occasion = random.choice(OCCASIONS)
             collect = Collect.objects.create(
                 author=random.choice(users),
-                name=f"{random.choice(collect_names)} #{i + 1}",
+                name=f"{random.choice(COLLECT_NAMES)} #{i + 1}",
                 occasion=occasion[0],
-                description=f"Это тестовое описание для сбора '{random.choice(collect_names)}'. " +
+                description=f"Это тестовое описание для сбора '{random.choice(COLLECT_NAMES)}'. " +
                             f"Мы собираем средства на важное дело и будем благодарны за любую помощь!",
                 target_amount=random.choice([None, 50000, 100000, 200000, 500000]),
                 end_datetime=timezone.now() + timedelta(days=random.randint(30, 365))
@@ -93,19 +169,6 @@ class Command(BaseCommand):
 
         # 3. Создаем платежи
         self.stdout.write('💳 Создаем платежи...')
-        payment_comments = [
-            "Желаю успехов в сборе!",
-            "Надеюсь, это поможет",
-            "От всей души",
-            "Пусть все получится",
-            "Будьте здоровы",
-            "Удачи в вашем деле",
-            "Спасибо за вашу работу",
-            "Надеюсь на лучшее",
-            "Верю в ваш успех",
-            "От чистого сердца"
-        ]
-
         for i in range(payments_count):
             collect = random.choice(collects)
             donator = random.choice(users)
@@ -118,7 +181,7 @@ class Command(BaseCommand):
                 donator=donator,
                 collect=collect,
                 amount=random.randint(100, 10000),
-                comment=random.choice(payment_comments)
+                comment=random.choice(PAYMENT_COMMENTS)
             )
 
             # Обновляем сумму сбора через сигналы
@@ -128,13 +191,19 @@ class Command(BaseCommand):
                 self.stdout.write(f'   Создано платежей: {i + 1}')
 
         # 4. Выводим статистику
+        self.print_statistics()
+
+    def print_statistics(self):
         self.stdout.write('\n📊 Статистика базы данных:')
         self.stdout.write(f'   👥 Пользователей: {User.objects.count()}')
         self.stdout.write(f'   💰 Сборов: {Collect.objects.count()}')
         self.stdout.write(f'   💳 Платежей: {Payment.objects.count()}')
 
-        total_amount = sum(collect.current_amount for collect in Collect.objects.all())
-        active_collects = Collect.objects.filter(end_datetime__gt=timezone.now()).count()
+        total_amount = Collect.objects.aggregate(total=Sum('current_amount'))['total'] or 0
+        # По частичному индексу незавершенных сборов, а не по всей таблице сборов
+        active_collects = CollectLifecycle.objects.exclude(status=ENDED).filter(
+            end_datetime__gt=timezone.now()
+        ).count()
 
         self.stdout.write(f'   💵 Общая собранная сумма: {total_amount} руб.')
         self.stdout.write(f'   🟢 Активных сборов: {active_collects}')
@@ -153,4 +222,196 @@ class Command(BaseCommand):
             self.style.SUCCESS(
                 '🔗 Или через API: http://127.0.0.1:8000/api/collects/'
             )
-        )
\ No newline at end of file
+        )
+
+    def generate(self, users_count, collects_count, payments_count, options):
+        """Быстрый генератор: пачки bulk_create без сигналов, суммы считаются в конце"""
+        rng = random.Random(options['seed'])
+        chunk_size = options['chunk_size']
+        started = time.perf_counter()
+
+        self.stdout.write('🎯 Генерируем тестовые данные пачками...')
+        with crowdfunding_signals.disconnected():
+            user_ids = self.generate_users(users_count, chunk_size)
+            collects = self.generate_collects(rng, user_ids, collects_count, chunk_size, options['days'])
+            self.generate_payments(rng, user_ids, collects, payments_count, chunk_size, options['skew'])
+            if collects:
+                self.update_totals(min(collects), max(collects))
+                self.rebuild_aggregates()
+                self.invalidate_cache(list(collects), chunk_size)
+
+        self.stdout.write(f'   ⏱ Готово за {time.perf_counter() - started:.1f} с')
+
+    def generate_users(self, users_count, chunk_size):
+        self.stdout.write('👥 Создаем пользователей...')
+        # Хэш пароля считается один раз, а не для каждого пользователя
+        password = make_password('password123')
+        user_ids = []
+        for offset in range(0, users_count, chunk_size):
+            usernames = [f'user{i + 1}' for i in range(offset, min(offset + chunk_size, users_count))]
+            User.objects.bulk_create(
+                [User(username=username, email=f'{username}@example.com', password=password)
+                 for username in usernames],
+                ignore_conflicts=True
+            )
+            user_ids.extend(User.objects.filter(username__in=usernames).values_list('id', flat=True))
+            self.stdout.write(f'   Создано пользователей: {len(user_ids)}')
+        return user_ids
+
+    def generate_collects(self, rng, user_ids, collects_count, chunk_size, days):
+        """Создает сборы за последние days дней; возвращает словарь {id сбора: (id автора, создан, цель)}"""
+        self.stdout.write('💰 Создаем сборы...')
+        now = timezone.now()
+        collects = {}
+        for offset in range(0, collects_count, chunk_size):
+            batch = []
+            for i in range(offset, min(offset + chunk_size, collects_count)):
+                created_at = now - timedelta(seconds=rng.uniform(0, days * 24 * 60 * 60))
+                batch.append(Collect(
+                    author_id=rng.choice(user_ids),
+                    name=f"{rng.choice(COLLECT_NAMES)} #{i + 1}",
+                    occasion=rng.choice(OCCASIONS)[0],
+                    description=f"Это тестовое описание для сбора '{rng.choice(COLLECT_NAMES)}'. "
+                                f"Мы собираем средства на важное дело и будем благодарны за любую помощь!",
+                    target_amount=rng.choice([None, 50000, 100000, 200000, 500000]),
+                    end_datetime=now + timedelta(days=rng.randint(30, 365)),
+                    created_at=created_at,
+                ))
+            with explicit_dates(Collect._meta.get_field('created_at')):
+                created = Collect.objects.bulk_create(batch)
+            for collect in created:
+                collects[collect.id] = (collect.author_id, collect.created_at, collect.target_amount)
+            self.stdout.write(f'   Создано сборов: {len(collects)}')
+        return collects
+
+    def generate_payments(self, rng, user_ids, collects, payments_count, chunk_size, skew):
+        self.stdout.write('💳 Создаем платежи...')
+        if not collects or not payments_count:
+            return
+
+        # Распределение Ципфа: сбор ранга r получает долю 1 / r^skew, ранги перемешаны
+        collect_ids = list(collects)
+        rng.shuffle(collect_ids)
+        weights = [1 / (rank ** skew) for rank in range(1, len(collect_ids) + 1)]
+        cum_weights = list(accumulate(weights))
+
+        # Средний платеж сбора с целью — такой, чтобы сбор набрал от 5% до 100% цели:
+        # иначе пороги и прогресс на сгенерированных данных не проверить
+        average_amounts = {}
+        for collect_id, weight in zip(collect_ids, weights):
+            target_amount = collects[collect_id][2]
+            if target_amount:
+                expected_payments = max(1.0, payments_count * weight / cum_weights[-1])
+                average_amounts[collect_id] = float(target_amount) * rng.uniform(0.05, 1.0) / expected_payments
+
+        now = timezone.now()
+        created = 0
+        while created < payments_count:
+            size = min(chunk_size, payments_count - created)
+            batch = []
+            for collect_id in rng.choices(collect_ids, cum_weights=cum_weights, k=size):
+                author_id, created_at, _ = collects[collect_id]
+                donator_id = rng.choice(user_ids)
+                # Донатор не автор сбора (если есть из кого выбрать)
+                if donator_id == author_id and len(user_ids) > 1:
+                    while donator_id == author_id:
+                        donator_id = rng.choice(user_ids)
+                if collect_id in average_amounts:
+                    amount = max(1, round(average_amounts[collect_id] * rng.uniform(0.5, 1.5)))
+                else:
+                    amount = rng.randint(100, 10000)
+                # Даты платежей — от создания сбора до текущего момента
+                date_added = created_at + (now - created_at) * rng.random()
+                batch.append(Payment(
+                    donator_id=donator_id,
+                    collect_id=collect_id,
+                    amount=amount,
+                    comment=rng.choice(PAYMENT_COMMENTS),
+                    date_added=date_added,
+                ))
+            with explicit_dates(Payment._meta.get_field('date_added')):
+                Payment.objects.bulk_create(batch)
+            created += size
+            self.stdout.write(f'   Создано платежей: {created}')
+
+    def update_totals(self, first_id, last_id):
+        """Считает суммы, статистику, статусы и пройденные пороги созданных сборов"""
+        self.stdout.write('🧮 Считаем суммы сборов...')
+        payments = Payment.objects.filter(collect_id__gte=first_id, collect_id__lte=last_id)
+        totals = (
+            Payment.objects.filter(collect=OuterRef('pk'))
+            .values('collect')
+            .annotate(total=Sum('amount'))
+            .values('total')
+        )
+        Collect.objects.filter(pk__gte=first_id, pk__lte=last_id).update(
+            current_amount=Coalesce(Subquery(totals), Decimal('0'))
+        )
+
+        aggregates = payments.values('collect_id').annotate(
+            donors_count=Count('donator', distinct=True),
+            payments_count=Count('id'),
+            total_amount=Sum('amount'),
+            max_amount=Max('amount'),
+            last_payment_at=Max('date_added'),
+        ).order_by()
+        CollectStats.objects.bulk_create(
+            (CollectStats(**row) for row in aggregates.iterator()),
+            batch_size=10000,
+            ignore_conflicts=True
+        )
+        # Донаторы сборов — по ним новые платежи узнают, новый ли донатор
+        CollectDonor.objects.bulk_create(
+            (
+                CollectDonor(collect_id=collect_id, donator_id=donator_id)
+                for collect_id, donator_id in payments.values_list('collect_id', 'donator_id')
+                .order_by().distinct().iterator()
+            ),
+            batch_size=10000,
+            ignore_conflicts=True
+        )
+        # Сборы без платежей получают пустую статистику
+        empty = Collect.objects.filter(pk__gte=first_id, pk__lte=last_id, stats__isnull=True)
+        CollectStats.objects.bulk_create(
+            (CollectStats(collect_id=collect_id) for collect_id in empty.values_list('id', flat=True).iterator()),
+            batch_size=10000,
+            ignore_conflicts=True
+        )
+
+        now = timezone.now()
+        collects = Collect.objects.filter(pk__gte=first_id, pk__lte=last_id).values_list(
+            'id', 'end_datetime', 'current_amount', 'target_amount'
+        )
+        CollectLifecycle.objects.bulk_create(
+            (
+                CollectLifecycle(
+                    collect_id=collect_id, end_datetime=end_datetime, updated_at=now,
+                    status=compute_status(end_datetime, current_amount, target_amount, now),
+                )
+                for collect_id, end_datetime, current_amount, target_amount in collects.iterator()
+            ),
+            batch_size=10000,
+            ignore_conflicts=True
+        )
+        # Пройденные пороги — иначе первый же новый платеж разослал бы уведомления о старых порогах
+        CollectMilestone.objects.bulk_create(
+            (
+                CollectMilestone(collect_id=collect_id, percent=percent, reached_at=now)
+                for collect_id, _, current_amount, target_amount in collects.iterator()
+                for percent in reached(current_amount, target_amount)
+            ),
+            batch_size=10000,
+            ignore_conflicts=True
+        )
+
+    def rebuild_aggregates(self):
+        """Пересобирает рейтинги и аналитику: без сигналов платежи в них не попали"""
+        self.stdout.write('🏆 Пересобираем рейтинги и аналитику пожертвований...')
+        leaderboards.rebuild()
+        analytics.rebuild()
+
+    def invalidate_cache(self, collect_ids, chunk_size):
+        """Сбрасывает кэш списка и созданных сборов: без сигналов версии не менялись"""
+        self.stdout.write('🧹 Сбрасываем кэш сборов...')
+        for offset in range(0, len(collect_ids), chunk_size):
+            invalidate_collects(collect_ids[offset:offset + chunk_size], list_changed=offset == 0)
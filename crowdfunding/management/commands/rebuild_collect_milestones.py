@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from crowdfunding.milestones import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Записывает пройденные пороги всех сборов (без уведомлений)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🏁 Пересчитываем пройденные пороги сборов...')
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Порогов записано: {count}'))
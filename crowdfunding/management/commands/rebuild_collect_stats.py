@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from crowdfunding.models import Collect
+from crowdfunding.stats import rebuild_stats
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает статистику сборов по таблице платежей'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📊 Пересчитываем статистику сборов...')
+
+        collect_ids = Collect.objects.values_list('id', flat=True)
+        count = 0
+        for collect_id in collect_ids.iterator():
+            rebuild_stats(collect_id)
+            count += 1
+
+        self.stdout.write(self.style.SUCCESS(f'✅ Статистика пересчитана для сборов: {count}'))
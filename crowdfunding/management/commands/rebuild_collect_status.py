@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from crowdfunding.lifecycle import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересчитывает хранимые статусы всех сборов (активен, цель достигнута, завершен)'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🔄 Пересчитываем статусы сборов...')
+        count = rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Статусы пересчитаны: {count}'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from crowdfunding.leaderboards import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает рейтинги сборов и донаторов по таблице платежей'
+
+    def handle(self, *args, **options):
+        self.stdout.write('🏆 Пересобираем рейтинги...')
+        rebuild()
+        self.stdout.write(self.style.SUCCESS('✅ Рейтинги пересобраны'))
@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+from crowdfunding.analytics import CollectRollup, rebuild
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает интервалы аналитики пожертвований по таблице платежей'
+
+    def handle(self, *args, **options):
+        self.stdout.write('📈 Пересобираем аналитику пожертвований...')
+        rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Интервалов по сборам: {CollectRollup.objects.count()}'))
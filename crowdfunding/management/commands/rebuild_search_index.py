@@ -0,0 +1,12 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+from crowdfunding.search import rebuild
+
+
+class Command(BaseCommand):
+    help = 'Создает и перестраивает поисковый индекс сборов'
+
+    def handle(self, *args, **options):
+        self.stdout.write(f'🔎 Перестраиваем поисковый индекс ({connection.vendor})...')
+        rebuild(connection)
+        self.stdout.write(self.style.SUCCESS('✅ Поисковый индекс готов'))
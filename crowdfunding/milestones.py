@@ -0,0 +1,110 @@
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.utils import timezone
+
+from . import outbox
+from .counters import get_current_amount
+from .models import Collect
+from .tasks import send_collect_goal_reached_email, send_collect_milestone_email
+
+# Порог «цель достигнута» есть всегда, даже если его нет в настройке
+GOAL = 100
+
+
+class CollectMilestone(models.Model):
+    """Пройденный сбором порог (процент от целевой суммы).
+
+    Строка появляется при пересечении порога вверх и удаляется, когда сумма
+    опускается ниже него, — уведомление уходит один раз на пересечение,
+    а не на каждый следующий платеж.
+    """
+    collect = models.ForeignKey(Collect, on_delete=models.CASCADE, related_name='milestones')
+    percent = models.PositiveSmallIntegerField()
+    reached_at = models.DateTimeField()
+
+    class Meta:
+        unique_together = ['collect', 'percent']
+
+    def __str__(self):
+        return f'{self.collect_id}: {self.percent}%'
+
+
+def get_milestones():
+    """Пороги в процентах от цели по возрастанию (по умолчанию 25, 50, 75, 100)"""
+    return sorted(set(getattr(settings, 'COLLECT_MILESTONES', [25, 50, 75])) | {GOAL})
+
+
+def reached(amount, target_amount):
+    """Пороги, которых достигает сумма"""
+    if not target_amount:
+        return []
+    return [percent for percent in get_milestones() if amount * 100 >= target_amount * percent]
+
+
+def on_amount_changed(collect, previous_amount, current_amount):
+    """Учитывает изменение суммы сбора (в транзакции платежа).
+
+    Если между прежней и новой суммой нет ни одного порога — ни одного запроса.
+    Возвращает пороги, пересеченные вверх.
+    """
+    if reached(previous_amount, collect.target_amount) == reached(current_amount, collect.target_amount):
+        return []
+    return reconcile(collect, current_amount)
+
+
+def reconcile(collect, current_amount=None):
+    """Приводит записанные пороги к сумме сбора: новые записывает и уведомляет, ушедшие ниже — удаляет"""
+    if current_amount is None:
+        current_amount = get_current_amount(collect)
+    expected = set(reached(current_amount, collect.target_amount))
+    milestones = CollectMilestone.objects.filter(collect_id=collect.id)
+    recorded = set(milestones.values_list('percent', flat=True))
+
+    if recorded - expected:
+        milestones.filter(percent__in=recorded - expected).delete()
+
+    now = timezone.now()
+    crossed = []
+    for percent in sorted(expected - recorded):
+        try:
+            with transaction.atomic():
+                milestone = CollectMilestone.objects.create(collect_id=collect.id, percent=percent, reached_at=now)
+        except IntegrityError:
+            # Порог записал параллельный платеж — он и уведомит
+            continue
+        notify(milestone)
+        crossed.append(percent)
+    return crossed
+
+
+def notify(milestone):
+    """Уведомление об одном пересечении порога.
+
+    Ключ дедупликации включает id строки порога: повторное пересечение после
+    падения суммы — новая строка и новое уведомление, а одно пересечение
+    не уведомляет дважды.
+    """
+    dedup_key = f'milestone:{milestone.collect_id}:{milestone.percent}:{milestone.id}'
+    if milestone.percent == GOAL:
+        outbox.enqueue(send_collect_goal_reached_email, milestone.collect_id, dedup_key=dedup_key)
+    else:
+        outbox.enqueue(send_collect_milestone_email, milestone.collect_id, milestone.percent, dedup_key=dedup_key)
+
+
+def rebuild():
+    """Записывает пройденные пороги всех сборов с целью без уведомлений; возвращает число порогов"""
+    now = timezone.now()
+    collects = Collect.objects.filter(target_amount__isnull=False).values_list(
+        'id', 'current_amount', 'target_amount'
+    )
+    with transaction.atomic():
+        CollectMilestone.objects.all().delete()
+        milestones = CollectMilestone.objects.bulk_create(
+            (
+                CollectMilestone(collect_id=collect_id, percent=percent, reached_at=now)
+                for collect_id, current_amount, target_amount in collects.iterator(chunk_size=2000)
+                for percent in reached(current_amount, target_amount)
+            ),
+            batch_size=10000,
+        )
+    return len(milestones)
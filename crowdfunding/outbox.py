@@ -0,0 +1,215 @@
+import logging
+import threading
+from contextlib import nullcontext
+from datetime import timedelta
+
+from celery import current_app
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, models, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import instrumentation
+
+logger = logging.getLogger(__name__)
+
+
+class OutboxMessage(models.Model):
+    """Намерение отправить уведомление, записанное в транзакции изменения данных.
+
+    После коммита реле публикует сообщения в Celery; воркер выполняет
+    задачу по сообщению не больше одного раза (processed_at).
+    """
+    task = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    # Ключ дедупликации: второе сообщение с тем же ключом не записывается
+    dedup_key = models.CharField(max_length=200, unique=True, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    # Не раньше этого времени сообщение публикуется (отложенная отправка и повторы)
+    available_at = models.DateTimeField()
+    published_at = models.DateTimeField(null=True, blank=True)
+    processed_at = models.DateTimeField(null=True, blank=True)
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['published_at', 'available_at'])]
+
+    def __str__(self):
+        return f'{self.task}{tuple(self.args)}'
+
+
+def get_batch_size():
+    """Сколько сообщений реле публикует за одну транзакцию"""
+    return getattr(settings, 'OUTBOX_BATCH_SIZE', 100)
+
+
+def get_max_backoff():
+    """Максимальная пауза (сек.) перед повторной публикацией после ошибки брокера"""
+    return getattr(settings, 'OUTBOX_MAX_BACKOFF', 300)
+
+
+def get_redelivery_timeout():
+    """Через сколько опубликованное, но не выполненное сообщение публикуется снова.
+
+    Должно превышать время всех повторов задачи dispatch_outbox_message.
+    """
+    return getattr(settings, 'OUTBOX_REDELIVERY_TIMEOUT', timedelta(minutes=15))
+
+
+def get_max_attempts():
+    """После скольких попыток сообщение больше не публикуется повторно"""
+    return getattr(settings, 'OUTBOX_MAX_ATTEMPTS', 10)
+
+
+def get_retention():
+    """Сколько хранятся выполненные сообщения"""
+    return getattr(settings, 'OUTBOX_RETENTION', timedelta(days=7))
+
+
+def enqueue(task, *args, dedup_key=None, countdown=0):
+    """Записывает уведомление в текущей транзакции; публикуется оно после коммита.
+
+    Возвращает сообщение или None, если сообщение с dedup_key уже есть.
+    Отложенное (countdown, сек.) сообщение публикует периодическое реле.
+    """
+    now = timezone.now()
+    try:
+        # Точка сохранения: дубликат не ломает внешнюю транзакцию
+        with transaction.atomic():
+            message = OutboxMessage.objects.create(
+                task=task.name,
+                args=list(args),
+                dedup_key=dedup_key,
+                available_at=now + timedelta(seconds=countdown),
+            )
+    except IntegrityError:
+        if dedup_key is None:
+            raise
+        return None
+    # Публикует реле уже вне запроса — задачу запроса учитываем по записанному намерению
+    instrumentation.record('tasks_enqueued')
+
+    if not countdown:
+        # Первое пробуждение реле после коммита публикует все сообщения транзакции разом
+        transaction.on_commit(relay.wake)
+    return message
+
+
+def publish_pending():
+    """Публикует в Celery созревшие сообщения и повторно — потерянные; возвращает число опубликованных.
+
+    Строки блокируются с SKIP LOCKED — несколько реле не публикуют одно
+    сообщение дважды. Пачка уходит через одного продюсера брокера.
+    """
+    published = _publish(lambda now: {'published_at__isnull': True, 'available_at__lte': now})
+    # Опубликовано, но не выполнено: задача исчерпала повторы или сообщение потерял брокер
+    published += _publish(lambda now: {
+        'published_at__lt': now - get_redelivery_timeout(),
+        'processed_at__isnull': True,
+        'attempts__lt': get_max_attempts(),
+    }, redelivery=True)
+    return published
+
+
+def _publish(get_filters, redelivery=False):
+    from .tasks import dispatch_outbox_message
+
+    eager = current_app.conf.task_always_eager
+    published_total = 0
+    while True:
+        now = timezone.now()
+        with transaction.atomic():
+            messages = list(
+                OutboxMessage.objects.select_for_update(skip_locked=True)
+                .filter(**get_filters(now))
+                .order_by('id')[:get_batch_size()]
+            )
+            if not messages:
+                return published_total
+
+            published = []
+            failed = None
+            # В синхронном режиме Celery брокера нет — продюсер не нужен
+            with nullcontext() if eager else current_app.producer_or_acquire() as producer:
+                for message in messages:
+                    try:
+                        dispatch_outbox_message.apply_async(
+                            (message.id,), task_id=f'outbox-{message.id}', producer=producer
+                        )
+                    except Exception as exc:  # noqa: BLE001 — брокер недоступен, повторим позже
+                        failed = (message, exc)
+                        break
+                    published.append(message.id)
+
+            if redelivery and published:
+                logger.warning('Повторно опубликованы невыполненные сообщения outbox: %s', published)
+                OutboxMessage.objects.filter(id__in=published).update(published_at=now, attempts=F('attempts') + 1)
+            else:
+                OutboxMessage.objects.filter(id__in=published).update(published_at=now)
+            published_total += len(published)
+            if failed:
+                message, exc = failed
+                logger.warning('Не удалось опубликовать сообщение outbox %s: %s', message.id, exc)
+                OutboxMessage.objects.filter(id=message.id).update(
+                    attempts=message.attempts + 1,
+                    last_error=str(exc),
+                    available_at=now + timedelta(seconds=min(2 ** message.attempts, get_max_backoff())),
+                )
+                return published_total
+
+
+def process(message_id):
+    """Выполняет задачу сообщения, если она еще не выполнялась"""
+    with transaction.atomic():
+        message = OutboxMessage.objects.select_for_update().filter(id=message_id).first()
+        if message is None:
+            return 'Сообщение не найдено'
+        if message.processed_at is not None:
+            # Повторная публикация (реле упало после отправки в брокер)
+            return f'Сообщение {message_id} уже обработано'
+        result = current_app.tasks[message.task](*message.args)
+        message.processed_at = timezone.now()
+        message.save(update_fields=['processed_at'])
+    return result
+
+
+def purge(now=None):
+    """Удаляет выполненные сообщения старше срока хранения"""
+    now = now or timezone.now()
+    deleted, _ = OutboxMessage.objects.filter(processed_at__lt=now - get_retention()).delete()
+    return deleted
+
+
+class OutboxRelay:
+    """Реле процесса: после коммита публикует сообщения в фоне, не задерживая запрос"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.event = threading.Event()
+        self.thread = None
+
+    def wake(self):
+        if current_app.conf.task_always_eager:
+            # Синхронный Celery (тесты, разработка) — публикуем сразу
+            publish_pending()
+            return
+        with self.lock:
+            if self.thread is None or not self.thread.is_alive():
+                self.thread = threading.Thread(target=self._relay_loop, daemon=True)
+                self.thread.start()
+        self.event.set()
+
+    def _relay_loop(self):
+        while True:
+            self.event.wait()
+            self.event.clear()
+            try:
+                publish_pending()
+            except Exception:  # noqa: BLE001 — сообщения останутся для периодического реле
+                logger.exception('Ошибка реле outbox')
+            finally:
+                close_old_connections()
+
+
+relay = OutboxRelay()
@@ -0,0 +1,151 @@
+import base64
+import json
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .models import Collect, Payment
+
+# Составные индексы курсорной пагинации: имя, модель, колонки
+INDEXES = [
+    ('crowdfunding_collect_created_idx', Collect, ['created_at', 'id']),
+    ('crowdfunding_payment_collect_date_idx', Payment, ['collect_id', 'date_added', 'id']),
+]
+
+
+def install(using=connection):
+    """Создает составные индексы курсорной пагинации (идемпотентно).
+
+    Без них каждая страница сортирует всю таблицу и глубокая страница не дешевле первой.
+    """
+    if using.vendor not in ('postgresql', 'sqlite'):
+        return
+    with using.cursor() as cursor:
+        for name, model, columns in INDEXES:
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON {model._meta.db_table} ({", ".join(columns)})')
+
+
+class KeysetPagination(BasePagination):
+    """Курсорная пагинация по паре (временная метка, id), от новых к старым.
+
+    Страница выбирается условием ts <= ts курсора AND (ts, id) < (ts курсора, id курсора)
+    по составному индексу: первая часть — граница сканирования индекса, поэтому
+    глубокая страница стоит столько же, сколько первая.
+    """
+    timestamp_field = None
+    cursor_query_param = 'cursor'
+    page_size_query_param = 'page_size'
+    invalid_cursor_message = 'Некорректный курсор'
+
+    def get_page_size(self, request):
+        page_size = getattr(settings, 'KEYSET_PAGE_SIZE', 20)
+        max_page_size = getattr(settings, 'KEYSET_MAX_PAGE_SIZE', 100)
+        try:
+            requested = int(request.query_params.get(self.page_size_query_param, page_size))
+        except ValueError:
+            return page_size
+        return max(1, min(requested, max_page_size))
+
+    def encode_cursor(self, item, reverse):
+        if isinstance(item, dict):
+            # Строки values() быстрого пути чтения
+            timestamp, pk = item[self.timestamp_field], item['id']
+        else:
+            timestamp, pk = getattr(item, self.timestamp_field), item.pk
+        position = [timestamp.isoformat(), pk, int(reverse)]
+        cursor = base64.urlsafe_b64encode(json.dumps(position).encode()).decode()
+        return replace_query_param(self.base_url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            timestamp, pk, reverse = json.loads(base64.urlsafe_b64decode(encoded.encode()))
+            timestamp = parse_datetime(timestamp)
+            if timestamp is None:
+                raise ValueError
+            return timestamp, int(pk), bool(reverse)
+        except (TypeError, ValueError, UnicodeDecodeError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        field = self.timestamp_field
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor[2])
+        if cursor:
+            timestamp, pk, _ = cursor
+            # Условие-диапазон по метке (ts <= x) задает границу сканирования индекса,
+            # а OR по (ts, id) лишь отсекает строки с той же меткой, что у курсора
+            if reverse:
+                # Назад по списку — берем более новые записи в обратном порядке
+                queryset = queryset.filter(
+                    Q(**{f'{field}__gt': timestamp}) | Q(**{field: timestamp, 'pk__gt': pk}),
+                    **{f'{field}__gte': timestamp}
+                )
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{field}__lt': timestamp}) | Q(**{field: timestamp, 'pk__lt': pk}),
+                    **{f'{field}__lte': timestamp}
+                )
+
+        ordering = (field, 'pk') if reverse else (f'-{field}', '-pk')
+        items = list(queryset.order_by(*ordering)[:self.page_size + 1])
+        has_more = len(items) > self.page_size
+        items = items[:self.page_size]
+        if reverse:
+            items.reverse()
+
+        self.next_link = None
+        self.previous_link = None
+        if items:
+            # При движении назад следующая страница есть всегда, а предыдущая — если остались записи
+            has_next = True if reverse else has_more
+            has_previous = has_more if reverse else cursor is not None
+            if has_next:
+                self.next_link = self.encode_cursor(items[-1], reverse=False)
+            if has_previous:
+                self.previous_link = self.encode_cursor(items[0], reverse=True)
+        return items
+
+    def get_next_link(self):
+        return self.next_link
+
+    def get_previous_link(self):
+        return self.previous_link
+
+    def get_paginated_response(self, data):
+        return Response({
+            'next': self.get_next_link(),
+            'previous': self.get_previous_link(),
+            'results': data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class CollectCursorPagination(KeysetPagination):
+    """Пагинация списка сборов по (created_at, id)"""
+    timestamp_field = 'created_at'
+
+
+class PaymentCursorPagination(KeysetPagination):
+    """Пагинация платежей по (date_added, id)"""
+    timestamp_field = 'date_added'
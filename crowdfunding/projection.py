@@ -0,0 +1,156 @@
+from collections import defaultdict
+from decimal import Decimal
+
+from django.utils import timezone
+from rest_framework import serializers
+
+from . import instrumentation
+from .lifecycle import effective_status
+from .serializers import CollectSerializer, CollectStatsSerializer, PaymentSerializer, UserSerializer
+from .stats import merge_pending, pending_changes
+
+# Колонки values() для каждого поля ответа сбора
+COLLECT_COLUMNS = {
+    'id': ['id'],
+    'author': ['author__id', 'author__username', 'author__email'],
+    'name': ['name'],
+    'occasion': ['occasion'],
+    'description': ['description'],
+    'target_amount': ['target_amount'],
+    'current_amount': ['current_amount'],
+    'end_datetime': ['end_datetime'],
+    'created_at': ['created_at'],
+    'updated_at': ['updated_at'],
+    'is_active': ['end_datetime'],
+    'status': ['lifecycle__status', 'lifecycle__end_datetime'],
+    'donors_count': ['stats__donors_count'],
+    'stats': [
+        'stats__collect_id', 'stats__donors_count', 'stats__payments_count', 'stats__total_amount',
+        'stats__max_amount', 'stats__last_payment_at',
+    ],
+    'payments': [],
+}
+PAYMENT_COLUMNS = ['id', 'collect_id', 'donator__id', 'donator__username', 'donator__email',
+                   'amount', 'comment', 'date_added']
+
+
+class Formats:
+    """Форматирование значений теми же полями DRF, что и в сериализаторах (учитывает настройки DRF).
+
+    Поля создаются один раз на ответ, а не на каждую строку и каждый объект.
+    """
+
+    def __init__(self):
+        self.decimal = serializers.DecimalField(max_digits=12, decimal_places=2).to_representation
+        self.datetime = serializers.DateTimeField().to_representation
+
+    def optional_decimal(self, value):
+        return None if value is None else self.decimal(value)
+
+    def optional_datetime(self, value):
+        return None if value is None else self.datetime(value)
+
+
+def _user(row, prefix):
+    return {name: row[f'{prefix}__{name}'] for name in UserSerializer.Meta.fields}
+
+
+def _stats(row, formats):
+    if row['stats__collect_id'] is None:
+        # Строки статистики нет — как и сериализатор, отдаем null
+        return None
+    payments_count = row['stats__payments_count']
+    total_amount = row['stats__total_amount']
+    avg_amount = (total_amount / payments_count).quantize(Decimal('0.01')) if payments_count else None
+    values = {
+        'donors_count': row['stats__donors_count'],
+        'payments_count': payments_count,
+        'total_amount': formats.decimal(total_amount),
+        'max_amount': formats.optional_decimal(row['stats__max_amount']),
+        'avg_amount': formats.optional_decimal(avg_amount),
+        'last_payment_at': formats.optional_datetime(row['stats__last_payment_at']),
+    }
+    return {name: values[name] for name in CollectStatsSerializer.Meta.fields}
+
+
+def _add_pending_stats(rows):
+    """Дополняет колонки статистики строк не перенесенными изменениями (как get_stats)"""
+    changes = pending_changes([row['id'] for row in rows])
+    for row in rows:
+        if row['id'] not in changes or row['stats__donors_count'] is None:
+            continue
+        values = {name[len('stats__'):]: value for name, value in row.items() if name.startswith('stats__')}
+        values.pop('collect_id', None)
+        for name, value in merge_pending(values, changes[row['id']]).items():
+            row[f'stats__{name}'] = value
+
+
+def payment_item(row, formats):
+    values = {
+        'id': row['id'],
+        'donator': _user(row, 'donator'),
+        'amount': formats.decimal(row['amount']),
+        'comment': row['comment'],
+        'date_added': formats.datetime(row['date_added']),
+    }
+    return {name: values[name] for name in PaymentSerializer.Meta.fields}
+
+
+def project_collects(queryset, fields):
+    """Строки сборов с колонками только запрошенных полей (и ключа пагинации)"""
+    columns = {'id', 'created_at'}
+    for name in fields:
+        columns.update(COLLECT_COLUMNS[name])
+    return queryset.select_related(None).prefetch_related(None).values(*sorted(columns))
+
+
+def project_payments(queryset):
+    return queryset.select_related(None).values(*PAYMENT_COLUMNS)
+
+
+def payments_by_collect(queryset, collect_ids):
+    """Платежи сборов одним запросом: {id сбора: [строки]}"""
+    grouped = defaultdict(list)
+    for row in project_payments(queryset.filter(collect_id__in=collect_ids)):
+        grouped[row['collect_id']].append(row)
+    return grouped
+
+
+def payment_items(rows):
+    """Ответ платежей в формате PaymentSerializer"""
+    with instrumentation.span('serializer'):
+        formats = Formats()
+        return [payment_item(row, formats) for row in rows]
+
+
+def collect_items(rows, fields, payments=None):
+    """Ответ сборов в формате CollectSerializer(fields=...) из строк values().
+
+    payments — queryset платежей для поля payments (порядок и лимит задает вызывающий).
+    """
+    # Порядок ключей — как у сериализатора, а не как в ?fields=
+    fields = [name for name in CollectSerializer.Meta.fields if name in fields]
+    grouped = {}
+    if 'payments' in fields and rows:
+        grouped = payments_by_collect(payments, [row['id'] for row in rows])
+    if ('donors_count' in fields or 'stats' in fields) and rows:
+        _add_pending_stats(rows)
+
+    with instrumentation.span('serializer'):
+        formats = Formats()
+        now = timezone.now()
+        builders = {
+            'author': lambda row: _user(row, 'author'),
+            'target_amount': lambda row: formats.optional_decimal(row['target_amount']),
+            'current_amount': lambda row: formats.decimal(row['current_amount']),
+            'end_datetime': lambda row: formats.datetime(row['end_datetime']),
+            'created_at': lambda row: formats.datetime(row['created_at']),
+            'updated_at': lambda row: formats.datetime(row['updated_at']),
+            'is_active': lambda row: row['end_datetime'] > now,
+            'status': lambda row: effective_status(row['lifecycle__status'], row['lifecycle__end_datetime'], now),
+            'donors_count': lambda row: row['stats__donors_count'],
+            'stats': lambda row: _stats(row, formats),
+            'payments': lambda row: [payment_item(payment, formats) for payment in grouped.get(row['id'], [])],
+        }
+        getters = [(name, builders.get(name, lambda row, name=name: row[name])) for name in fields]
+        return [{name: getter(row) for name, getter in getters} for row in rows]
@@ -0,0 +1,31 @@
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:  # без orjson — обычный JSONRenderer
+    orjson = None
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer на orjson с тем же выводом байт в байт.
+
+    Строки, числа, списки и словари кодируются в C; даты, Decimal и прочее —
+    тем же кодировщиком DRF, что и в JSONRenderer. Отступы (browsable API,
+    ?indent=) и нестандартные настройки JSON отдаются JSONRenderer.
+    """
+    encoder = encoders.JSONEncoder()
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None or not self.compact or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=self.encoder.default, option=orjson.OPT_PASSTHROUGH_DATETIME)
+        except TypeError:
+            # Например, целые больше 64 бит
+            return super().render(data, accepted_media_type, renderer_context)
+        # Как в JSONRenderer: JSON остается подмножеством JavaScript
+        return ret.replace('\u2028'.encode(), b'\\u2028').replace('\u2029'.encode(), b'\\u2029')
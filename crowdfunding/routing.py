@@ -0,0 +1,142 @@
+import logging
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DatabaseError, DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+logger = logging.getLogger(__name__)
+
+PINNED_KEY = 'replica:pinned:{user_id}'
+# Можно ли текущему запросу читать с реплики
+_replica_reads = ContextVar('replica_reads', default=False)
+# Последнее измерение отставания реплик процессом: {псевдоним: (время замера, отставание)}
+_lag_checks = {}
+
+
+def get_replicas():
+    """Псевдонимы реплик из DATABASES; пусто — все читается с основной БД"""
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def get_sticky_seconds():
+    """Сколько секунд после записи пользователь читает с основной БД"""
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def get_max_lag():
+    """Отставание реплики (сек.), после которого чтение уходит на основную БД"""
+    return getattr(settings, 'REPLICA_MAX_LAG', 5)
+
+
+def get_lag_check_interval():
+    """Как часто (сек.) процесс перемеряет отставание реплики"""
+    return getattr(settings, 'REPLICA_LAG_CHECK_INTERVAL', 5)
+
+
+def measure_lag(alias):
+    """Отставание реплики в секундах (0 — догнала основную БД)"""
+    connection = connections[alias]
+    if connection.vendor != 'postgresql':
+        # Локальные копии (SQLite в тестах) не отстают
+        return 0.0
+    with connection.cursor() as cursor:
+        # Без новых записей время последнего применения стареет, хотя реплика догнала основную БД
+        cursor.execute(
+            'SELECT CASE WHEN NOT pg_is_in_recovery() '
+            'OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 '
+            'ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END'
+        )
+        return float(cursor.fetchone()[0])
+
+
+def replica_lag(alias):
+    """Отставание реплики с кэшем замера на процесс; недоступная реплика — бесконечное"""
+    checked_at, lag = _lag_checks.get(alias, (None, None))
+    now = time.monotonic()
+    if checked_at is None or now - checked_at >= get_lag_check_interval():
+        try:
+            lag = measure_lag(alias)
+        except DatabaseError as exc:
+            logger.warning('Реплика %s недоступна: %s', alias, exc)
+            lag = float('inf')
+        _lag_checks[alias] = (now, lag)
+    return lag
+
+
+def healthy_replicas():
+    return [alias for alias in get_replicas() if replica_lag(alias) <= get_max_lag()]
+
+
+def pin_to_primary(user):
+    """После записи пользователь какое-то время читает с основной БД (видит свои изменения)"""
+    if user.is_authenticated:
+        cache.set(PINNED_KEY.format(user_id=user.id), True, timeout=get_sticky_seconds())
+
+
+def is_pinned(user):
+    return user.is_authenticated and bool(cache.get(PINNED_KEY.format(user_id=user.id)))
+
+
+def reading_from_replica():
+    return _replica_reads.get()
+
+
+@contextmanager
+def use_primary():
+    """Чтение с основной БД внутри блока (например, для данных, которые попадут в кэш)"""
+    token = _replica_reads.set(False)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+def changed_recently(timestamps):
+    """Изменялись ли данные за время, на которое реплика может отставать (None — давно)"""
+    threshold = time.time() - get_max_lag()
+    return any(timestamp is not None and timestamp >= threshold for timestamp in timestamps)
+
+
+class ReplicaRouter:
+    """Чтение с реплик для безопасных запросов ReplicaReadMixin; запись — в основную БД"""
+
+    def db_for_read(self, model, **hints):
+        if not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            # В транзакции читаем то, что в ней записано
+            return None
+        replicas = healthy_replicas()
+        return random.choice(replicas) if replicas else None
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики содержат те же данные, что и основная БД
+        return True
+
+
+class ReplicaReadMixin:
+    """Безопасные запросы представления читают с реплик, запись закрепляет пользователя за основной БД"""
+
+    def dispatch(self, request, *args, **kwargs):
+        token = _replica_reads.set(False)
+        try:
+            return super().dispatch(request, *args, **kwargs)
+        finally:
+            _replica_reads.reset(token)
+
+    def initial(self, request, *args, **kwargs):
+        # Пользователь известен только после аутентификации
+        super().initial(request, *args, **kwargs)
+        if request.method in SAFE_METHODS and get_replicas() and not is_pinned(request.user):
+            _replica_reads.set(True)
+
+    def finalize_response(self, request, response, *args, **kwargs):
+        if request.method not in SAFE_METHODS and response.status_code < 400:
+            pin_to_primary(request.user)
+        return super().finalize_response(request, response, *args, **kwargs)
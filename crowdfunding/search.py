@@ -0,0 +1,200 @@
+import hashlib
+import re
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import BooleanField, F, Q
+from django.db.models.expressions import RawSQL
+from rest_framework import serializers
+
+from . import lifecycle
+from .lifecycle import CollectLifecycle
+from .models import Collect
+
+FTS_TABLE = 'crowdfunding_collect_fts'
+FTS_VOCAB_TABLE = 'crowdfunding_collect_fts_vocab'
+TERM_FREQUENCY_KEY = 'search:frequency:{digest}'
+PG_INDEX = 'crowdfunding_collect_search_idx'
+# Сколько слов запроса учитывается
+MAX_TERMS = 10
+
+
+def get_search_config():
+    """Конфигурация полнотекстового поиска Postgres (язык словаря)"""
+    return getattr(settings, 'COLLECT_SEARCH_CONFIG', 'russian')
+
+
+def get_lookup_max_matches():
+    """До скольких совпадений SQLite выбирает сборы по id из FTS5, а не просмотром по дате"""
+    return getattr(settings, 'COLLECT_SEARCH_LOOKUP_MAX_MATCHES', 10000)
+
+
+def _pg_document():
+    # Одно и то же выражение в индексе и в запросе — иначе планировщик не возьмет индекс
+    return (
+        f"to_tsvector('{get_search_config()}'::regconfig, "
+        f"coalesce(\"name\", '') || ' ' || coalesce(\"description\", ''))"
+    )
+
+
+def parse_terms(query):
+    """Слова запроса без символов синтаксиса FTS"""
+    return re.findall(r'\w+', query.lower())[:MAX_TERMS]
+
+
+def install(using=connection):
+    """Создает поисковый индекс для текущей БД (идемпотентно).
+
+    Postgres — GIN по выражению to_tsvector(name || description),
+    SQLite — внешняя FTS5-таблица с триггерами синхронизации.
+    """
+    table = Collect._meta.db_table
+    with using.cursor() as cursor:
+        if using.vendor == 'postgresql':
+            cursor.execute(f'CREATE INDEX IF NOT EXISTS {PG_INDEX} ON {table} USING gin ({_pg_document()})')
+        elif using.vendor == 'sqlite':
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5("
+                f"name, description, content='{table}', content_rowid='id', tokenize='unicode61')"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ai AFTER INSERT ON {table} BEGIN '
+                f'INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END'
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_ad AFTER DELETE ON {table} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+                f"VALUES ('delete', old.id, old.name, old.description); END"
+            )
+            cursor.execute(
+                f'CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_au AFTER UPDATE OF name, description ON {table} BEGIN '
+                f"INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, name, description) "
+                f"VALUES ('delete', old.id, old.name, old.description); "
+                f'INSERT INTO {FTS_TABLE}(rowid, name, description) VALUES (new.id, new.name, new.description); END'
+            )
+            cursor.execute(f"CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_VOCAB_TABLE} USING fts5vocab({FTS_TABLE}, 'row')")
+
+
+def rebuild(using=connection):
+    """Перестраивает индекс по текущим данным (нужно только для FTS5)"""
+    install(using)
+    if using.vendor == 'sqlite':
+        with using.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {FTS_TABLE}({FTS_TABLE}) VALUES ('rebuild')")
+
+
+def search(queryset, query):
+    """Оставляет сборы, в названии или описании которых есть все слова запроса (по префиксу)"""
+    terms = parse_terms(query)
+    if not terms:
+        return queryset
+
+    vendor = connection.vendor
+    if vendor == 'postgresql':
+        tsquery = ' & '.join(f'{term}:*' for term in terms)
+        return queryset.filter(RawSQL(
+            f"{_pg_document()} @@ to_tsquery('{get_search_config()}'::regconfig, %s)",
+            [tsquery],
+            output_field=BooleanField(),
+        ))
+    if vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        # Редкие слова — выборка по id из FTS5; частые — просмотр по индексу даты
+        # с проверкой по списку совпадений («+» запрещает поиск по первичному ключу),
+        # иначе сотни тысяч совпадений читаются и сортируются ради одной страницы
+        column = f'"{Collect._meta.db_table}"."id"'
+        if estimate_matches(terms) > get_lookup_max_matches():
+            column = f'+{column}'
+        return queryset.filter(RawSQL(
+            f'{column} IN (SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s)',
+            [match],
+            output_field=BooleanField(),
+        ))
+
+    # Прочие БД — без индекса
+    for term in terms:
+        queryset = queryset.filter(Q(name__icontains=term) | Q(description__icontains=term))
+    return queryset
+
+
+def estimate_matches(terms):
+    """Оценка числа совпадений в FTS5: наименьшая частота слова запроса (кэшируется)"""
+    frequencies = []
+    for term in terms:
+        key = TERM_FREQUENCY_KEY.format(digest=hashlib.md5(term.encode()).hexdigest())
+        frequency = cache.get(key)
+        if frequency is None:
+            with connection.cursor() as cursor:
+                # Все слова словаря с этим префиксом
+                cursor.execute(
+                    f'SELECT coalesce(sum(doc), 0) FROM {FTS_VOCAB_TABLE} WHERE term >= %s AND term < %s',
+                    [term, term + chr(0x10FFFF)],
+                )
+                frequency = cursor.fetchone()[0]
+            cache.set(key, frequency, timeout=600)
+        frequencies.append(frequency)
+    return min(frequencies)
+
+
+def _decimal_param(params, name):
+    value = params.get(name)
+    if value in (None, ''):
+        return None
+    try:
+        number = Decimal(value)
+    except InvalidOperation:
+        number = None
+    if number is None or not number.is_finite():
+        raise serializers.ValidationError({name: 'Ожидается число'})
+    return number
+
+
+# Параметры фильтров списка сборов
+FILTER_PARAMS = ('q', 'occasion', 'status', 'target_min', 'target_max', 'progress_min', 'progress_max')
+
+
+def is_filtered(params):
+    return any(params.get(name) not in (None, '') for name in FILTER_PARAMS)
+
+
+def filter_collects(queryset, params):
+    """Применяет ?q=, ?occasion=, ?status=, ?target_min/max= и ?progress_min/max= (в процентах)"""
+    if params.get('q'):
+        queryset = search(queryset, params['q'])
+
+    if params.get('occasion'):
+        occasions = params['occasion'].split(',')
+        known = {value for value, _ in Collect.OCCASION_CHOICES}
+        if set(occasions) - known:
+            raise serializers.ValidationError({'occasion': f'Допустимые значения: {", ".join(sorted(known))}'})
+        queryset = queryset.filter(occasion__in=occasions)
+
+    collect_status = params.get('status')
+    if collect_status:
+        known = [value for value, _ in CollectLifecycle.STATUS_CHOICES]
+        if collect_status not in known:
+            raise serializers.ValidationError({'status': f'Допустимые значения: {", ".join(known)}'})
+        queryset = lifecycle.filter_status(queryset, collect_status)
+
+    target_min = _decimal_param(params, 'target_min')
+    if target_min is not None:
+        queryset = queryset.filter(target_amount__gte=target_min)
+    target_max = _decimal_param(params, 'target_max')
+    if target_max is not None:
+        queryset = queryset.filter(target_amount__lte=target_max)
+
+    # Прогресс есть только у сборов с целевой суммой; считается по current_amount
+    # (при шардированных счетчиках — с задержкой до свертки)
+    progress_min = _decimal_param(params, 'progress_min')
+    if progress_min is not None:
+        queryset = queryset.filter(
+            target_amount__isnull=False, current_amount__gte=F('target_amount') * (progress_min / 100)
+        )
+    progress_max = _decimal_param(params, 'progress_max')
+    if progress_max is not None:
+        queryset = queryset.filter(
+            target_amount__isnull=False, current_amount__lte=F('target_amount') * (progress_max / 100)
+        )
+    return queryset
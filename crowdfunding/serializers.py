@@ -1,8 +1,57 @@
+import copy
+import re
+
 from rest_framework import serializers
 from django.utils import timezone
 from .models import Collect, Payment
+from .lifecycle import CollectLifecycle, effective_status
+from .stats import CollectStats, with_pending
 from django.contrib.auth.models import User
 from .validators import validate_future_date, validate_payment_amount, validate_collect_active
+from .counters import get_current_amount
+from . import instrumentation
+
+
+EXPAND_PATTERN = re.compile(r'(\w+)(?:\(([^)]*)\))?')
+
+
+def parse_fields(value):
+    """Разбирает параметр ?fields=id,name в список имен полей"""
+    if not value:
+        return None
+    return [name.strip() for name in value.split(',') if name.strip()]
+
+
+def parse_expand(value):
+    """Разбирает параметр ?expand=payments(limit=5) в словарь {поле: параметры}"""
+    expand = {}
+    for name, params in EXPAND_PATTERN.findall(value or ''):
+        options = {}
+        for param in filter(None, (item.strip() for item in params.split(','))):
+            key, _, option = param.partition('=')
+            options[key.strip()] = option.strip()
+        expand[name] = options
+    return expand
+
+
+class DynamicFieldsMixin:
+    """Оставляет в сериализаторе только переданные в fields поля"""
+
+    def __init__(self, *args, **kwargs):
+        fields = kwargs.pop('fields', None)
+        super().__init__(*args, **kwargs)
+
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class TimedSerializerMixin:
+    """Учитывает время сериализации в метриках запроса"""
+
+    def to_representation(self, instance):
+        with instrumentation.span('serializer'):
+            return super().to_representation(instance)
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -11,7 +60,7 @@ class UserSerializer(serializers.ModelSerializer):
         fields = ['id', 'username', 'email']
 
 
-class PaymentSerializer(serializers.ModelSerializer):
+class PaymentSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     donator = UserSerializer(read_only=True)
 
     class Meta:
@@ -20,21 +69,58 @@ class PaymentSerializer(serializers.ModelSerializer):
         read_only_fields = ['date_added']
 
 
-class CollectSerializer(serializers.ModelSerializer):
+class CollectStatsSerializer(serializers.ModelSerializer):
+    avg_amount = serializers.DecimalField(max_digits=12, decimal_places=2, read_only=True)
+
+    class Meta:
+        model = CollectStats
+        fields = ['donors_count', 'payments_count', 'total_amount', 'max_amount', 'avg_amount', 'last_payment_at']
+
+
+class CollectSerializer(TimedSerializerMixin, DynamicFieldsMixin, serializers.ModelSerializer):
     author = UserSerializer(read_only=True)
     payments = PaymentSerializer(many=True, read_only=True)
     is_active = serializers.ReadOnlyField()
-    donors_count = serializers.ReadOnlyField()
+    # Хранимый статус (active, goal_reached, ended); истекший сбор завершен и до обхода
+    status = serializers.SerializerMethodField()
+    # Берется из таблицы статистики (с не перенесенными изменениями), а не считается агрегатом по платежам
+    donors_count = serializers.SerializerMethodField()
+    stats = serializers.SerializerMethodField()
 
     class Meta:
         model = Collect
         fields = [
             'id', 'author', 'name', 'occasion', 'description',
             'target_amount', 'current_amount', 'end_datetime',
-            'created_at', 'updated_at', 'is_active', 'donors_count', 'payments'
+            'created_at', 'updated_at', 'is_active', 'status', 'donors_count', 'stats', 'payments'
         ]
         read_only_fields = ['current_amount', 'created_at', 'updated_at']
 
+    def get_status(self, obj):
+        try:
+            lifecycle = obj.lifecycle
+        except CollectLifecycle.DoesNotExist:
+            return None
+        return effective_status(lifecycle.status, lifecycle.end_datetime)
+
+    def get_donors_count(self, obj):
+        stats = self._get_stats(obj)
+        return None if stats is None else stats.donors_count
+
+    def get_stats(self, obj):
+        stats = self._get_stats(obj)
+        return None if stats is None else CollectStatsSerializer(stats).data
+
+    def _get_stats(self, obj):
+        """Статистика сбора с не перенесенными изменениями, как в get_stats; None — строки нет"""
+        if not hasattr(obj, '_pending_stats'):
+            try:
+                # Копия: загруженная строка статистики остается как в БД
+                obj._pending_stats = with_pending(copy.copy(obj.stats))
+            except CollectStats.DoesNotExist:
+                obj._pending_stats = None
+        return obj._pending_stats
+
 
 class CollectCreateSerializer(serializers.ModelSerializer):
     class Meta:
@@ -75,11 +161,25 @@ class PaymentCreateSerializer(serializers.ModelSerializer):
             if not collect.is_active:
                 raise serializers.ValidationError({"collect": "Нельзя внести платеж в завершенный сбор"})
 
-            # Проверяем что не превышаем целевую сумму
-            if collect.target_amount and collect.current_amount + amount > collect.target_amount:
-                remaining = collect.target_amount - collect.current_amount
+            # Проверяем что не превышаем целевую сумму (с учетом шардов счетчика)
+            current_amount = get_current_amount(collect)
+            if collect.target_amount and current_amount + amount > collect.target_amount:
+                remaining = collect.target_amount - current_amount
                 raise serializers.ValidationError({
                     "amount": f"Платеж превышает целевую сумму. Осталось собрать: {remaining}"
                 })
 
-        return data
\ No newline at end of file
+        return data
+
+
+class PaymentBulkItemSerializer(serializers.Serializer):
+    """Элемент пачки платежей; сбор и целевая сумма проверяются при записи пачки"""
+    collect = serializers.IntegerField()
+    amount = serializers.DecimalField(max_digits=12, decimal_places=2)
+    comment = serializers.CharField(required=False, allow_blank=True, default='')
+
+    def validate_amount(self, value):
+        """Валидация суммы платежа"""
+        if value <= 0:
+            raise serializers.ValidationError("Сумма платежа должна быть положительной")
+        return value
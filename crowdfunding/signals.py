@@ -1,24 +1,32 @@
-from django.db.models.signals import post_save, post_delete
+from contextlib import contextmanager
+
+from django.db.models.signals import post_save, post_delete, post_migrate
 from django.dispatch import receiver
 from django.db import transaction
-from django.core.cache import cache
 from .models import Collect, Payment
-from .tasks import send_collect_created_email, send_payment_created_email, send_collect_goal_reached_email
-
-
-def clear_collect_cache():
-    """Очищает кэш для всех сборов"""
-    cache.clear()
+from .cache import invalidate_collect
+from .counters import add_amount, get_current_amount
+from . import analytics, dashboard, digests, leaderboards, lifecycle, live, milestones, outbox, pagination, search, stats
+from .tasks import send_collect_created_email, send_payment_created_email
 
 
 @receiver(post_save, sender=Collect)
 def on_collect_save(sender, instance, created, **kwargs):
     """Обработчик сохранения сбора"""
     if created:
-        # Отправляем email о создании сбора
-        send_collect_created_email.delay(instance.id)
+        stats.CollectStats.objects.get_or_create(collect=instance)
 
-    clear_collect_cache()
+        # Письмо о создании сбора уйдет в Celery только после коммита
+        outbox.enqueue(send_collect_created_email, instance.id, dedup_key=f'collect-created:{instance.id}')
+
+    # Статус и пороги зависят от даты завершения и целевой суммы — пересчитываем при каждом сохранении
+    current_amount = get_current_amount(instance)
+    lifecycle.sync(instance, current_amount)
+    if not created and instance.target_amount:
+        milestones.reconcile(instance, current_amount)
+
+    # Новый сбор меняет состав списка, изменение — только его версию
+    invalidate_collect(instance.id, list_changed=created)
 
 
 @receiver(post_save, sender=Payment)
@@ -26,32 +34,85 @@ def on_payment_save(sender, instance, created, **kwargs):
     """Обработчик сохранения платежа"""
     if created:
         with transaction.atomic():
-            # Обновляем сумму сбора
+            # Атомарно обновляем сумму сбора (в шард счетчика, если он включен)
+            add_amount(instance.collect_id, instance.amount)
+            stats.on_payment_created(instance)
+            analytics.on_payment_created(instance)
             collect = instance.collect
-            collect.current_amount += instance.amount
-            collect.save()
+            collect.refresh_from_db(fields=['current_amount', 'updated_at'])
+            current_amount = get_current_amount(collect)
+            lifecycle.on_amount_changed(collect, current_amount)
+
+            # Уведомления пишутся в outbox этой же транзакцией и публикуются после коммита
+            outbox.enqueue(send_payment_created_email, instance.id, dedup_key=f'payment-created:{instance.id}')
 
-            # Отправляем emails о платеже
-            send_payment_created_email.delay(instance.id)
+            # Уведомления автору копятся в дайджест: задача раз в окно, а не на каждый платеж
+            if digests.is_enabled() and instance.donator_id != collect.author_id:
+                digests.register_payment(instance)
 
-            # Проверяем достижение цели
-            if collect.target_amount and collect.current_amount >= collect.target_amount:
-                send_collect_goal_reached_email.delay(collect.id)
+            # Уведомление — только при пересечении порога, а не на каждый платеж после цели
+            milestones.on_amount_changed(collect, current_amount - instance.amount, current_amount)
 
-    clear_collect_cache()
+            # Одно событие после коммита — его получат все открытые потоки сбора
+            live.on_payments_created(collect, [instance], current_amount)
+
+            # Рейтинги не транзакционны — обновляем только после коммита
+            transaction.on_commit(lambda: leaderboards.on_payment_created(instance))
+
+    invalidate_collect(instance.collect_id)
 
 
 @receiver(post_delete, sender=Payment)
 def on_payment_delete(sender, instance, **kwargs):
     """Обработчик удаления платежа"""
     with transaction.atomic():
-        collect = instance.collect
-        collect.current_amount -= instance.amount
-        collect.save()
-        clear_collect_cache()
+        add_amount(instance.collect_id, -instance.amount)
+        stats.on_payment_deleted(instance)
+        try:
+            analytics.on_payment_deleted(instance, instance.collect.occasion)
+            if instance.collect.target_amount:
+                instance.collect.refresh_from_db(fields=['current_amount'])
+                current_amount = get_current_amount(instance.collect)
+                lifecycle.on_amount_changed(instance.collect, current_amount)
+                # Сумма ниже порога — порог снова сработает при следующем пересечении
+                milestones.on_amount_changed(instance.collect, current_amount + instance.amount, current_amount)
+            live.on_payment_deleted(instance.collect)
+        except Collect.DoesNotExist:
+            # Сбор удален — его интервалы удалены каскадно, а по поводу уже не вычесть
+            pass
+        invalidate_collect(instance.collect_id)
+        transaction.on_commit(lambda: leaderboards.on_payment_deleted(instance))
 
 
 @receiver(post_delete, sender=Collect)
 def on_collect_delete(sender, instance, **kwargs):
     """Обработчик удаления сбора"""
-    clear_collect_cache()
\ No newline at end of file
+    invalidate_collect(instance.id, list_changed=True)
+
+
+@contextmanager
+def disconnected():
+    """Временно отключает обработчики сигналов (массовое наполнение базы)"""
+    handlers = [
+        (post_save, on_collect_save, Collect),
+        (post_save, on_payment_save, Payment),
+        (post_delete, on_payment_delete, Payment),
+        (post_delete, on_collect_delete, Collect),
+    ]
+    for signal, handler, sender in handlers:
+        signal.disconnect(handler, sender=sender)
+    try:
+        yield
+    finally:
+        for signal, handler, sender in handlers:
+            signal.connect(handler, sender=sender)
+
+
+@receiver(post_migrate)
+def on_post_migrate(sender, using, **kwargs):
+    """Создает поисковый индекс сборов, индексы пагинации и дашборда после миграций"""
+    if sender.label == 'crowdfunding':
+        from django.db import connections
+        search.install(connections[using])
+        pagination.install(connections[using])
+        dashboard.install(connections[using])
@@ -0,0 +1,247 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import IntegrityError, models, transaction
+from django.db.models import Count, F, Max, Sum, Value
+from django.db.models.functions import Coalesce, Greatest
+
+from .cache import invalidate_collect
+from .models import Collect, Payment
+
+
+class CollectStats(models.Model):
+    """Денормализованная статистика сбора, обновляемая инкрементально"""
+    collect = models.OneToOneField(Collect, on_delete=models.CASCADE, primary_key=True, related_name='stats')
+    donors_count = models.PositiveIntegerField(default=0)
+    payments_count = models.PositiveIntegerField(default=0)
+    total_amount = models.DecimalField(max_digits=12, decimal_places=2, default=0)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True, blank=True)
+    last_payment_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f'Статистика сбора {self.collect_id}'
+
+    @property
+    def avg_amount(self):
+        if not self.payments_count:
+            return None
+        return (self.total_amount / self.payments_count).quantize(Decimal('0.01'))
+
+
+class CollectDonor(models.Model):
+    """Донатор сбора — по вставке, если его еще нет, видно, новый ли донатор"""
+    collect = models.ForeignKey(Collect, on_delete=models.CASCADE, related_name='donors')
+    donator = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='+')
+
+    class Meta:
+        unique_together = ['collect', 'donator']
+
+
+class CollectStatsDelta(models.Model):
+    """Изменение статистики сбора от платежей, еще не перенесенное в CollectStats.
+
+    Платеж только добавляет строку: обновление общей строки статистики в
+    транзакции каждого платежа сериализовало бы платежи горячего сбора на ее
+    блокировке. Изменения переносит в статистику fold().
+    Сбор без внешнего ключа — строка может пережить удаленный сбор.
+    """
+    collect_id = models.IntegerField(db_index=True)
+    donors_count = models.IntegerField(default=0)
+    payments_count = models.IntegerField()
+    total_amount = models.DecimalField(max_digits=14, decimal_places=2)
+    max_amount = models.DecimalField(max_digits=12, decimal_places=2, null=True)
+    last_payment_at = models.DateTimeField(null=True)
+    # Удален платеж — максимум и дату последнего платежа нужно пересчитать
+    recompute = models.BooleanField(default=False)
+
+
+def rebuild_stats(collect_id):
+    """Пересчитывает статистику и донаторов сбора по таблице платежей"""
+    payments = Payment.objects.filter(collect_id=collect_id)
+    with transaction.atomic():
+        # Платежи — источник истины: не перенесенные изменения в них уже учтены
+        CollectStatsDelta.objects.filter(collect_id=collect_id).delete()
+        CollectDonor.objects.filter(collect_id=collect_id).delete()
+        CollectDonor.objects.bulk_create(
+            (
+                CollectDonor(collect_id=collect_id, donator_id=donator_id)
+                for donator_id in payments.exclude(donator=None).values_list('donator_id', flat=True).distinct()
+            ),
+            batch_size=10000,
+        )
+        aggregates = payments.aggregate(
+            donors_count=Count('donator', distinct=True),
+            payments_count=Count('id'),
+            total_amount=Coalesce(Sum('amount'), Decimal('0')),
+            max_amount=Max('amount'),
+            last_payment_at=Max('date_added'),
+        )
+        stats, _ = CollectStats.objects.update_or_create(collect_id=collect_id, defaults=aggregates)
+    return stats
+
+
+def pending_changes(collect_ids):
+    """Не перенесенные изменения статистики сборов одним запросом: {id сбора: изменения}"""
+    rows = (
+        CollectStatsDelta.objects.filter(collect_id__in=collect_ids)
+        .values('collect_id')
+        .annotate(
+            donors_count=Sum('donors_count'),
+            payments_count=Sum('payments_count'),
+            total_amount=Sum('total_amount'),
+            max_amount=Max('max_amount'),
+            last_payment_at=Max('last_payment_at'),
+        )
+        .order_by()
+    )
+    return {row.pop('collect_id'): row for row in rows}
+
+
+def merge_pending(values, changes):
+    """Значения статистики ({поле: значение}, любые из полей) с не перенесенными изменениями"""
+    merged = dict(values)
+    for field in ('donors_count', 'payments_count', 'total_amount'):
+        if field in values:
+            merged[field] = values[field] + changes[field]
+    for field in ('max_amount', 'last_payment_at'):
+        if field in values:
+            merged[field] = max((value for value in (values[field], changes[field]) if value is not None), default=None)
+    return merged
+
+
+def with_pending(stats):
+    """Дополняет объект статистики не перенесенными изменениями (и возвращает его)"""
+    changes = pending_changes([stats.collect_id]).get(stats.collect_id)
+    if changes:
+        values = {field: getattr(stats, field) for field in changes}
+        for field, value in merge_pending(values, changes).items():
+            setattr(stats, field, value)
+    return stats
+
+
+def get_stats(collect_id):
+    """Статистика сбора с учетом не перенесенных изменений; при отсутствии — пересчитывает"""
+    try:
+        stats = CollectStats.objects.get(collect_id=collect_id)
+    except CollectStats.DoesNotExist:
+        return rebuild_stats(collect_id)
+    return with_pending(stats)
+
+
+def _add_donor(collect_id, donator_id):
+    """Добавляет донатора сбора, если его еще нет; True — донатор новый.
+
+    Одновременные первые платежи одного донатора конфликтуют на уникальной
+    строке донатора, а не на строке статистики — считается только один.
+    """
+    while True:
+        try:
+            with transaction.atomic():
+                CollectDonor.objects.create(collect_id=collect_id, donator_id=donator_id)
+            return True
+        except IntegrityError:
+            # Блокировка строки донатора не дает удалению платежа убрать его до нашего коммита
+            if CollectDonor.objects.select_for_update().filter(
+                collect_id=collect_id, donator_id=donator_id
+            ).exists():
+                return False
+
+
+def _remove_donor(collect_id, donator_id):
+    """Убирает донатора сбора, если у него не осталось платежей; True — донатор ушел"""
+    donor = CollectDonor.objects.select_for_update().filter(collect_id=collect_id, donator_id=donator_id)
+    if not donor.exists():
+        return False
+    if Payment.objects.filter(collect_id=collect_id, donator_id=donator_id).exists():
+        return False
+    donor.delete()
+    return True
+
+
+def on_payment_created(payment):
+    """Учитывает новый платеж в статистике сбора"""
+    on_payments_created(payment.collect_id, [payment])
+
+
+def on_payments_created(collect_id, payments):
+    """Учитывает пачку новых платежей одного сбора одной строкой изменений"""
+    donators = {payment.donator_id for payment in payments if payment.donator_id is not None}
+    CollectStatsDelta.objects.create(
+        collect_id=collect_id,
+        donors_count=sum(_add_donor(collect_id, donator_id) for donator_id in sorted(donators)),
+        payments_count=len(payments),
+        total_amount=sum(payment.amount for payment in payments),
+        max_amount=max(payment.amount for payment in payments),
+        last_payment_at=max(payment.date_added for payment in payments),
+    )
+
+
+def on_payment_deleted(payment):
+    """Исключает удаленный платеж из статистики сбора"""
+    donor_left = payment.donator_id is not None and _remove_donor(payment.collect_id, payment.donator_id)
+    CollectStatsDelta.objects.create(
+        collect_id=payment.collect_id,
+        donors_count=-int(donor_left),
+        payments_count=-1,
+        total_amount=-payment.amount,
+        recompute=True,
+    )
+
+
+def fold(batch_size=10000):
+    """Переносит накопленные изменения в статистику сборов; возвращает число перенесенных строк"""
+    folded = 0
+    while True:
+        with transaction.atomic():
+            # Параллельный перенос ждет блокировки и не перенесет строки второй раз
+            deltas = list(CollectStatsDelta.objects.select_for_update().order_by('id')[:batch_size])
+            if not deltas:
+                return folded
+
+            groups = {}
+            for delta in deltas:
+                group = groups.setdefault(delta.collect_id, {
+                    'donors_count': 0, 'payments_count': 0, 'total_amount': Decimal('0'),
+                    'max_amount': None, 'last_payment_at': None, 'recompute': False,
+                })
+                group['donors_count'] += delta.donors_count
+                group['payments_count'] += delta.payments_count
+                group['total_amount'] += delta.total_amount
+                for field in ('max_amount', 'last_payment_at'):
+                    values = [value for value in (group[field], getattr(delta, field)) if value is not None]
+                    group[field] = max(values, default=None)
+                group['recompute'] |= delta.recompute
+
+            existing = set(
+                CollectStats.objects.filter(collect_id__in=groups).values_list('collect_id', flat=True)
+            )
+            # Строки нет у сборов, созданных до появления статистики, — пересчет учтет все платежи;
+            # статистика удаленных сборов удалена каскадно, их изменения не нужны
+            for collect_id in Collect.objects.filter(id__in=set(groups) - existing).values_list('id', flat=True):
+                rebuild_stats(collect_id)
+
+            for collect_id, group in sorted(groups.items()):
+                if collect_id not in existing:
+                    continue
+                changes = {
+                    'donors_count': F('donors_count') + group['donors_count'],
+                    'payments_count': F('payments_count') + group['payments_count'],
+                    'total_amount': F('total_amount') + group['total_amount'],
+                }
+                if group['recompute']:
+                    # Удален платеж, возможно экстремум — максимум и дату дешевле пересчитать
+                    changes.update(Payment.objects.filter(collect_id=collect_id).aggregate(
+                        max_amount=Max('amount'), last_payment_at=Max('date_added'),
+                    ))
+                else:
+                    for field in ('max_amount', 'last_payment_at'):
+                        value = Value(group[field])
+                        changes[field] = Greatest(Coalesce(F(field), value), value)
+                CollectStats.objects.filter(collect_id=collect_id).update(**changes)
+            CollectStatsDelta.objects.filter(id__in=[delta.id for delta in deltas]).delete()
+            # Ответы и ETag, закэшированные до переноса, устарели у всех затронутых сборов
+            for collect_id in groups:
+                invalidate_collect(collect_id)
+            folded += len(deltas)
+        if len(deltas) < batch_size:
+            return folded
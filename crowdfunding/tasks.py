@@ -1,8 +1,11 @@
 from celery import shared_task
-from django.core.mail import send_mail
 from django.conf import settings
 from django.template.loader import render_to_string
 from .models import Collect, Payment
+from .counters import get_current_amount, rollup_all
+from .stats import fold as fold_stats, get_stats
+from .mail import queue_mail
+from . import analytics, digests, lifecycle, outbox
 
 
 @shared_task
@@ -29,12 +32,11 @@ def send_collect_created_email(collect_id):
         Команда Crowdfunding
         '''
 
-        send_mail(
+        queue_mail(
             subject=subject,
             message=message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[collect.author.email],
-            fail_silently=False,
         )
 
         return f'Email отправлен автору сбора {collect.name}'
@@ -44,10 +46,14 @@ def send_collect_created_email(collect_id):
 
 @shared_task
 def send_payment_created_email(payment_id):
-    """Отправляет email донатору и автору сбора при создании платежа"""
+    """Отправляет email донатору и автору сбора при создании платежа.
+
+    При включенных дайджестах автор получает сводку send_author_digest.
+    """
     try:
         payment = Payment.objects.select_related('collect', 'donator', 'collect__author').get(id=payment_id)
         collect = payment.collect
+        collect.current_amount = get_current_amount(collect)
 
         # Email донатору
         donor_subject = f'💝 Спасибо за ваше пожертвование!'
@@ -67,16 +73,15 @@ def send_payment_created_email(payment_id):
         Команда Crowdfunding
         '''
 
-        send_mail(
+        queue_mail(
             subject=donor_subject,
             message=donor_message,
             from_email=settings.DEFAULT_FROM_EMAIL,
             recipient_list=[payment.donator.email],
-            fail_silently=False,
         )
 
-        # Email автору сбора (если донатор не автор)
-        if payment.donator != collect.author:
+        # Email автору сбора (если донатор не автор и дайджесты выключены)
+        if payment.donator != collect.author and not digests.is_enabled():
             author_subject = f'🎊 Новое пожертвование в вашем сборе!'
             author_message = f'''
             Здравствуйте, {collect.author.username}!
@@ -96,12 +101,11 @@ def send_payment_created_email(payment_id):
             Команда Crowdfunding
             '''
 
-            send_mail(
+            queue_mail(
                 subject=author_subject,
                 message=author_message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[collect.author.email],
-                fail_silently=False,
             )
 
         return f'Emails отправлены для платежа {payment.id}'
@@ -109,11 +113,66 @@ def send_payment_created_email(payment_id):
         return 'Платеж не найден'
 
 
+@shared_task
+def send_payments_created_emails(payment_ids):
+    """Отправляет письма по пачке платежей одной задачей"""
+    for payment_id in payment_ids:
+        send_payment_created_email(payment_id)
+    return f'Emails отправлены для платежей: {len(payment_ids)}'
+
+
+@shared_task
+def send_author_digest(collect_id):
+    """Отправляет автору сводку пожертвований, накопленных за окно"""
+    try:
+        collect = Collect.objects.select_related('author').get(id=collect_id)
+        digest = digests.take_digest(collect)
+        if digest is None:
+            return f'Новых пожертвований в сборе {collect.name} нет'
+
+        current_amount = get_current_amount(collect)
+        top_donors = '\n'.join(
+            f'            - {donor["donator__username"]}: {donor["total"]} руб. ({donor["count"]} шт.)'
+            for donor in digest['top_donors']
+        )
+
+        subject = f'🎊 Новые пожертвования в вашем сборе: {digest["count"]}'
+        message = f'''
+            Здравствуйте, {collect.author.username}!
+
+            В ваш сбор "{collect.name}" поступили новые пожертвования!
+
+            Количество пожертвований: {digest["count"]}
+            Сумма пожертвований: {digest["total"]} руб.
+
+            Самые щедрые донаторы:
+{top_donors}
+
+            Текущая сумма сбора: {current_amount} руб.
+            {f"Прогресс: {(current_amount / collect.target_amount * 100):.1f}%" if collect.target_amount else ""}
+
+            Продолжайте в том же духе!
+            Команда Crowdfunding
+            '''
+
+        queue_mail(
+            subject=subject,
+            message=message,
+            from_email=settings.DEFAULT_FROM_EMAIL,
+            recipient_list=[collect.author.email],
+        )
+
+        return f'Дайджест отправлен для сбора {collect.name}'
+    except Collect.DoesNotExist:
+        return 'Сбор не найден'
+
+
 @shared_task
 def send_collect_goal_reached_email(collect_id):
     """Отправляет email при достижении целевой суммы"""
     try:
         collect = Collect.objects.get(id=collect_id)
+        collect.current_amount = get_current_amount(collect)
 
         if collect.target_amount and collect.current_amount >= collect.target_amount:
             subject = f'🎯 Поздравляем! Целевая сумма достигнута!'
@@ -124,7 +183,7 @@ def send_collect_goal_reached_email(collect_id):
             достиг целевой суммы {collect.target_amount} руб.!
 
             Текущая сумма: {collect.current_amount} руб.
-            Количество донаторов: {collect.donors_count}
+            Количество донаторов: {get_stats(collect.id).donors_count}
 
             Сбор продолжит принимать пожертвования до {collect.end_datetime.strftime("%d.%m.%Y")}.
 
@@ -132,14 +191,102 @@ def send_collect_goal_reached_email(collect_id):
             Команда Crowdfunding
             '''
 
-            send_mail(
+            queue_mail(
                 subject=subject,
                 message=message,
                 from_email=settings.DEFAULT_FROM_EMAIL,
                 recipient_list=[collect.author.email],
-                fail_silently=False,
             )
 
             return f'Email о достижении цели отправлен для сбора {collect.name}'
     except Collect.DoesNotExist:
-        return 'Сбор не найден'
\ No newline at end of file
+        return 'Сбор не найден'
+
+
+@shared_task
+def send_collect_milestone_email(collect_id, percent):
+    """Отправляет автору email о пройденном пороге сбора (процент от цели)"""
+    try:
+        collect = Collect.objects.select_related('author').get(id=collect_id)
+        collect.current_amount = get_current_amount(collect)
+
+        # Пока задача ждала, сумма могла опуститься ниже порога
+        if collect.target_amount and collect.current_amount * 100 >= collect.target_amount * percent:
+            subject = f'🚀 Ваш сбор прошел {percent}% цели!'
+            message = f'''
+            Здравствуйте, {collect.author.username}!
+
+            Ваш сбор "{collect.name}" собрал уже {percent}% целевой суммы.
+
+            Текущая сумма: {collect.current_amount} руб. из {collect.target_amount} руб.
+            Количество донаторов: {get_stats(collect.id).donors_count}
+
+            Сбор принимает пожертвования до {collect.end_datetime.strftime("%d.%m.%Y")}.
+
+            Продолжайте в том же духе!
+            Команда Crowdfunding
+            '''
+
+            queue_mail(
+                subject=subject,
+                message=message,
+                from_email=settings.DEFAULT_FROM_EMAIL,
+                recipient_list=[collect.author.email],
+            )
+
+            return f'Email о пороге {percent}% отправлен для сбора {collect.name}'
+    except Collect.DoesNotExist:
+        return 'Сбор не найден'
+
+
+@shared_task
+def drain_payment_intake():
+    """Записывает платежи из очереди асинхронного приема пачками"""
+    from .intake import drain
+    return f'Обработано платежей из очереди: {drain()}'
+
+
+@shared_task
+def rollup_collect_counters():
+    """Переносит суммы из шардов счетчиков в сборы (периодическая задача)"""
+    collects_count = rollup_all()
+    return f'Свернуты счетчики сборов: {collects_count}'
+
+
+@shared_task
+def fold_collect_stats():
+    """Переносит накопленные изменения в статистику сборов (периодическая задача)"""
+    folded = fold_stats()
+    return f'Перенесено изменений статистики: {folded}'
+
+
+@shared_task
+def compact_donation_rollups():
+    """Уплотняет интервалы аналитики пожертвований (периодическая задача)"""
+    recomputed = analytics.compact()
+    return f'Пересчитано интервалов аналитики: {recomputed}'
+
+
+@shared_task
+def sweep_expired_collects():
+    """Переводит истекшие сборы в статус «Завершен» (периодическая задача)"""
+    swept = lifecycle.sweep()
+    return f'Завершено сборов: {swept}'
+
+
+@shared_task(autoretry_for=(Exception,), max_retries=5, retry_backoff=True, retry_backoff_max=300)
+def dispatch_outbox_message(message_id):
+    """Выполняет уведомление из outbox (повторная доставка сообщения игнорируется).
+
+    При ошибке задача повторяется с нарастающей паузой; исчерпав повторы,
+    сообщение останется невыполненным и реле опубликует его снова.
+    """
+    return outbox.process(message_id)
+
+
+@shared_task
+def relay_outbox():
+    """Публикует отложенные и не опубликованные после коммита сообщения outbox (периодическая задача)"""
+    published = outbox.publish_pending()
+    purged = outbox.purge()
+    return f'Опубликовано сообщений outbox: {published}, удалено выполненных: {purged}'
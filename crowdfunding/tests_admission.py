@@ -0,0 +1,116 @@
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import admission
+from .models import Collect, Payment
+
+LIMITS = {
+    admission.USER: {'rate': 0.1, 'burst': 2, 'concurrency': 1},
+    admission.COLLECT: {'rate': 0.1, 'burst': 3, 'concurrency': 1},
+    admission.GLOBAL: {'concurrency': 2},
+}
+
+
+@override_settings(
+    PAYMENT_ADMISSION=True, PAYMENT_ADMISSION_BACKEND='memory', PAYMENT_ADMISSION_LIMITS=LIMITS,
+    LEADERBOARD_BACKEND='memory',
+)
+class AdmissionControlTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        admission.get_backend().clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.collect = self.create_collect()
+        self.url = reverse('payment-list')
+
+    def create_collect(self):
+        return Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def pay(self, user, collect):
+        self.client.force_authenticate(user=user)
+        return self.client.post(self.url, {'collect': collect.id, 'amount': '100.00'}, format='json')
+
+    def test_user_burst_is_throttled(self):
+        """Тест что после исчерпания корзины пользователь получает 429 с Retry-After"""
+        self.assertEqual(self.pay(self.donor, self.collect).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.pay(self.donor, self.create_collect()).status_code, status.HTTP_201_CREATED)
+
+        response = self.pay(self.donor, self.create_collect())
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '10')
+        self.assertEqual(Payment.objects.filter(donator=self.donor).count(), 2)
+
+        # Другой пользователь не затронут
+        self.assertEqual(self.pay(self.other, self.create_collect()).status_code, status.HTTP_201_CREATED)
+
+    def test_collect_bucket_limits_all_donors(self):
+        """Тест общего лимита сбора для разных пользователей"""
+        self.pay(self.donor, self.collect)
+        self.pay(self.other, self.collect)
+        self.pay(self.author, self.collect)
+
+        third = User.objects.create_user(username='third', password='testpass123')
+        self.assertEqual(self.pay(third, self.collect).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_concurrency_slots(self):
+        """Тест что занятые слоты отклоняют запрос, а освобожденные пропускают"""
+        with admission.admit(self.other.id, self.collect.id):
+            response = self.pay(self.donor, self.collect)
+            self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+            self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(self.pay(self.donor, self.collect).status_code, status.HTTP_201_CREATED)
+
+        # Глобальный лимит — 2 одновременно на всю платформу
+        with admission.admit(self.other.id, None), admission.admit(self.author.id, None):
+            response = self.pay(self.donor, self.create_collect())
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    def test_rejected_request_spends_nothing_and_is_counted(self):
+        """Тест что отклоненный запрос не списывает токены и попадает в статистику"""
+        self.pay(self.donor, self.collect)
+        self.pay(self.donor, self.create_collect())
+        self.pay(self.donor, self.collect)
+
+        stats = admission.get_stats()
+        self.assertEqual(stats['admitted'], 2)
+        self.assertEqual(stats['throttled'], {admission.USER: 1, admission.COLLECT: 0, admission.GLOBAL: 0})
+
+        # Сбор потратил один токен из трех: отказ пользователю токен сбора не списал
+        self.assertEqual(self.pay(self.other, self.collect).status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.pay(self.author, self.collect).status_code, status.HTTP_201_CREATED)
+
+    def test_bulk_spends_token_per_payment(self):
+        """Тест что пачка проходит через ограничитель и списывает токены по числу платежей"""
+        self.client.force_authenticate(user=self.donor)
+        url = reverse('payment-bulk')
+        items = [{'collect': self.collect.id, 'amount': '10.00'}, {'collect': self.collect.id, 'amount': '10.00'}]
+        self.assertEqual(self.client.post(url, items, format='json').status_code, status.HTTP_201_CREATED)
+
+        # Корзина пользователя (2 токена) исчерпана пачкой — и одиночный платеж, и пачка получают 429
+        self.assertEqual(self.pay(self.donor, self.create_collect()).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        response = self.client.post(url, items[:1], format='json')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(Payment.objects.filter(donator=self.donor).count(), 2)
+
+        # Пачка крупнее корзин (2 токена у пользователя, 3 у сбора) забирает их целиком,
+        # а не отклоняется навсегда
+        self.client.force_authenticate(user=self.other)
+        collect = self.create_collect()
+        response = self.client.post(url, [{'collect': collect.id, 'amount': '1.00'}] * 4, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        third = User.objects.create_user(username='third', password='testpass123')
+        self.assertEqual(self.pay(third, collect).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(admission.get_stats()['throttled'][admission.COLLECT], 1)
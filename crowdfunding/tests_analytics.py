@@ -0,0 +1,103 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from .analytics import CollectRollup, OccasionRollup, RollupDelta, compact, fold, rebuild, truncate
+
+
+class DonationAnalyticsTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Сбор',
+            occasion='medical',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        self.other = Collect.objects.create(
+            author=self.user,
+            name='Другой сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def pay(self, collect, amount, ago=None):
+        payment = Payment.objects.create(donator=self.user, collect=collect, amount=Decimal(amount))
+        if ago is not None:
+            # Платеж задним числом — в интервалы он попадет только при пересборке
+            Payment.objects.filter(id=payment.id).update(date_added=timezone.now() - ago)
+        return payment
+
+    def points(self, url, **params):
+        response = self.client.get(url, params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [(point['payments_count'], point['amount']) for point in response.data['points']]
+
+    def test_minutes_updated_on_payment(self):
+        """Тест инкрементального обновления минутных интервалов"""
+        self.pay(self.collect, '100.00')
+        self.pay(self.collect, '50.00')
+        self.pay(self.other, '10.00')
+
+        url = reverse('collect-analytics', args=[self.collect.id])
+        # Платеж не трогает общие строки интервалов — изменения ждут переноса
+        self.assertFalse(CollectRollup.objects.exists())
+        for folded in (False, True):
+            self.assertEqual(self.points(url, granularity='minute'), [(2, '150.00')])
+            self.assertEqual(self.points(reverse('analytics'), granularity='minute'), [(3, '160.00')])
+            self.assertEqual(self.points(reverse('analytics'), granularity='minute', occasion='charity'), [(1, '10.00')])
+            if not folded:
+                self.assertEqual(fold(), 3)
+        self.assertFalse(RollupDelta.objects.exists())
+
+    def test_compaction_builds_hours_and_days(self):
+        """Тест уплотнения минут в часы и дни с учетом удаленных платежей"""
+        self.pay(self.collect, '100.00')
+        payment = self.pay(self.collect, '40.00')
+        payment.delete()
+        compact()
+
+        url = reverse('collect-analytics', args=[self.collect.id])
+        self.assertEqual(self.points(url, granularity='hour'), [(1, '100.00')])
+        self.assertEqual(self.points(url, granularity='day'), [(1, '100.00')])
+
+        # Повторное уплотнение ничего не удваивает
+        compact()
+        self.assertEqual(self.points(url, granularity='day'), [(1, '100.00')])
+
+    def test_old_minutes_purged(self):
+        """Тест удаления минут старше срока хранения после уплотнения"""
+        self.pay(self.collect, '100.00')
+        fold()
+        CollectRollup.objects.update(bucket=truncate(timezone.now() - timedelta(days=3), 'minute'))
+        OccasionRollup.objects.update(bucket=truncate(timezone.now() - timedelta(days=3), 'minute'))
+        compact()
+        self.assertFalse(CollectRollup.objects.filter(granularity='minute').exists())
+        self.assertEqual(CollectRollup.objects.get(granularity='day').total_amount, Decimal('100.00'))
+
+    def test_rebuild_from_payments(self):
+        """Тест пересборки интервалов по таблице платежей"""
+        self.pay(self.collect, '100.00', ago=timedelta(days=10))
+        self.pay(self.collect, '30.00')
+        rebuild()
+
+        url = reverse('collect-analytics', args=[self.collect.id])
+        self.assertEqual(self.points(url, granularity='day'), [(1, '100.00'), (1, '30.00')])
+        self.assertEqual(self.points(url, granularity='minute'), [(1, '30.00')])
+
+    def test_range_validation(self):
+        """Тест ограничения числа точек графика"""
+        url = reverse('collect-analytics', args=[self.collect.id])
+        response = self.client.get(url, {'granularity': 'minute', 'start': '2024-01-01T00:00:00Z'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        response = self.client.get(url, {'granularity': 'week'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -5,6 +5,7 @@ from django.contrib.auth.models import User
 from django.utils import timezone
 from datetime import timedelta
 from .models import Collect, Payment
+from .stats import get_stats
 
 
 class APITests(APITestCase):
@@ -81,8 +82,46 @@ class APITests(APITestCase):
         url = reverse('collect-payments', args=[self.collect.id])
         response = self.client.get(url)
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]['amount'], '2000.00')
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertEqual(response.data['results'][0]['amount'], '2000.00')
+
+    def test_collects_list_is_summary(self):
+        """Тест что список сборов по умолчанию не содержит платежей"""
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=2000)
+
+        response = self.client.get(reverse('collect-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('payments', response.data['results'][0])
+        self.assertEqual(response.data['results'][0]['current_amount'], '2000.00')
+
+    def test_collects_sparse_fields(self):
+        """Тест выбора полей через ?fields="""
+        url = reverse('collect-detail', args=[self.collect.id])
+        response = self.client.get(url, {'fields': 'id,name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {'id', 'name'})
+
+        response = self.client.get(reverse('collect-list'), {'fields': 'name'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data['results'][0]), {'name'})
+
+        response = self.client.get(url, {'fields': 'id,secret'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_collects_expand_payments(self):
+        """Тест вложения платежей через ?expand=payments(limit=N)"""
+        for amount in (100, 200, 300):
+            Payment.objects.create(donator=self.user, collect=self.collect, amount=amount)
+
+        url = reverse('collect-list')
+        response = self.client.get(url, {'fields': 'id', 'expand': 'payments(limit=2)'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        payments = response.data['results'][0]['payments']
+        self.assertEqual([payment['amount'] for payment in payments], ['300.00', '200.00'])
+
+        response = self.client.get(url, {'expand': 'author'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn('expand', response.data)
 
     def test_validation_errors(self):
         """Тест валидационных ошибок"""
@@ -113,4 +152,32 @@ class APITests(APITestCase):
         }
         response = self.client.post(url, payment_data, format='json')
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
-        self.assertIn('amount', response.data)
\ No newline at end of file
+        self.assertIn('amount', response.data)
+
+    def test_bulk_payments(self):
+        """Тест пакетного создания платежей"""
+        url = reverse('payment-bulk')
+        payments_data = [
+            {'collect': self.collect.id, 'amount': 4000, 'comment': 'Первый'},
+            {'collect': self.collect.id, 'amount': 5000},
+            {'collect': self.collect.id, 'amount': 2000},  # Превышает остаток 1000
+            {'collect': self.collect.id, 'amount': -1},
+        ]
+        response = self.client.post(url, payments_data, format='json')
+        self.assertEqual(response.status_code, status.HTTP_207_MULTI_STATUS)
+        self.assertEqual(response.data['created'], 2)
+        self.assertEqual(
+            [result['status'] for result in response.data['results']],
+            ['created', 'created', 'error', 'error']
+        )
+        self.assertIn('amount', response.data['results'][2]['errors'])
+
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, 9000)
+        self.assertEqual(get_stats(self.collect.id).payments_count, 2)
+        self.assertEqual(Payment.objects.count(), 2)
+
+    def test_bulk_payments_requires_list(self):
+        """Тест что пакетный эндпоинт принимает только список"""
+        response = self.client.post(reverse('payment-bulk'), {'collect': self.collect.id}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
\ No newline at end of file
@@ -0,0 +1,110 @@
+from unittest import mock
+
+from django.urls import reverse
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from . import cache as cache_module
+from .cache import cache_stats, reset_cache_stats
+from .stats import fold
+
+
+class CollectCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Кэшируемый сбор',
+            occasion='birthday',
+            description='Описание',
+            target_amount=10000,
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        self.other = Collect.objects.create(
+            author=self.user,
+            name='Другой сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        reset_cache_stats()
+
+    def test_detail_is_cached(self):
+        """Тест что повторный запрос деталей берется из кэша"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        self.client.get(url)
+        self.client.get(url)
+        self.assertEqual(cache_stats()['hits'], 1)
+        self.assertEqual(cache_stats()['misses'], 1)
+
+    def test_payment_invalidates_only_its_collect(self):
+        """Тест что платеж сбрасывает кэш только своего сбора"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        other_url = reverse('collect-detail', args=[self.other.id])
+        self.client.get(url)
+        self.client.get(other_url)
+
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=2000)
+        reset_cache_stats()
+
+        response = self.client.get(url)
+        self.assertEqual(response.data['current_amount'], '2000.00')
+        self.client.get(other_url)
+        self.assertEqual(cache_stats(), {'hits': 1, 'misses': 1, 'hit_rate': 0.5})
+
+    def test_fold_invalidates_detail(self):
+        """Тест что детали учитывают не перенесенную статистику, а перенос сбрасывает кэш сбора"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=2000)
+        response = self.client.get(url)
+        self.assertEqual((response.data['donors_count'], response.data['stats']['payments_count']), (1, 1))
+
+        fold()
+        reset_cache_stats()
+        response = self.client.get(url)
+        self.assertEqual(cache_stats()['misses'], 1)
+        self.assertEqual((response.data['donors_count'], response.data['stats']['payments_count']), (1, 1))
+
+    def test_payment_invalidates_list_page(self):
+        """Тест что платеж сбрасывает страницу списка, содержащую сбор"""
+        url = reverse('collect-list')
+        self.client.get(url)
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=2000)
+
+        response = self.client.get(url)
+        amounts = {item['id']: item['current_amount'] for item in response.data['results']}
+        self.assertEqual(amounts[self.collect.id], '2000.00')
+
+    def test_write_keeps_unrelated_keys(self):
+        """Тест что запись не очищает посторонние ключи кэша"""
+        cache.set('unrelated', 'value')
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=1000)
+        self.assertEqual(cache.get('unrelated'), 'value')
+
+    def test_cache_stats_endpoint(self):
+        """Тест эндпоинта статистики кэша"""
+        response = self.client.get(reverse('collect-cache-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('hit_rate', response.data)
+
+    def test_page_read_before_concurrent_write_is_not_cached(self):
+        """Тест что страница, выбранная до параллельного платежа, не кэшируется под новой версией"""
+        url = reverse('collect-list')
+        get_versions = cache_module.get_collect_versions
+
+        def write_then_read_versions(collect_ids):
+            # Платеж коммитится между выборкой страницы и чтением версий
+            Payment.objects.create(donator=self.user, collect=self.collect, amount=2000)
+            return get_versions(collect_ids)
+
+        with mock.patch.object(cache_module, 'get_collect_versions', side_effect=write_then_read_versions):
+            self.client.get(url)
+
+        response = self.client.get(url)
+        amounts = {item['id']: item['current_amount'] for item in response.data['results']}
+        self.assertEqual(amounts[self.collect.id], '2000.00')
@@ -0,0 +1,91 @@
+from unittest import mock
+from django.urls import reverse
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import cache as cache_module
+from .models import Collect, Payment
+
+
+class ConditionalGetTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Сбор',
+            occasion='birthday',
+            description='Описание',
+            target_amount=10000,
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def assert_revalidates(self, url):
+        """Проверяет 304 для неизмененного ресурса и 200 после платежа"""
+        response = self.client.get(url)
+        etag = response['ETag']
+        self.assertTrue(etag.startswith('"'))
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+        self.assertEqual(response.content, b'')
+
+        # Платеж меняет current_amount — валидатор должен смениться
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=100)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_detail(self):
+        """Тест условного GET деталей сбора"""
+        self.assert_revalidates(reverse('collect-detail', args=[self.collect.id]))
+
+    def test_payments(self):
+        """Тест условного GET платежей сбора"""
+        self.assert_revalidates(reverse('collect-payments', args=[self.collect.id]))
+
+    def test_list(self):
+        """Тест условного GET списка сборов"""
+        self.assert_revalidates(reverse('collect-list'))
+
+    def test_not_modified_skips_database(self):
+        """Тест что 304 отдается без запросов к БД"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_etag_depends_on_query(self):
+        """Тест что разные представления имеют разные ETag"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        self.assertNotEqual(self.client.get(url)['ETag'], self.client.get(url, {'fields': 'id,name'})['ETag'])
+
+    def test_last_modified(self):
+        """Тест Last-Modified: только за завершившуюся секунду"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        self.assertNotIn('Last-Modified', self.client.get(url))
+
+        with mock.patch('crowdfunding.conditional.time.time', return_value=timezone.now().timestamp() + 5):
+            response = self.client.get(url)
+            last_modified = response['Last-Modified']
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=last_modified)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_list_without_etag_after_concurrent_write(self):
+        """Тест что страница, выбранная до параллельного платежа, не получает ETag новых версий"""
+        get_versions = cache_module.get_collect_versions
+
+        def write_then_read_versions(collect_ids):
+            Payment.objects.create(donator=self.user, collect=self.collect, amount=100)
+            return get_versions(collect_ids)
+
+        with mock.patch.object(cache_module, 'get_collect_versions', side_effect=write_then_read_versions):
+            response = self.client.get(reverse('collect-list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn('ETag', response)
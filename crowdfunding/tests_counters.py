@@ -0,0 +1,60 @@
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from .models import Collect, Payment
+from .counters import CollectCounterShard, get_current_amount, rollup_collect
+from .serializers import PaymentCreateSerializer
+
+
+class CounterTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Тестовый сбор',
+            occasion='birthday',
+            description='Тестовое описание',
+            target_amount=10000,
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def test_payment_updates_amount_without_shards(self):
+        """Тест обновления суммы сбора без шардирования"""
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=1500)
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, Decimal('1500'))
+        self.assertFalse(CollectCounterShard.objects.exists())
+
+    @override_settings(COLLECT_COUNTER_SHARDS=4)
+    def test_sharded_payments_rollup(self):
+        """Тест записи платежей в шарды и их свертки"""
+        for _ in range(5):
+            Payment.objects.create(donator=self.user, collect=self.collect, amount=1000)
+
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, Decimal('0'))
+        self.assertEqual(get_current_amount(self.collect), Decimal('5000'))
+
+        rollup_collect(self.collect.id)
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, Decimal('5000'))
+        self.assertEqual(get_current_amount(self.collect), Decimal('5000'))
+
+    @override_settings(COLLECT_COUNTER_SHARDS=4)
+    def test_sharded_payment_delete(self):
+        """Тест вычитания удаленного платежа в шардированном режиме"""
+        payment = Payment.objects.create(donator=self.user, collect=self.collect, amount=3000)
+        payment.delete()
+        self.assertEqual(get_current_amount(self.collect), Decimal('0'))
+
+    @override_settings(COLLECT_COUNTER_SHARDS=4)
+    def test_validate_uses_aggregated_amount(self):
+        """Тест что валидация платежа учитывает несвернутые шарды"""
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=9000)
+        self.collect.refresh_from_db()
+
+        serializer = PaymentCreateSerializer(data={'collect': self.collect.id, 'amount': 2000})
+        self.assertFalse(serializer.is_valid())
+        self.assertIn('amount', serializer.errors)
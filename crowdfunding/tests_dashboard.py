@@ -0,0 +1,100 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import dashboard
+from .models import Collect, Payment
+
+
+@override_settings(LEADERBOARD_BACKEND='memory', DASHBOARD_COLLECTS_LIMIT=3, DASHBOARD_DONATIONS_LIMIT=3)
+class DashboardTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.client.force_authenticate(user=self.author)
+        self.url = reverse('dashboard')
+
+    def create_collect(self, author, occasion='charity', target_amount=None, days=7):
+        return Collect.objects.create(
+            author=author,
+            name='Сбор',
+            occasion=occasion,
+            description='Описание',
+            target_amount=target_amount,
+            end_datetime=timezone.now() + timedelta(days=days)
+        )
+
+    def test_dashboard_contents(self):
+        """Тест итогов, прогресса и истории пожертвований"""
+        own = self.create_collect(self.author, target_amount=1000)
+        self.create_collect(self.author, days=-1)
+        other = self.create_collect(self.donor, occasion='birthday')
+        Payment.objects.create(donator=self.donor, collect=own, amount=250)
+        Payment.objects.create(donator=self.author, collect=other, amount=100)
+        Payment.objects.create(donator=self.author, collect=other, amount=50)
+
+        response = self.client.get(self.url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        collects = response.data['collects']
+        self.assertEqual((collects['count'], collects['active_count'], collects['raised']), (2, 1, '250.00'))
+        item = next(item for item in collects['items'] if item['id'] == own.id)
+        self.assertEqual((item['progress'], item['donors_count'], item['is_active']), (25.0, 1, True))
+
+        donations = response.data['donations']
+        self.assertEqual((donations['count'], donations['total_amount'], donations['collects_count']), (2, '150.00', 1))
+        self.assertEqual(
+            donations['by_occasion'], [{'occasion': 'birthday', 'payments_count': 2, 'total_amount': '150.00'}]
+        )
+        self.assertEqual([item['amount'] for item in donations['items']], ['50.00', '100.00'])
+
+    @override_settings(COLLECT_COUNTER_SHARDS=4)
+    def test_includes_unrolled_shards(self):
+        """Тест что сумма и прогресс учитывают еще не свернутые шарды счетчиков"""
+        own = self.create_collect(self.author, target_amount=1000)
+        Payment.objects.create(donator=self.donor, collect=own, amount=250)
+        own.refresh_from_db()
+        self.assertEqual(own.current_amount, 0)
+
+        collects = self.client.get(self.url).data['collects']
+        self.assertEqual(collects['raised'], '250.00')
+        self.assertEqual((collects['items'][0]['current_amount'], collects['items'][0]['progress']), ('250.00', 25.0))
+
+    def test_constant_queries(self):
+        """Тест что число запросов не зависит от количества сборов и платежей"""
+        def add_activity(count):
+            for _ in range(count):
+                collect = self.create_collect(self.author, target_amount=500)
+                Payment.objects.create(donator=self.author, collect=self.create_collect(self.donor), amount=10)
+                Payment.objects.create(donator=self.donor, collect=collect, amount=10)
+
+        add_activity(1)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(self.url)
+        add_activity(6)
+        with CaptureQueriesContext(connection) as large:
+            response = self.client.get(self.url)
+
+        self.assertEqual(len(small), len(large))
+        self.assertEqual(response.data['collects']['count'], 7)
+        self.assertEqual(len(response.data['collects']['items']), 3)
+
+    def test_requires_authentication(self):
+        """Тест что дашборд недоступен анониму"""
+        self.client.force_authenticate(user=None)
+        response = self.client.get(self.url)
+        self.assertIn(response.status_code, [status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN])
+
+    def test_indexes_installed(self):
+        """Тест создания составных индексов автора и жертвователя"""
+        dashboard.install(connection)
+        with connection.cursor() as cursor:
+            for name, model, columns in dashboard.INDEXES:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                self.assertEqual(constraints[name]['columns'], columns)
@@ -0,0 +1,104 @@
+from django.core import mail
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from .mail import flush_mail
+from .outbox import OutboxMessage
+from .digests import PENDING_KEY, take_digest
+from .tasks import send_author_digest
+
+
+@override_settings(AUTHOR_DIGEST_WINDOW=300, AUTHOR_DIGEST_MAX_PAYMENTS=3, LEADERBOARD_BACKEND='memory')
+class AuthorDigestTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.donor = User.objects.create_user(username='donor', email='donor@example.com', password='pass')
+        self.other = User.objects.create_user(username='other', email='other@example.com', password='pass')
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Горячий сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        # Письмо о создании сбора в этих тестах не нужно
+        OutboxMessage.objects.all().delete()
+        flush_mail()
+        mail.outbox = []
+
+    def author_emails(self):
+        flush_mail()
+        return [message for message in mail.outbox if message.to == ['author@example.com']]
+
+    def digest_messages(self):
+        return OutboxMessage.objects.filter(task=send_author_digest.name).order_by('id')
+
+    def test_digest_scheduled_once_per_window(self):
+        """Тест что отложенная отправка ставится один раз на окно"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+            Payment.objects.create(donator=self.other, collect=self.collect, amount=200)
+
+        messages = self.digest_messages()
+        self.assertEqual(len(messages), 1)
+        self.assertGreater(messages[0].available_at, timezone.now() + timedelta(seconds=290))
+        self.assertIsNone(messages[0].published_at)
+        self.assertEqual(self.author_emails(), [])
+        # Квитанции донаторам уходят сразу
+        self.assertEqual(len(mail.outbox), 2)
+
+    def test_digest_contains_totals_and_top_donors(self):
+        """Тест содержимого дайджеста"""
+        Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+        Payment.objects.create(donator=self.other, collect=self.collect, amount=700)
+
+        send_author_digest(self.collect.id)
+        emails = self.author_emails()
+        self.assertEqual(len(emails), 1)
+        self.assertIn('Количество пожертвований: 2', emails[0].body)
+        self.assertIn('800', emails[0].body)
+        self.assertLess(emails[0].body.index('other'), emails[0].body.index('donor'))
+
+    def test_digest_flushed_after_max_payments(self):
+        """Тест досрочной отправки при достижении лимита платежей"""
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(3):
+                Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+        # Отложенная отправка окна и немедленная по лимиту
+        messages = self.digest_messages()
+        self.assertEqual([message.args for message in messages], [[self.collect.id], [self.collect.id]])
+        self.assertLessEqual(messages[1].available_at, timezone.now())
+
+        send_author_digest(self.collect.id)
+        self.assertEqual(len(self.author_emails()), 1)
+        # Повторный запуск по таймеру окна ничего не отправляет
+        send_author_digest(self.collect.id)
+        self.assertEqual(len(self.author_emails()), 1)
+
+    def test_rolled_back_payments_not_counted(self):
+        """Тест что откатившиеся платежи не учитываются в окне дайджеста"""
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    for _ in range(3):
+                        Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+        self.assertIsNone(cache.get(PENDING_KEY.format(collect_id=self.collect.id)))
+        self.assertFalse(self.digest_messages().exists())
+
+    def test_payment_committed_out_of_id_order(self):
+        """Тест что платеж с меньшим id, закоммиченный после дайджеста, попадает в следующий"""
+        Payment.objects.create(id=1000, donator=self.donor, collect=self.collect, amount=100)
+        self.assertEqual(take_digest(self.collect)['count'], 1)
+
+        Payment.objects.create(id=500, donator=self.other, collect=self.collect, amount=200)
+        digest = take_digest(self.collect)
+        self.assertEqual((digest['count'], digest['total']), (1, 200))
+        self.assertIsNone(take_digest(self.collect))
@@ -0,0 +1,62 @@
+import csv
+import io
+import json
+from decimal import Decimal
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+
+
+class PaymentExportTests(APITestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.client.force_authenticate(user=self.author)
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        self.old = Payment.objects.create(donator=self.donor, collect=self.collect, amount=Decimal('1500'))
+        Payment.objects.filter(id=self.old.id).update(date_added=timezone.now() - timedelta(days=10))
+        self.new = Payment.objects.create(
+            donator=self.donor, collect=self.collect, amount=Decimal('20.50'), comment='=HYPERLINK("x")'
+        )
+        self.url = reverse('collect-export', args=[self.collect.id])
+
+    def content(self, response):
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv_export(self):
+        """Тест выгрузки в CSV"""
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertIn('attachment', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(self.content(response))))
+        self.assertEqual([row['id'] for row in rows], [str(self.old.id), str(self.new.id)])
+        self.assertEqual(rows[0]['amount'], '1500.00')
+        self.assertEqual(rows[0]['donator_username'], 'donor')
+        # Формулы в комментариях экранируются
+        self.assertEqual(rows[1]['comment'], '\'=HYPERLINK("x")')
+
+    def test_ndjson_export_with_period(self):
+        """Тест выгрузки в NDJSON с фильтром по дате"""
+        since = (timezone.now() - timedelta(days=1)).isoformat()
+        response = self.client.get(self.url, {'format': 'ndjson', 'since': since})
+        items = [json.loads(line) for line in self.content(response).splitlines()]
+        self.assertEqual(len(items), 1)
+        self.assertEqual(items[0]['id'], self.new.id)
+        self.assertEqual(items[0]['amount'], '20.50')
+
+    def test_export_only_for_author(self):
+        """Тест что выгрузка доступна только автору"""
+        self.client.force_authenticate(user=self.donor)
+        response = self.client.get(self.url, {'format': 'csv'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
@@ -0,0 +1,67 @@
+import re
+
+from django.conf import settings
+from django.urls import reverse
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from .instrumentation import get_stats, reset_stats
+
+MIDDLEWARE = settings.MIDDLEWARE + ['crowdfunding.instrumentation.PerformanceMiddleware']
+
+
+@override_settings(PERF_INSTRUMENTATION=True, MIDDLEWARE=MIDDLEWARE)
+class InstrumentationTests(APITestCase):
+    def setUp(self):
+        reset_stats()
+        self.user = User.objects.create_user(username='admin', password='testpass123', is_staff=True)
+        self.client.force_authenticate(user=self.user)
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        Payment.objects.create(donator=self.user, collect=self.collect, amount=100)
+
+    def test_server_timing_header(self):
+        """Тест заголовка Server-Timing"""
+        response = self.client.get(reverse('collect-detail', args=[self.collect.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('db;dur=', response['Server-Timing'])
+        self.assertIn('cache;desc="hits=0 misses=1', response['Server-Timing'])
+
+    def test_stats_endpoint(self):
+        """Тест агрегированной статистики по маршрутам"""
+        url = reverse('collect-detail', args=[self.collect.id])
+        self.client.get(url)
+        self.client.get(url)
+
+        stats = get_stats()
+        self.assertEqual(stats['GET collect-detail']['count'], 2)
+        self.assertEqual(stats['GET collect-detail']['avg_cache_hits'], 0.5)
+
+        response = self.client.get(reverse('perf-stats'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('GET collect-detail', response.data)
+
+    def test_payment_counts_enqueued_tasks(self):
+        """Тест что уведомления платежа, записанные в outbox, учитываются в запросе"""
+        response = self.client.post(
+            reverse('payment-list'), {'collect': self.collect.id, 'amount': 100}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        enqueued = int(re.search(r'tasks;desc="(\d+) enqueued"', response['Server-Timing']).group(1))
+        self.assertGreater(enqueued, 0)
+        self.assertGreater(get_stats()['POST payment-list']['avg_tasks_enqueued'], 0)
+
+    @override_settings(PERF_INSTRUMENTATION=False)
+    def test_disabled(self):
+        """Тест что без настройки заголовок не добавляется"""
+        response = self.client.get(reverse('collect-detail', args=[self.collect.id]))
+        self.assertNotIn('Server-Timing', response)
@@ -0,0 +1,94 @@
+from decimal import Decimal
+from unittest import mock
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from .intake import IntakeReceipt, drain, get_queue
+
+
+@override_settings(PAYMENT_INTAKE_ASYNC=True, PAYMENT_INTAKE_BACKEND='memory', PAYMENT_INTAKE_BATCH_SIZE=2)
+class PaymentIntakeTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.user = User.objects.create_user(username='donor', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            target_amount=Decimal('1000.00'),
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def pay(self, amount):
+        return self.client.post(reverse('payment-list'), {'collect': self.collect.id, 'amount': amount}, format='json')
+
+    def test_payment_accepted_and_created(self):
+        """Тест приема платежа в очередь и его записи воркером"""
+        response = self.pay('300.00')
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+
+        # Celery в режиме eager — очередь уже разобрана
+        result = self.client.get(response.data['status_url'])
+        self.assertEqual(result.data['status'], 'created')
+        payment = Payment.objects.get(id=result.data['payment_id'])
+        self.assertEqual(payment.donator, self.user)
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, Decimal('300.00'))
+
+    @mock.patch('crowdfunding.intake.drain_payment_intake')
+    def test_batched_drain_checks_target(self, task):
+        """Тест записи пачками с проверкой целевой суммы внутри пачки"""
+        responses = [self.pay(amount) for amount in ('400.00', '400.00', '400.00')]
+        self.assertEqual(task.delay.call_count, 1)
+        self.assertEqual(self.client.get(responses[0].data['status_url']).data['status'], 'queued')
+        self.assertEqual(Payment.objects.count(), 0)
+
+        self.assertEqual(drain(), 3)
+        self.assertEqual(len(get_queue()), 0)
+        statuses = [self.client.get(response.data['status_url']).data for response in responses]
+        self.assertEqual([entry['status'] for entry in statuses], ['created', 'created', 'error'])
+        self.assertIn('amount', statuses[2]['errors'])
+        self.collect.refresh_from_db()
+        self.assertEqual(self.collect.current_amount, Decimal('800.00'))
+
+    def test_invalid_payment_rejected_synchronously(self):
+        """Тест что заведомо неверный платеж отклоняется сразу"""
+        response = self.pay('1500.00')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_status_hidden_from_other_users(self):
+        """Тест что статус чужого платежа недоступен"""
+        response = self.pay('100.00')
+        self.client.force_authenticate(user=self.author)
+        result = self.client.get(response.data['status_url'])
+        self.assertEqual(result.status_code, status.HTTP_404_NOT_FOUND)
+
+    @override_settings(PAYMENT_INTAKE_LEASE=0)
+    @mock.patch('crowdfunding.intake.drain_payment_intake')
+    def test_unacknowledged_batch_requeued(self, task):
+        """Тест что пачка упавшего воркера возвращается в очередь и не записывается дважды"""
+        response = self.pay('100.00')
+        self.pay('200.00')
+        with mock.patch('crowdfunding.intake.process_batch', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                drain()
+        self.assertEqual((len(get_queue()), Payment.objects.count()), (0, 0))
+
+        # Следующий разбор возвращает пачку; воркер записывает ее, но падает до подтверждения
+        with mock.patch.object(type(get_queue()), 'ack'):
+            self.assertEqual(drain(), 2)
+        self.assertEqual(IntakeReceipt.objects.count(), 2)
+
+        self.assertEqual(drain(), 2)
+        self.assertEqual(len(get_queue()), 0)
+        self.assertEqual(Payment.objects.count(), 2)
+        self.assertEqual(self.client.get(response.data['status_url']).data['status'], 'created')
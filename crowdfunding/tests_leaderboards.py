@@ -0,0 +1,104 @@
+from decimal import Decimal
+from unittest import mock
+from django.urls import reverse
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from . import leaderboards
+
+
+@override_settings(LEADERBOARD_BACKEND='memory', LEADERBOARD_BUCKET_SECONDS=60, LEADERBOARD_WINDOW_SECONDS=300)
+class LeaderboardTests(APITestCase):
+    def setUp(self):
+        leaderboards.get_backend().clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.other = User.objects.create_user(username='other', password='testpass123')
+        self.first = self.create_collect('Первый сбор')
+        self.second = self.create_collect('Второй сбор')
+
+    def create_collect(self, name):
+        return Collect.objects.create(
+            author=self.author,
+            name=name,
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def pay(self, donator, collect, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(donator=donator, collect=collect, amount=Decimal(amount))
+
+    def board(self, name):
+        response = self.client.get(reverse(f'leaderboard-{name}'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_rankings_follow_payments(self):
+        """Тест обновления рейтингов при создании и удалении платежей"""
+        self.pay(self.donor, self.first, '100.50')
+        payment = self.pay(self.other, self.second, '300.00')
+        self.pay(self.donor, self.first, '50.00')
+
+        top = self.board('top-collects')
+        self.assertEqual([entry['collect']['id'] for entry in top], [self.second.id, self.first.id])
+        self.assertEqual(top[1]['amount'], '150.50')
+        self.assertEqual(top[1]['collect']['name'], 'Первый сбор')
+        donors = self.board('top-donors')
+        self.assertEqual([entry['donator']['username'] for entry in donors], ['other', 'donor'])
+        self.assertEqual(set(donors[0]['donator']), {'id', 'username'})
+
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+        self.assertEqual([entry['collect']['id'] for entry in self.board('top-collects')], [self.first.id])
+        self.assertEqual([entry['collect']['id'] for entry in self.board('trending-collects')], [self.first.id])
+
+    def test_trending_window_slides(self):
+        """Тест что платежи выпадают из окна трендов"""
+        now = timezone.now().timestamp()
+        self.pay(self.donor, self.first, '500.00')
+        self.pay(self.donor, self.second, '100.00')
+        self.assertEqual(leaderboards.trending_collects(10)[0][0], self.first.id)
+
+        # Через 4 минуты (окно 5 минут) появляется свежий платеж во втором сборе
+        with mock.patch('crowdfunding.leaderboards.time.time', return_value=now + 240):
+            payment = Payment(donator=self.other, collect=self.second, amount=Decimal('450.00'))
+            payment.date_added = timezone.now() + timedelta(seconds=240)
+            leaderboards.on_payment_created(payment)
+            self.assertEqual(leaderboards.trending_collects(10)[0], (self.second.id, 55000))
+
+        # Через 6 минут первые платежи вышли из окна
+        with mock.patch('crowdfunding.leaderboards.time.time', return_value=now + 360):
+            self.assertEqual(leaderboards.trending_collects(10), [(self.second.id, 45000)])
+        # А общий рейтинг от окна не зависит
+        self.assertEqual(leaderboards.top_collects(10)[0], (self.second.id, 55000))
+
+    def test_rebuild_from_database(self):
+        """Тест пересборки рейтингов по таблице платежей"""
+        Payment.objects.create(donator=self.donor, collect=self.first, amount=Decimal('70.00'))
+        Payment.objects.create(donator=self.other, collect=self.second, amount=Decimal('30.00'))
+        self.assertEqual(leaderboards.top_collects(10), [])
+
+        leaderboards.rebuild()
+        self.assertEqual(leaderboards.top_collects(10), [(self.first.id, 7000), (self.second.id, 3000)])
+        self.assertEqual(leaderboards.top_donors(1), [(self.donor.id, 7000)])
+        self.assertEqual(len(leaderboards.trending_collects(10)), 2)
+
+    def test_storage_error_does_not_fail_payment(self):
+        """Тест что недоступность хранилища рейтингов не превращает записанный платеж в ошибку"""
+        backend = leaderboards.get_backend()
+        with mock.patch.object(backend, 'errors', (ConnectionError,)), \
+                mock.patch.object(backend, 'incr', side_effect=ConnectionError('down')), \
+                self.assertLogs('crowdfunding.leaderboards', 'WARNING'):
+            payment = self.pay(self.donor, self.first, '100.00')
+        self.assertTrue(Payment.objects.filter(id=payment.id).exists())
+
+    def test_limit_validation(self):
+        """Тест проверки параметра limit"""
+        response = self.client.get(reverse('leaderboard-top-collects'), {'limit': 1000})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,91 @@
+from django.core.cache import cache
+from django.urls import reverse
+from django.test import override_settings
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import lifecycle
+from .lifecycle import ACTIVE, ENDED, GOAL_REACHED, CollectLifecycle
+from .models import Collect, Payment
+
+
+@override_settings(LEADERBOARD_BACKEND='memory', COLLECT_SWEEP_BATCH_SIZE=2)
+class CollectLifecycleTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.client.force_authenticate(user=self.donor)
+        self.collect = self.create_collect(target_amount=1000)
+
+    def create_collect(self, target_amount=None, days=7):
+        return Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            target_amount=target_amount,
+            end_datetime=timezone.now() + timedelta(days=days)
+        )
+
+    def status_of(self, collect):
+        return CollectLifecycle.objects.get(collect=collect).status
+
+    def test_status_follows_payments(self):
+        """Тест перехода в «Цель достигнута» и обратно при платежах"""
+        self.assertEqual(self.status_of(self.collect), ACTIVE)
+
+        payment = Payment.objects.create(donator=self.donor, collect=self.collect, amount=1000)
+        self.assertEqual(self.status_of(self.collect), GOAL_REACHED)
+
+        payment.delete()
+        self.assertEqual(self.status_of(self.collect), ACTIVE)
+
+    def test_sweep_ends_expired_collects(self):
+        """Тест что обход пачками завершает только истекшие сборы"""
+        expired = [self.create_collect() for _ in range(3)]
+        Collect.objects.filter(id__in=[collect.id for collect in expired]).update(
+            end_datetime=timezone.now() - timedelta(minutes=1)
+        )
+        CollectLifecycle.objects.filter(collect__in=expired).update(end_datetime=timezone.now() - timedelta(minutes=1))
+
+        self.assertEqual(lifecycle.sweep(), 3)
+        self.assertEqual({self.status_of(collect) for collect in expired}, {ENDED})
+        self.assertEqual(self.status_of(self.collect), ACTIVE)
+        self.assertEqual(lifecycle.sweep(), 0)
+
+    def test_end_datetime_change_resyncs(self):
+        """Тест что продление сбора возвращает ему активный статус"""
+        ended = self.create_collect(days=-1)
+        self.assertEqual(self.status_of(ended), ENDED)
+
+        ended.end_datetime = timezone.now() + timedelta(days=1)
+        ended.save()
+        self.assertEqual(self.status_of(ended), ACTIVE)
+
+    def test_status_filter_before_sweep(self):
+        """Тест что истекший до обхода сбор уже не попадает в активные"""
+        late = self.create_collect()
+        CollectLifecycle.objects.filter(collect=late).update(end_datetime=timezone.now() - timedelta(seconds=1))
+
+        response = self.client.get(reverse('collect-list'), {'status': 'active', 'fields': 'id,status'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual([item['id'] for item in response.data['results']], [self.collect.id])
+        self.assertEqual(response.data['results'][0]['status'], ACTIVE)
+
+        response = self.client.get(reverse('collect-list'), {'status': 'ended'})
+        self.assertEqual([item['id'] for item in response.data['results']], [late.id])
+        # Статус в ответе совпадает с фильтром, не дожидаясь обхода
+        self.assertEqual(response.data['results'][0]['status'], ENDED)
+        response = self.client.get(reverse('collect-detail', args=[late.id]))
+        self.assertEqual(response.data['status'], ENDED)
+
+    def test_rebuild(self):
+        """Тест пересчета статусов сборов без строки статуса"""
+        CollectLifecycle.objects.all().delete()
+        Collect.objects.filter(id=self.collect.id).update(current_amount=1000)
+
+        self.assertEqual(lifecycle.rebuild(), 1)
+        self.assertEqual(self.status_of(self.collect), GOAL_REACHED)
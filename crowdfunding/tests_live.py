@@ -0,0 +1,121 @@
+import json
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import live
+from .models import Collect, Payment
+
+
+@override_settings(
+    LIVE_STREAMS=True, LIVE_BACKEND='memory', LIVE_HEARTBEAT_SECONDS=0.05, LIVE_HISTORY_SIZE=3,
+    LEADERBOARD_BACKEND='memory',
+)
+class LiveStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        live.get_broker().clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            target_amount=Decimal('1000'),
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        self.url = reverse('collect-stream', args=[self.collect.id])
+
+    def pay(self, amount):
+        with self.captureOnCommitCallbacks(execute=True):
+            return Payment.objects.create(donator=self.donor, collect=self.collect, amount=Decimal(amount))
+
+    def refund(self, payment):
+        with self.captureOnCommitCallbacks(execute=True):
+            payment.delete()
+
+    async def open(self, headers=None):
+        response = await self.async_client.get(self.url, headers=headers)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        return response.streaming_content
+
+    async def read_event(self, events):
+        """Следующее событие потока, пропуская пульс: (id, тип, данные)"""
+        async for chunk in events:
+            chunk = chunk.decode() if isinstance(chunk, bytes) else chunk
+            if chunk.startswith('id:'):
+                lines = dict(line.split(': ', 1) for line in chunk.strip().split('\n'))
+                return int(lines['id']), lines['event'], json.loads(lines['data'])
+
+    async def test_snapshot_then_payment_events(self):
+        """Тест что поток начинается со снимка и получает новые платежи"""
+        events = await self.open()
+        self.assertEqual(await self.read_event(events), (0, live.PROGRESS, {
+            'current_amount': '0.00', 'target_amount': '1000.00', 'donors_count': 0, 'payments_count': 0,
+        }))
+
+        payment = await sync_to_async(self.pay)('250')
+        event_id, event_type, data = await self.read_event(events)
+        self.assertEqual((event_id, event_type), (1, live.PAYMENTS))
+        self.assertEqual((data['current_amount'], data['donors_count']), ('250.00', 1))
+        self.assertEqual([item['id'] for item in data['payments']], [payment.id])
+
+        await sync_to_async(self.refund)(payment)
+        self.assertEqual((await self.read_event(events))[1:], (live.PROGRESS, {
+            'current_amount': '0.00', 'target_amount': '1000.00', 'donors_count': 0, 'payments_count': 0,
+        }))
+        await events.aclose()
+
+    async def test_reconnect_with_last_event_id(self):
+        """Тест что после переподключения дочитываются только пропущенные события"""
+        for amount in ['100', '200', '300']:
+            await sync_to_async(self.pay)(amount)
+
+        events = await self.open(headers={'Last-Event-ID': '1'})
+        self.assertEqual((await self.read_event(events))[:2], (2, live.PAYMENTS))
+        event_id, _, data = await self.read_event(events)
+        self.assertEqual((event_id, data['current_amount']), (3, '600.00'))
+        await events.aclose()
+
+    async def test_stale_last_event_id_gets_snapshot(self):
+        """Тест что при устаревшем Last-Event-ID поток начинается со снимка из истории"""
+        for amount in ['100', '100', '100', '100', '100']:
+            await sync_to_async(self.pay)(amount)
+
+        events = await self.open(headers={'Last-Event-ID': '1'})
+        event_id, event_type, data = await self.read_event(events)
+        self.assertEqual((event_id, event_type, data['current_amount']), (5, live.PROGRESS, '500.00'))
+        await events.aclose()
+
+    async def test_closed_stream_unsubscribes(self):
+        """Тест отписки от брокера при закрытии потока"""
+        stream = live.stream(self.collect.id, None)
+        await anext(stream)
+        self.assertEqual(live.get_broker().streams, 1)
+        await stream.aclose()
+        self.assertEqual(live.get_broker().streams, 0)
+
+    async def test_heartbeat_and_missing_collect(self):
+        """Тест пульса в тихом потоке и 404 для несуществующего сбора"""
+        events = await self.open()
+        await self.read_event(events)
+        self.assertEqual(await anext(events), b': heartbeat\n\n')
+        await events.aclose()
+
+        response = await self.async_client.get(reverse('collect-stream', args=[self.collect.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    async def test_disabled_or_wsgi_is_rejected(self):
+        """Тест 404 при выключенных потоках и 503 под WSGI"""
+        with self.settings(LIVE_STREAMS=False):
+            response = await self.async_client.get(self.url)
+        self.assertEqual(response.status_code, 404)
+
+        response = await sync_to_async(self.client.get)(self.url)
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(live.get_broker().streams, 0)
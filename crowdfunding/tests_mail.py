@@ -0,0 +1,98 @@
+import smtplib
+from celery import current_app, shared_task
+from django.core import mail
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from .mail import QueuedMail, flush_mail, queue_mail, sender
+
+
+class FlakyBackend(EmailBackend):
+    """locmem-бэкенд, отказывающий адресам из refused"""
+    refused = set()
+    opened = 0
+    # Сколько писем другой отправитель мог бы забрать во время отправки
+    claimable = []
+
+    def open(self):
+        FlakyBackend.opened += 1
+        return super().open()
+
+    def send_messages(self, messages):
+        FlakyBackend.claimable.append(QueuedMail.objects.filter(available_at__lte=timezone.now()).count())
+        for message in messages:
+            if set(message.to) & self.refused:
+                raise smtplib.SMTPRecipientsRefused({address: (550, b'refused') for address in message.to})
+        return super().send_messages(messages)
+
+
+@shared_task
+def send_test_mail(recipients):
+    for recipient in recipients:
+        queue_mail('Тема', 'Текст', [recipient])
+
+
+# Celery читает настройки один раз при старте — override_settings на eager не влияет
+@override_settings(
+    EMAIL_BACKEND='crowdfunding.tests_mail.FlakyBackend',
+    EMAIL_BATCH_SIZE=3,
+    EMAIL_FLUSH_INTERVAL=60,
+    EMAIL_MAX_RETRIES=1,
+)
+class MailQueueTests(TestCase):
+    def setUp(self):
+        eager = current_app.conf.task_always_eager
+        current_app.conf.task_always_eager = True
+        self.addCleanup(setattr, current_app.conf, 'task_always_eager', eager)
+        FlakyBackend.refused = set()
+        FlakyBackend.opened = 0
+        FlakyBackend.claimable = []
+        sender.close()
+        QueuedMail.objects.all().delete()
+        mail.outbox = []
+
+    def tearDown(self):
+        sender.close()
+
+    def test_mail_of_several_tasks_sent_together(self):
+        """Тест что письма разных задач копятся и уходят пачками через одно соединение"""
+        send_test_mail.apply(args=[[f'user{i}@example.com' for i in range(4)]])
+        send_test_mail.apply(args=[['last@example.com']])
+        self.assertEqual(mail.outbox, [])
+
+        self.assertEqual(flush_mail(), 5)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(FlakyBackend.opened, 1)
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_only_failed_recipients_retried(self):
+        """Тест что повтор отправляет только недоставленные письма и откладывается"""
+        FlakyBackend.refused = {'bad@example.com'}
+        queue_mail('Тема', 'Текст', ['good@example.com', 'bad@example.com'])
+
+        self.assertEqual(flush_mail(), 1)
+        self.assertEqual([message.to for message in mail.outbox], [['good@example.com']])
+        queued = QueuedMail.objects.get()
+        self.assertEqual((queued.to, queued.attempts), ('bad@example.com', 1))
+        self.assertGreater(queued.available_at, timezone.now())
+        # До конца паузы повтора письмо не отправляется
+        self.assertEqual(flush_mail(), 0)
+
+    def test_batch_leased_while_sending(self):
+        """Тест что отправляемая пачка арендована и не достанется другому отправителю"""
+        queue_mail('Тема', 'Текст', ['first@example.com', 'second@example.com'])
+        self.assertEqual(flush_mail(), 2)
+        self.assertEqual(FlakyBackend.claimable, [0, 0])
+
+    def test_dropped_after_max_retries(self):
+        """Тест что письмо удаляется после исчерпания повторов"""
+        FlakyBackend.refused = {'bad@example.com'}
+        queue_mail('Тема', 'Текст', ['bad@example.com'])
+        QueuedMail.objects.update(attempts=1)
+        flush_mail()
+        self.assertFalse(QueuedMail.objects.exists())
+
+    def test_empty_recipient_skipped(self):
+        """Тест что пустой адрес не ставится в очередь"""
+        queue_mail('Тема', 'Текст', [''])
+        self.assertFalse(QueuedMail.objects.exists())
@@ -0,0 +1,105 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import milestones
+from .milestones import CollectMilestone
+from .models import Collect, Payment
+from .outbox import OutboxMessage
+from .tasks import send_collect_goal_reached_email, send_collect_milestone_email
+
+MILESTONE_TASKS = [send_collect_goal_reached_email.name, send_collect_milestone_email.name]
+
+
+@override_settings(LEADERBOARD_BACKEND='memory', COLLECT_MILESTONES=[25, 50, 75, 150])
+class MilestoneTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.client.force_authenticate(user=self.donor)
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            target_amount=Decimal('1000'),
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def pay(self, amount):
+        return Payment.objects.create(donator=self.donor, collect=self.collect, amount=Decimal(amount))
+
+    def recorded(self):
+        return list(CollectMilestone.objects.filter(collect=self.collect).order_by('percent').values_list(
+            'percent', flat=True
+        ))
+
+    def notifications(self):
+        return [
+            (message.task, message.args[1:])
+            for message in OutboxMessage.objects.filter(task__in=MILESTONE_TASKS).order_by('id')
+        ]
+
+    def test_fires_once_per_crossing(self):
+        """Тест что платежи между порогами и после цели не ставят задач"""
+        self.pay('100')
+        self.pay('200')
+        self.assertEqual(self.notifications(), [(send_collect_milestone_email.name, [25])])
+
+        self.pay('100')
+        self.pay('700')
+        self.pay('100')
+        self.pay('100')
+        self.assertEqual(self.recorded(), [25, 50, 75, 100])
+        self.assertEqual(self.notifications(), [
+            (send_collect_milestone_email.name, [25]),
+            (send_collect_milestone_email.name, [50]),
+            (send_collect_milestone_email.name, [75]),
+            (send_collect_goal_reached_email.name, []),
+        ])
+
+    def test_bulk_jump_over_several_milestones(self):
+        """Тест что пачка, пересекшая несколько порогов, уведомляет о каждом ровно один раз"""
+        response = self.client.post(reverse('payment-bulk'), [
+            {'collect': self.collect.id, 'amount': '300.00'},
+            {'collect': self.collect.id, 'amount': '500.00'},
+        ], format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.recorded(), [25, 50, 75])
+        self.assertEqual(self.notifications(), [
+            (send_collect_milestone_email.name, [25]),
+            (send_collect_milestone_email.name, [50]),
+            (send_collect_milestone_email.name, [75]),
+        ])
+
+    def test_deletion_drops_below_milestone(self):
+        """Тест что после удаления платежа порог срабатывает снова при новом пересечении"""
+        self.pay('600')
+        payment = self.pay('400')
+        self.assertEqual(self.recorded(), [25, 50, 75, 100])
+
+        payment.delete()
+        self.assertEqual(self.recorded(), [25, 50])
+
+        self.pay('500')
+        self.assertEqual(self.recorded(), [25, 50, 75, 100])
+        goal = (send_collect_goal_reached_email.name, [])
+        self.assertEqual(self.notifications().count(goal), 2)
+
+    def test_target_change_and_rebuild(self):
+        """Тест пересчета порогов при изменении цели и полной пересборки"""
+        self.pay('800')
+        self.collect.target_amount = Decimal('500')
+        self.collect.save()
+        self.assertEqual(self.recorded(), [25, 50, 75, 100, 150])
+
+        CollectMilestone.objects.all().delete()
+        OutboxMessage.objects.all().delete()
+        self.assertEqual(milestones.rebuild(), 5)
+        self.assertEqual(self.notifications(), [])
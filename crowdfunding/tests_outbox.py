@@ -0,0 +1,134 @@
+from contextlib import suppress
+from unittest import mock
+from django.core import mail
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+from .mail import flush_mail
+from .outbox import OutboxMessage, enqueue, get_redelivery_timeout, process, publish_pending, purge
+from .tasks import send_collect_goal_reached_email, send_payment_created_email
+
+
+@override_settings(LEADERBOARD_BACKEND='memory')
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.donor = User.objects.create_user(username='donor', email='donor@example.com', password='pass')
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            target_amount=300,
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        # Письмо о создании сбора в этих тестах не нужно
+        OutboxMessage.objects.all().delete()
+        flush_mail()
+        mail.outbox = []
+
+    def donor_emails(self):
+        flush_mail()
+        return [message for message in mail.outbox if message.to == ['donor@example.com']]
+
+    def test_messages_published_only_after_commit(self):
+        """Тест что уведомления пишутся в транзакции и уходят в Celery после коммита"""
+        with mock.patch('crowdfunding.tasks.dispatch_outbox_message.apply_async') as apply_async:
+            with self.captureOnCommitCallbacks() as callbacks:
+                # Меньше первого порога цели — в outbox только письмо о платеже
+                payment = Payment.objects.create(donator=self.donor, collect=self.collect, amount=50)
+                apply_async.assert_not_called()
+
+            message = OutboxMessage.objects.get(task=send_payment_created_email.name)
+            self.assertEqual(message.args, [payment.id])
+            for callback in callbacks:
+                callback()
+
+        apply_async.assert_called_once()
+        self.assertEqual(apply_async.call_args.kwargs['task_id'], f'outbox-{message.id}')
+        message.refresh_from_db()
+        self.assertIsNotNone(message.published_at)
+
+    def test_rolled_back_transaction_sends_nothing(self):
+        """Тест что откат транзакции отменяет и уведомления"""
+        with self.captureOnCommitCallbacks(execute=True):
+            with suppress(RuntimeError), transaction.atomic():
+                Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+                raise RuntimeError
+        self.assertFalse(OutboxMessage.objects.filter(task=send_payment_created_email.name).exists())
+        self.assertEqual(self.donor_emails(), [])
+
+    def test_message_processed_once(self):
+        """Тест что повторная доставка сообщения не отправляет письма второй раз"""
+        with self.captureOnCommitCallbacks(execute=True):
+            Payment.objects.create(donator=self.donor, collect=self.collect, amount=100)
+        self.assertEqual(len(self.donor_emails()), 1)
+
+        message = OutboxMessage.objects.get(task=send_payment_created_email.name)
+        self.assertIsNotNone(message.processed_at)
+        process(message.id)
+        self.assertEqual(len(self.donor_emails()), 1)
+
+    def test_dedup_key(self):
+        """Тест что сообщение с тем же ключом дедупликации не записывается"""
+        self.assertIsNotNone(enqueue(send_collect_goal_reached_email, self.collect.id, dedup_key='goal'))
+        self.assertIsNone(enqueue(send_collect_goal_reached_email, self.collect.id, dedup_key='goal'))
+        self.assertEqual(OutboxMessage.objects.filter(dedup_key='goal').count(), 1)
+
+    def test_failed_publish_retried_with_backoff(self):
+        """Тест что при недоступном брокере сообщение откладывается и публикуется позже"""
+        message = enqueue(send_payment_created_email, 0)
+        with mock.patch('crowdfunding.tasks.dispatch_outbox_message.apply_async', side_effect=ConnectionError('down')):
+            self.assertEqual(publish_pending(), 0)
+
+        message.refresh_from_db()
+        self.assertIsNone(message.published_at)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(message.last_error, 'down')
+        self.assertGreater(message.available_at, timezone.now())
+
+        OutboxMessage.objects.filter(id=message.id).update(available_at=timezone.now())
+        self.assertEqual(publish_pending(), 1)
+
+    def test_delayed_message_waits(self):
+        """Тест что отложенное сообщение не публикуется раньше срока"""
+        message = enqueue(send_collect_goal_reached_email, self.collect.id, countdown=60)
+        self.assertEqual(publish_pending(), 0)
+
+        OutboxMessage.objects.filter(id=message.id).update(available_at=timezone.now())
+        self.assertEqual(publish_pending(), 1)
+
+    def test_purge_processed(self):
+        """Тест удаления старых выполненных сообщений"""
+        message = enqueue(send_collect_goal_reached_email, self.collect.id)
+        OutboxMessage.objects.filter(id=message.id).update(processed_at=timezone.now() - timedelta(days=8))
+        enqueue(send_collect_goal_reached_email, self.collect.id, countdown=60)
+
+        self.assertEqual(purge(), 1)
+        self.assertEqual(OutboxMessage.objects.count(), 1)
+
+    def test_failed_task_retried_and_lost_message_republished(self):
+        """Тест повтора упавшей задачи и повторной публикации потерянного сообщения"""
+        Payment.objects.create(donator=self.donor, collect=self.collect, amount=50)
+        message = OutboxMessage.objects.get(task=send_payment_created_email.name)
+        with mock.patch.object(send_payment_created_email, 'run', side_effect=[RuntimeError('smtp'), 'ok']) as run:
+            publish_pending()
+        self.assertEqual(run.call_count, 2)
+        message.refresh_from_db()
+        self.assertIsNotNone(message.processed_at)
+
+        # Брокер потерял опубликованное сообщение
+        OutboxMessage.objects.filter(id=message.id).update(
+            processed_at=None, published_at=timezone.now() - get_redelivery_timeout() - timedelta(seconds=1)
+        )
+        self.assertEqual(publish_pending(), 1)
+        message.refresh_from_db()
+        self.assertIsNotNone(message.processed_at)
+        self.assertEqual(message.attempts, 1)
+        self.assertEqual(len(self.donor_emails()), 1)
+        self.assertEqual(publish_pending(), 0)
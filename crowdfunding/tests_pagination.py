@@ -0,0 +1,92 @@
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import pagination
+from .models import Collect, Payment
+
+
+class KeysetPaginationTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(username='testuser', password='testpass123')
+        self.collect = Collect.objects.create(
+            author=self.user,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        # Одинаковая дата у всех платежей — порядок решает id
+        for amount in range(1, 8):
+            Payment.objects.create(donator=self.user, collect=self.collect, amount=amount)
+        Payment.objects.update(date_added=timezone.now())
+
+    def walk(self, url, params=None):
+        pages = []
+        response = self.client.get(url, params)
+        while True:
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append(response)
+            if not response.data['next']:
+                return pages
+            response = self.client.get(response.data['next'])
+
+    def test_payments_pages_cover_all_rows(self):
+        """Тест что курсор обходит все платежи без пропусков и повторов"""
+        url = reverse('collect-payments', args=[self.collect.id])
+        pages = self.walk(url, {'page_size': 3})
+
+        ids = [item['id'] for page in pages for item in page.data['results']]
+        expected = list(Payment.objects.order_by('-date_added', '-id').values_list('id', flat=True))
+        self.assertEqual(ids, expected)
+        self.assertIsNone(pages[0].data['previous'])
+
+    def test_previous_link(self):
+        """Тест возврата на предыдущую страницу"""
+        url = reverse('collect-payments', args=[self.collect.id])
+        first = self.client.get(url, {'page_size': 3})
+        second = self.client.get(first.data['next'])
+        back = self.client.get(second.data['previous'])
+        self.assertEqual(back.data['results'], first.data['results'])
+        self.assertIsNone(back.data['previous'])
+
+    def test_collects_list_cursor(self):
+        """Тест курсорной пагинации списка сборов"""
+        for i in range(4):
+            Collect.objects.create(
+                author=self.user,
+                name=f'Сбор {i}',
+                occasion='other',
+                description='Описание',
+                end_datetime=timezone.now() + timedelta(days=7)
+            )
+        pages = self.walk(reverse('collect-list'), {'page_size': 2})
+        self.assertEqual(sum(len(page.data['results']) for page in pages), 5)
+
+    def test_cursor_bounds_index_range(self):
+        """Тест что условие курсора содержит диапазон по метке, а не только OR"""
+        url = reverse('collect-payments', args=[self.collect.id])
+        next_url = self.client.get(url, {'page_size': 3}).data['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(next_url)
+        page_query = next(query['sql'] for query in queries if 'ORDER BY' in query['sql'] and 'LIMIT' in query['sql'])
+        self.assertIn('"date_added" <= ', page_query)
+        self.assertRegex(page_query, r'"date_added" < .* OR ')
+
+    def test_invalid_cursor(self):
+        """Тест некорректного курсора"""
+        url = reverse('collect-list')
+        response = self.client.get(url, {'cursor': 'garbage'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_indexes_installed(self):
+        """Тест создания составных индексов пагинации"""
+        pagination.install(connection)
+        with connection.cursor() as cursor:
+            for name, model, columns in pagination.INDEXES:
+                constraints = connection.introspection.get_constraints(cursor, model._meta.db_table)
+                self.assertEqual(constraints[name]['columns'], columns)
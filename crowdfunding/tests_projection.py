@@ -0,0 +1,84 @@
+import json
+from datetime import timedelta
+from decimal import Decimal
+from django.core.cache import cache
+from django.test import SimpleTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from .models import Collect, Payment
+from .renderers import FastJSONRenderer
+from .serializers import CollectSerializer
+
+
+@override_settings(LEADERBOARD_BACKEND='memory')
+class FastReadPathTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='author', email='author@example.com', password='pass')
+        self.donor = User.objects.create_user(username='donor', email='donor@example.com', password='pass')
+        self.client.force_authenticate(user=self.donor)
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор «на лечение»',
+            occasion='medical',
+            description='Описание',
+            target_amount=Decimal('5000'),
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        Payment.objects.create(donator=self.donor, collect=self.collect, amount=Decimal('1500'), comment='Держитесь!')
+        Payment.objects.create(donator=self.author, collect=self.collect, amount=Decimal('250.5'))
+
+    def serialized(self, fields=None):
+        collect = Collect.objects.get(id=self.collect.id)
+        data = CollectSerializer(collect, fields=fields).data
+        return JSONRenderer().render(data)
+
+    def test_detail_matches_serializer(self):
+        """Тест что детали сбора совпадают с выводом сериализатора байт в байт"""
+        response = self.client.get(reverse('collect-detail', args=[self.collect.id]), HTTP_ACCEPT='application/json')
+        self.assertEqual(response.content, self.serialized())
+        self.assertEqual(response.data['payments'][1]['amount'], '1500.00')
+
+    def test_list_matches_serializer(self):
+        """Тест что страница списка с выбранными полями совпадает с сериализатором"""
+        fields = ['id', 'author', 'target_amount', 'current_amount', 'is_active', 'status', 'stats']
+        response = self.client.get(
+            reverse('collect-list'), {'fields': ','.join(reversed(fields))}, HTTP_ACCEPT='application/json'
+        )
+        results = json.loads(response.content)['results']
+        self.assertEqual(json.dumps(results[0], ensure_ascii=False, separators=(',', ':')).encode(),
+                         self.serialized(fields))
+
+    def test_missing_collect(self):
+        """Тест 404 для несуществующего сбора"""
+        response = self.client.get(reverse('collect-detail', args=[self.collect.id + 100]))
+        self.assertEqual(response.status_code, 404)
+
+    def test_invalid_collect_id(self):
+        """Тест 404 (а не 500) для нечислового id сбора"""
+        response = self.client.get(reverse('collect-detail', args=['abc']))
+        self.assertEqual(response.status_code, 404)
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_output_matches_json_renderer(self):
+        """Тест что рендерер выводит те же байты, что и JSONRenderer"""
+        data = {
+            'amount': '1500.00',
+            'decimal': Decimal('10.50'),
+            'date': timezone.now(),
+            'text': 'Сбор строка',
+            'items': [1, None, True, {'nested': 'значение'}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indent_falls_back(self):
+        """Тест что запрос с отступом отдается стандартным рендерером"""
+        data = {'id': 1}
+        self.assertEqual(
+            FastJSONRenderer().render(data, 'application/json; indent=4'),
+            JSONRenderer().render(data, 'application/json; indent=4'),
+        )
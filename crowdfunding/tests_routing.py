@@ -0,0 +1,86 @@
+from unittest import mock, skipUnless
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework.test import APIClient
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from . import routing
+from .models import Collect
+
+
+@skipUnless('replica' in settings.DATABASES, 'Нужна вторая БД replica в DATABASES')
+@override_settings(
+    DATABASE_ROUTERS=['crowdfunding.routing.ReplicaRouter'],
+    DATABASE_REPLICAS=['replica'],
+    REPLICA_MAX_LAG=5,
+    LEADERBOARD_BACKEND='memory',
+)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Основная БД и реплика — две отдельные SQLite: реплика пуста, поэтому видно, откуда шло чтение"""
+    databases = {'default', 'replica'}
+
+    def setUp(self):
+        cache.clear()
+        routing._lag_checks.clear()
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor = User.objects.create_user(username='donor', password='testpass123')
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Сбор',
+            occasion='charity',
+            description='Описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(user=self.donor)
+
+    def get(self, client, url):
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.data
+        if isinstance(data, dict) and 'results' in data:
+            data = data['results']
+        return data, len(replica_queries)
+
+    def test_safe_reads_go_to_replica(self):
+        """Тест что список сборов читается с реплики"""
+        data, replica_queries = self.get(self.client, reverse('collect-list'))
+        self.assertEqual(data, [])
+        self.assertGreater(replica_queries, 0)
+
+    def test_user_sticks_to_primary_after_write(self):
+        """Тест что после платежа пользователь видит его, а остальные читают с реплики"""
+        response = self.client.post(
+            reverse('payment-list'), {'collect': self.collect.id, 'amount': '100.00'}, format='json'
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        data, replica_queries = self.get(self.client, reverse('payment-list'))
+        self.assertEqual(len(data), 1)
+        self.assertEqual(replica_queries, 0)
+
+        other = APIClient()
+        other.force_authenticate(user=self.author)
+        data, replica_queries = self.get(other, reverse('payment-list'))
+        self.assertEqual(data, [])
+        self.assertGreater(replica_queries, 0)
+
+    def test_lagging_replica_falls_back_to_primary(self):
+        """Тест что при большом отставании реплики чтение идет с основной БД"""
+        with mock.patch('crowdfunding.routing.measure_lag', return_value=60):
+            data, replica_queries = self.get(self.client, reverse('collect-list'))
+        self.assertEqual([item['id'] for item in data], [self.collect.id])
+        self.assertEqual(replica_queries, 0)
+
+    def test_recently_changed_collect_read_from_primary(self):
+        """Тест что только что измененный сбор не кэшируется из отстающей реплики"""
+        data, replica_queries = self.get(self.client, reverse('collect-detail', args=[self.collect.id]))
+        self.assertEqual(data['id'], self.collect.id)
+        self.assertEqual(replica_queries, 0)
@@ -0,0 +1,86 @@
+from decimal import Decimal
+from django.core.cache import cache
+from django.urls import reverse
+from rest_framework.test import APITestCase
+from rest_framework import status
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from .models import Collect, Payment
+
+
+class CollectSearchTests(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(username='author', password='testpass123')
+        self.client.force_authenticate(user=self.user)
+        self.medical = self.create_collect(
+            'Сбор на операцию', 'Помогите оплатить операцию и реабилитацию', 'medical', target_amount=1000,
+        )
+        self.school = self.create_collect(
+            'Школьная библиотека', 'Покупаем книги для школы', 'charity', target_amount=10000,
+        )
+        self.ended = self.create_collect(
+            'Старый сбор на операцию', 'Завершенный сбор', 'medical', days=-1,
+        )
+
+    def create_collect(self, name, description, occasion, target_amount=None, days=7):
+        return Collect.objects.create(
+            author=self.user,
+            name=name,
+            occasion=occasion,
+            description=description,
+            target_amount=target_amount,
+            end_datetime=timezone.now() + timedelta(days=days)
+        )
+
+    def search(self, **params):
+        response = self.client.get(reverse('collect-list'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return {item['id'] for item in response.data['results']}
+
+    def test_search_by_name_and_description(self):
+        """Тест поиска по словам и префиксам в названии и описании"""
+        self.assertEqual(self.search(q='операцию'), {self.medical.id, self.ended.id})
+        self.assertEqual(self.search(q='реабилит'), {self.medical.id})
+        self.assertEqual(self.search(q='книги школы'), {self.school.id})
+        # Символы синтаксиса FTS в запросе не ломают поиск
+        self.assertEqual(self.search(q='"операцию*" ('), {self.medical.id, self.ended.id})
+
+    def test_search_follows_updates(self):
+        """Тест что индекс обновляется при изменении и удалении сбора"""
+        self.school.description = 'Покупаем глобусы'
+        self.school.save()
+        self.assertEqual(self.search(q='книги'), set())
+        self.assertEqual(self.search(q='глобусы'), {self.school.id})
+
+        self.school.delete()
+        self.assertEqual(self.search(q='глобусы'), set())
+
+    def test_filters(self):
+        """Тест фильтров по поводу, статусу, целевой сумме и прогрессу"""
+        self.assertEqual(self.search(q='операцию', status='active'), {self.medical.id})
+        self.assertEqual(self.search(status='ended'), {self.ended.id})
+        self.assertEqual(self.search(occasion='charity,wedding'), {self.school.id})
+        self.assertEqual(self.search(target_min='5000'), {self.school.id})
+
+        Collect.objects.filter(id=self.medical.id).update(current_amount=Decimal('600.00'))
+        self.assertEqual(self.search(progress_min='50'), {self.medical.id})
+        self.assertEqual(self.search(progress_max='50'), {self.school.id})
+
+    def test_invalid_filters(self):
+        """Тест ошибок в параметрах фильтров"""
+        for params in ({'occasion': 'party'}, {'status': 'soon'}, {'target_min': 'много'}, {'progress_min': 'NaN'}):
+            response = self.client.get(reverse('collect-list'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_filtered_page_follows_new_matches(self):
+        """Тест что сбор, начавший подходить под фильтр, сразу появляется в выдаче"""
+        url = reverse('collect-list')
+        first = self.client.get(url, {'progress_min': 50})
+        self.assertEqual(first.data['results'], [])
+
+        Payment.objects.create(donator=self.user, collect=self.medical, amount=600)
+        second = self.client.get(url, {'progress_min': 50}, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, status.HTTP_200_OK)
+        self.assertEqual({item['id'] for item in second.data['results']}, {self.medical.id})
@@ -0,0 +1,120 @@
+from django.urls import reverse
+from django.test import TestCase
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+from django.contrib.auth.models import User
+from django.utils import timezone
+from datetime import timedelta
+from decimal import Decimal
+from .models import Collect, Payment
+from .stats import CollectDonor, CollectStats, fold, get_stats, rebuild_stats
+
+
+class CollectStatsTests(TestCase):
+    def setUp(self):
+        self.author = User.objects.create_user(username='author', password='testpass123')
+        self.donor1 = User.objects.create_user(username='donor1', password='testpass123')
+        self.donor2 = User.objects.create_user(username='donor2', password='testpass123')
+        self.collect = Collect.objects.create(
+            author=self.author,
+            name='Тестовый сбор',
+            occasion='birthday',
+            description='Тестовое описание',
+            end_datetime=timezone.now() + timedelta(days=7)
+        )
+
+    def test_stats_created_with_collect(self):
+        """Тест создания пустой статистики вместе со сбором"""
+        stats = CollectStats.objects.get(collect=self.collect)
+        self.assertEqual(stats.payments_count, 0)
+        self.assertIsNone(stats.avg_amount)
+
+    def test_stats_updated_on_payments(self):
+        """Тест инкрементального обновления статистики"""
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=1000)
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=3000)
+        Payment.objects.create(donator=self.donor2, collect=self.collect, amount=2000)
+        fold()
+
+        stats = CollectStats.objects.get(collect=self.collect)
+        self.assertEqual(stats.donors_count, 2)
+        self.assertEqual(stats.payments_count, 3)
+        self.assertEqual(stats.total_amount, Decimal('6000'))
+        self.assertEqual(stats.max_amount, Decimal('3000'))
+        self.assertEqual(stats.avg_amount, Decimal('2000.00'))
+
+    def test_stats_updated_on_delete(self):
+        """Тест обновления статистики при удалении платежей"""
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=1000)
+        biggest = Payment.objects.create(donator=self.donor2, collect=self.collect, amount=3000)
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=500)
+
+        biggest.delete()
+        fold()
+
+        stats = CollectStats.objects.get(collect=self.collect)
+        self.assertEqual(stats.donors_count, 1)
+        self.assertEqual(stats.payments_count, 2)
+        self.assertEqual(stats.max_amount, Decimal('1000'))
+
+    def test_incremental_matches_rebuild(self):
+        """Тест что инкрементальная статистика совпадает с пересчетом"""
+        for amount, donor in ((100, self.donor1), (700, self.donor2), (300, self.donor1)):
+            Payment.objects.create(donator=donor, collect=self.collect, amount=amount)
+        Payment.objects.filter(amount=100).first().delete()
+        fold()
+
+        incremental = CollectStats.objects.get(collect=self.collect)
+        rebuilt = rebuild_stats(self.collect.id)
+        for field in ('donors_count', 'payments_count', 'total_amount', 'max_amount', 'last_payment_at'):
+            self.assertEqual(getattr(incremental, field), getattr(rebuilt, field))
+
+    def test_payment_does_not_update_stats_row(self):
+        """Тест что платеж не обновляет строку статистики, а get_stats видит не перенесенные изменения"""
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=1000)
+        Payment.objects.create(donator=self.donor1, collect=self.collect, amount=500)
+
+        self.assertEqual(CollectStats.objects.get(collect=self.collect).payments_count, 0)
+        stats = get_stats(self.collect.id)
+        self.assertEqual((stats.donors_count, stats.payments_count, stats.max_amount), (1, 2, Decimal('1000')))
+
+        self.assertEqual(fold(), 2)
+        self.assertEqual(CollectStats.objects.get(collect=self.collect).donors_count, 1)
+
+    def test_donor_removed_with_last_payment(self):
+        """Тест что донатор уходит из сбора вместе с последним платежом"""
+        first = Payment.objects.create(donator=self.donor1, collect=self.collect, amount=1000)
+        second = Payment.objects.create(donator=self.donor1, collect=self.collect, amount=500)
+        first.delete()
+        self.assertTrue(CollectDonor.objects.filter(collect=self.collect, donator=self.donor1).exists())
+        second.delete()
+        self.assertFalse(CollectDonor.objects.filter(collect=self.collect, donator=self.donor1).exists())
+        self.assertEqual(get_stats(self.collect.id).donors_count, 0)
+
+
+class CollectStatsAPITests(APITestCase):
+    def test_list_has_no_per_row_aggregates(self):
+        """Тест что число запросов списка не растет с количеством сборов"""
+        user = User.objects.create_user(username='testuser', password='testpass123')
+
+        def create_collects(count):
+            for i in range(count):
+                collect = Collect.objects.create(
+                    author=user,
+                    name=f'Сбор {i}',
+                    occasion='charity',
+                    description='Описание',
+                    end_datetime=timezone.now() + timedelta(days=7)
+                )
+                Payment.objects.create(donator=user, collect=collect, amount=100)
+
+        url = reverse('collect-list')
+        create_collects(2)
+        with CaptureQueriesContext(connection) as small:
+            self.client.get(url, {'nocache': 1})
+        create_collects(8)
+        with CaptureQueriesContext(connection) as large:
+            self.client.get(url, {'nocache': 2})
+
+        self.assertEqual(len(small), len(large))
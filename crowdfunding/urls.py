@@ -1,11 +1,29 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CollectViewSet, PaymentViewSet
+from .admission import AdmissionStatsView
+from .analytics import AnalyticsView
+from .api import CollectViewSet, PaymentViewSet
+from .dashboard import DashboardView
+from .instrumentation import PerfStatsView
+from .leaderboards import LeaderboardView
+from .live import collect_stream
 
 router = DefaultRouter()
 router.register(r'collects', CollectViewSet)
 router.register(r'payments', PaymentViewSet)
 
 urlpatterns = [
+    path('collects/<int:pk>/stream/', collect_stream, name='collect-stream'),
     path('', include(router.urls)),
+    path('perf-stats/', PerfStatsView.as_view(), name='perf-stats'),
+    path('admission-stats/', AdmissionStatsView.as_view(), name='admission-stats'),
+    path('analytics/', AnalyticsView.as_view(), name='analytics'),
+    path('dashboard/', DashboardView.as_view(), name='dashboard'),
+    path('leaderboards/collects/top/', LeaderboardView.as_view(board='top-collects'), name='leaderboard-top-collects'),
+    path(
+        'leaderboards/collects/trending/',
+        LeaderboardView.as_view(board='trending-collects'),
+        name='leaderboard-trending-collects'
+    ),
+    path('leaderboards/donors/top/', LeaderboardView.as_view(board='top-donors'), name='leaderboard-top-donors'),
 ]
\ No newline at end of file
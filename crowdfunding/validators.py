@@ -19,9 +19,12 @@ def validate_target_amount(value):
 
 def validate_payment_amount(collect, amount):
     """Проверяет платеж на превышение целевой суммы"""
-    if collect.target_amount and collect.current_amount + amount > collect.target_amount:
+    from .counters import get_current_amount
+
+    current_amount = get_current_amount(collect)
+    if collect.target_amount and current_amount + amount > collect.target_amount:
         raise ValidationError(
-            f'Платеж превышает целевую сумму. Осталось собрать: {collect.target_amount - collect.current_amount}'
+            f'Платеж превышает целевую сумму. Осталось собрать: {collect.target_amount - current_amount}'
         )
 
 def validate_collect_active(collect):